@@ -0,0 +1,51 @@
+"""
+Admission control.
+
+A call is refused with a `server_busy` fault straight away, instead of
+being queued, when CONFIG['max_in_flight'] calls are already running or
+its method reached the `concurrency` it was registered with. A call
+that waited in a pool queue longer than its `queue_timeout` is dropped
+without running, the caller has likely given up on it anyway.
+Counters live on the event loop thread, no locks.
+"""
+from asynciorpc.config import CONFIG
+
+# calls admitted and not done yet, all methods
+in_flight = 0
+
+
+class Limiter(object):
+    """
+    Concurrency limit of one method
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError('Concurrency limit must be at least 1, not %r' % limit)
+        self.limit = limit
+        self.in_flight = 0
+
+
+def admit(route) -> bool:
+    """
+    Take a slot for a call of `route`, False if the server is too busy.
+    Every admitted call must be given back with `release`.
+    """
+    global in_flight
+    limit = CONFIG['max_in_flight']
+    if limit and in_flight >= limit:
+        return False
+    limiter = route.limiter
+    if limiter is not None:
+        if limiter.in_flight >= limiter.limit:
+            return False
+        limiter.in_flight += 1
+    in_flight += 1
+    return True
+
+
+def release(route):
+    global in_flight
+    in_flight -= 1
+    if route.limiter is not None:
+        route.limiter.in_flight -= 1
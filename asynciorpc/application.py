@@ -1,16 +1,38 @@
 import argparse
 import asyncio
 from aiohttp import web
-from asynciorpc.handler import Handler
+from aiohttp.tcp_helpers import tcp_nodelay
+from asynciorpc.handler import get_handler
 from asynciorpc.config import CONFIG, INTERFACES
+from asynciorpc.websocket import websocket_handler, close_connections
+from asynciorpc.metrics import metrics_handler
+from asynciorpc.tracing import traces_handler
+from asynciorpc.profiler import profile_handler
 
 
 async def rpc_handler(request):
-    handler_obj = Handler()
-    return await handler_obj.post(request)
+    return await get_handler().post(request)
+
+
+@web.middleware
+async def nagle(request, handler):
+    # aiohttp turns Nagle's algorithm off on every connection, only
+    # requests have a hook to turn it back on
+    tcp_nodelay(request.transport, False)
+    return await handler(request)
 
 
 def get_application():
-    app = web.Application()
+    # request bodies are decompressed by the handler, within max_body_size
+    app = web.Application(handler_args={'auto_decompress': False},
+                          middlewares=[] if CONFIG['tcp_nodelay'] else [nagle])
     app.router.add_route('POST', '/', rpc_handler)
+    app.router.add_route('GET', CONFIG['websocket_path'], websocket_handler)
+    app.on_shutdown.append(close_connections)
+    if CONFIG['metrics']:
+        app.router.add_route('GET', CONFIG['metrics_path'], metrics_handler)
+    if CONFIG['tracing']:
+        app.router.add_route('GET', CONFIG['tracing_path'], traces_handler)
+    if CONFIG['profiler']:
+        app.router.add_route('GET', CONFIG['profiler_path'], profile_handler)
     return app
@@ -0,0 +1,259 @@
+"""
+Response caching of idempotent interfaces.
+
+    register(get_user, cache=CachePolicy(ttl=30, maxsize=10000))
+
+A hit is answered before the handler is submitted to any pool, and
+identical calls in flight at the same time share one execution. Faults
+are never cached. Caches live on the event loop thread, no locks.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class CachePolicy(object):
+    """
+    :param ttl: seconds an entry stays valid, None for no expiry
+    :param maxsize: maximum number of entries
+    :param eviction: 'lru' or 'lfu'
+    :param key: function of (final_kwargs, extra_args) as bound by
+                getcallargs returning a hashable key, the default
+                freezes the arguments
+    """
+
+    def __init__(self, ttl: (int, float)=None, maxsize: int=1024, eviction: str='lru', key=None):
+        if eviction not in ('lru', 'lfu'):
+            raise ValueError('Unknown eviction %r' % eviction)
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.eviction = eviction
+        self.key = key or default_key
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def default_key(final_kwargs, extra_args):
+    return _freeze(final_kwargs), _freeze(extra_args)
+
+
+class _LRU(object):
+
+    def __init__(self):
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+
+    def pop(self, key):
+        self.entries.pop(key, None)
+
+    def evict(self):
+        self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class _LFU(object):
+    """
+    O(1) LFU: keys are grouped by use count, the least recently used
+    key of the lowest count goes first.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.counts = {}
+        self.buckets = {}
+        self.min_count = 0
+
+    def _touch(self, key):
+        count = self.counts[key]
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+            if self.min_count == count:
+                self.min_count = count + 1
+        self.counts[key] = count + 1
+        self.buckets.setdefault(count + 1, OrderedDict())[key] = None
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self._touch(key)
+        return entry
+
+    def put(self, key, entry):
+        if key in self.entries:
+            self.entries[key] = entry
+            self._touch(key)
+            return
+        self.entries[key] = entry
+        self.counts[key] = 1
+        self.buckets.setdefault(1, OrderedDict())[key] = None
+        self.min_count = 1
+
+    def pop(self, key):
+        if key not in self.entries:
+            return
+        del self.entries[key]
+        count = self.counts.pop(key)
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+            if self.min_count == count:
+                self.min_count = min(self.buckets, default=0)
+
+    def evict(self):
+        key = next(iter(self.buckets[self.min_count]))
+        self.pop(key)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ResponseCache(object):
+
+    def __init__(self, name: str, policy: CachePolicy, binder):
+        self.name = name
+        self.policy = policy
+        self.binder = binder
+        self._store = _LRU() if policy.eviction == 'lru' else _LFU()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, final_kwargs, extra_args):
+        """
+        :return: the cache key of a call, None if it can't be cached
+        """
+        try:
+            key = self.policy.key(final_kwargs, extra_args)
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key):
+        """
+        :return: (hit, value)
+        """
+        entry = self._store.get(key)
+        if entry is None:
+            return False, None
+        value, expires = entry
+        if expires is not None and expires < time.monotonic():
+            self._store.pop(key)
+            return False, None
+        return True, value
+
+    def put(self, key, value):
+        expires = None if self.policy.ttl is None else time.monotonic() + self.policy.ttl
+        self._store.put(key, (value, expires))
+        while len(self._store) > self.policy.maxsize:
+            self._store.evict()
+            self.evictions += 1
+
+    async def call(self, key, call, is_fault):
+        """
+        Answer from the cache, or run `call()` once for every caller
+        asking for the same key meanwhile.
+        :param is_fault: tells whether a response must not be cached
+        """
+        hit, value = self.get(key)
+        if hit:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(call())
+            task.add_done_callback(lambda task: self._done(key, task, is_fault))
+        # one caller giving up must not cancel the call of the others
+        return await asyncio.shield(task)
+
+    def _done(self, key, task, is_fault):
+        if self._inflight.get(key) is not task:
+            # invalidated while it ran, the response may be stale
+            return
+        del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        response = task.result()
+        if not is_fault(response):
+            self.put(key, response)
+
+    def invalidate(self, key=None):
+        """
+        Drop one entry, or all of them without a key. The calls in
+        flight are forgotten too: their responses aren't stored and
+        the next callers start a new call.
+        """
+        if key is None:
+            self._store = _LRU() if self.policy.eviction == 'lru' else _LFU()
+            self._inflight = {}
+        else:
+            self._store.pop(key)
+            self._inflight.pop(key, None)
+
+    def __len__(self):
+        return len(self._store)
+
+
+# full rpc name -> ResponseCache
+caches = {}
+
+
+def make_cache(name: str, policy, binder):
+    """
+    Build the cache of an interface from the `cache` argument of register
+    :param policy: a CachePolicy, a dict of its arguments, or True for the defaults
+    :param binder: `ArgumentBinder` of the handler
+    """
+    if policy is True:
+        policy = CachePolicy()
+    elif isinstance(policy, dict):
+        policy = CachePolicy(**policy)
+    elif not isinstance(policy, CachePolicy):
+        raise ValueError('Invalid cache policy %r' % policy)
+    cache = caches[name] = ResponseCache(name, policy, binder)
+    return cache
+
+
+def invalidate(name: str, *args, **kwargs):
+    """
+    Drop the cached responses of an interface, only the one of
+    these arguments if any are given:
+
+        invalidate('get_user')
+        invalidate('get_user', 42)
+    """
+    # asynciorpc.rpc imports this module through the routes
+    from asynciorpc.rpc.utils import getfullmethod
+    cache = caches.get(name) or caches.get(getfullmethod(name))
+    if cache is None:
+        raise KeyError('No cache for %s' % name)
+    if not args and not kwargs:
+        cache.invalidate()
+        return
+    final_kwargs, extra_args = cache.binder.bind(args, kwargs)
+    key = cache.key(final_kwargs, extra_args)
+    if key is not None:
+        cache.invalidate(key)
@@ -0,0 +1,121 @@
+"""
+Cooperative cancellation of running calls.
+
+A thread can't be interrupted, so a sync handler that outlives its
+timeout keeps its pool thread busy. Every call gets a `CancelToken` the
+handler can check between steps of a long job:
+
+    from asynciorpc import cancellation
+
+    def export(rows):
+        for row in rows:
+            cancellation.check()  # raises CallCancelled once timed out
+            write(row)
+
+The token lives in a context variable, copied into the pool thread with
+the call, so it works from any function the handler calls.
+
+Clients may give a call less time than its registered timeout, as a
+budget in seconds in the DEADLINE_HEADER of the HTTP request, or in the
+DEADLINE_FIELD member of a request object. The token then expires at the
+earliest of both, and `remaining()` is what's left to pass on to
+downstream calls, which `asynciorpc.client.Client` does by itself.
+"""
+import contextvars
+import time
+from asynciorpc.exceptions import CallCancelled
+
+_token = contextvars.ContextVar('asynciorpc_cancel_token', default=None)
+
+# remaining seconds the client gives the call
+DEADLINE_HEADER = 'X-Request-Timeout'
+DEADLINE_FIELD = 'timeout'
+
+
+class CancelToken(object):
+    """
+    :param deadline: time.monotonic() at which the call is cancelled,
+                     None for no deadline
+    """
+    __slots__ = ('deadline', '_cancelled')
+
+    def __init__(self, deadline: float=None):
+        self.deadline = deadline
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled or (self.deadline is not None and time.monotonic() >= self.deadline)
+
+    def cancel(self):
+        self._cancelled = True
+
+    def remaining(self):
+        """
+        :return: seconds left before the deadline, None without one
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        if self.cancelled:
+            raise CallCancelled()
+
+
+# token of code running outside of a call, never cancelled
+_NEVER = CancelToken()
+
+
+def current_token() -> CancelToken:
+    return _token.get() or _NEVER
+
+
+def set_token(token: CancelToken):
+    return _token.set(token)
+
+
+def reset_token(reset):
+    _token.reset(reset)
+
+
+def cancelled() -> bool:
+    return current_token().cancelled
+
+
+def remaining():
+    return current_token().remaining()
+
+
+def check():
+    current_token().check()
+
+
+def parse_budget(value):
+    """
+    Turn a budget sent by a client into a deadline
+    :return: time.monotonic() deadline, None if value isn't a number of seconds
+    """
+    if isinstance(value, (str, bytes)):
+        try:
+            value = float(value)
+        except ValueError:
+            return None
+    elif isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if value != value:
+        # nan
+        return None
+    return time.monotonic() + value
+
+
+def run_with(token: CancelToken, func, *args, **kwargs):
+    """
+    Run func with `token` as the current token, in the worker process
+    where there is no context to copy
+    """
+    reset = _token.set(token)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _token.reset(reset)
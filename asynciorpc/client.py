@@ -0,0 +1,268 @@
+"""
+Asyncio JSON-RPC client.
+
+Remote methods are reached as attributes, mirroring the
+COMPANY.SERVICE.method names of the server:
+
+    async with Client('http://127.0.0.1:10080/') as client:
+        result = await client.dmall.ams.TestApi(1, 2)
+        result = await client.dmall.ams.TestApi.with_timeout(0.5)(a=1, b=2)
+
+Connections are kept alive and pooled. With `batch_window` set, calls
+issued within that many seconds are sent together as one JSON-RPC batch.
+Remote faults are raised as the RPCFault subclasses of
+asynciorpc.exceptions. The items of generator methods are read as they
+come with `client.stream(method, params)`.
+
+The timeout of a call is sent along as its budget, so the server stops
+working on it once the client gave up. Inside a handler, calls get at
+most the time left to the handler's own call.
+"""
+import asyncio
+import itertools
+
+import aiohttp
+
+from asynciorpc import cancellation, tracing
+from asynciorpc.exceptions import RPCFault, InternalError, ServiceTimeout, fault_from_error
+from asynciorpc.rpc.codec import get_codec
+
+
+class MethodProxy(object):
+    """
+    A remote method, or a prefix of one
+    """
+
+    def __init__(self, client, name, timeout=None):
+        self._client = client
+        self._name = name
+        self._timeout = timeout
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return MethodProxy(self._client, '%s.%s' % (self._name, attr), self._timeout)
+
+    def __call__(self, *args, **kwargs):
+        if args and kwargs:
+            raise TypeError('JSON-RPC takes positional or keyword arguments, not both')
+        return self._client.call(self._name, kwargs or list(args), timeout=self._timeout)
+
+    def with_timeout(self, timeout: (int, float)):
+        """
+        The same method, with a timeout in seconds for its calls
+        """
+        return MethodProxy(self._client, self._name, timeout)
+
+    def __repr__(self):
+        return '<MethodProxy %s>' % self._name
+
+
+class Client(object):
+    """
+    :param url: url of the rpc server
+    :param prefix: optional 'COMPANY.SERVICE' prefix, so that
+                   `client.method()` calls COMPANY.SERVICE.method
+    :param timeout: default timeout in seconds of a call
+    :param batch_window: seconds to wait for other calls to batch with,
+                         None to send every call on its own
+    :param max_batch_size: a batch is sent as soon as it gets this large
+    :param limit: maximum number of pooled connections
+    :param session: an aiohttp ClientSession to use instead of an own one
+    :param codec: json codec name, see asynciorpc.rpc.codec
+    """
+
+    def __init__(self, url: str, *, prefix: str=None, timeout: (int, float)=None,
+                 batch_window: float=None, max_batch_size: int=100, limit: int=100,
+                 session: aiohttp.ClientSession=None, codec: str='auto'):
+        self.url = url
+        self.prefix = prefix
+        self.timeout = timeout
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.limit = limit
+        self.codec = get_codec(codec)
+        self._session = session
+        self._own_session = session is None
+        self._ids = itertools.count(1)
+        self._pending = []
+        self._flush_handle = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit)
+            )
+        return self._session
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if self.prefix:
+            attr = '%s.%s' % (self.prefix, attr)
+        return MethodProxy(self, attr)
+
+    async def call(self, method: str, params=None, *, timeout: (int, float)=None):
+        """
+        Call a remote method by its full name
+        :param params: list of positional or dict of keyword arguments
+        :param timeout: seconds, defaults to the timeout of the client
+        :raises ServiceTimeout: the timeout is spent, before or during the call
+        """
+        if timeout is None:
+            timeout = self.timeout
+        # within the time left to the call we are serving, if any
+        remaining = cancellation.remaining()
+        if remaining is not None and (timeout is None or remaining < timeout):
+            timeout = remaining
+        if timeout is not None and timeout <= 0:
+            raise ServiceTimeout('Deadline exceeded before the call was sent')
+
+        request = {'jsonrpc': '2.0', 'method': method,
+                   'params': params if params is not None else [],
+                   'id': next(self._ids)}
+        if timeout is not None:
+            request[cancellation.DEADLINE_FIELD] = timeout
+        if self.batch_window is None:
+            call = self._send(request)
+        else:
+            call = self._enqueue(request)
+
+        if timeout is None:
+            return await call
+        try:
+            return await asyncio.wait_for(call, timeout=timeout)
+        except asyncio.TimeoutError:
+            # the same fault as a server giving up on the call
+            raise ServiceTimeout('Deadline exceeded after %gs' % timeout) from None
+
+    async def stream(self, method: str, params=None, *, timeout: (int, float)=None):
+        """
+        Call a generator method and yield its items as they arrive
+        :param params: list of positional or dict of keyword arguments
+        :param timeout: seconds for the whole stream, sent as its budget
+        """
+        request = {'jsonrpc': '2.0', 'method': method,
+                   'params': params if params is not None else [],
+                   'id': next(self._ids)}
+        if timeout is None:
+            timeout = self.timeout
+        if timeout is not None:
+            request[cancellation.DEADLINE_FIELD] = timeout
+        headers = tracing.inject({'Content-Type': 'application/json', 'Accept': 'application/x-ndjson'})
+        async with self.session.post(self.url, data=self.codec.dumps(request),
+                                     headers=headers) as response:
+            if response.content_type != 'application/x-ndjson':
+                # a fault, or a method returning a list
+                result = self._result(self.codec.loads(await response.read()))
+                for item in result if isinstance(result, list) else [result]:
+                    yield item
+                return
+            # one response object per line
+            buffer = bytearray()
+            async for chunk in response.content.iter_any():
+                buffer += chunk
+                lines = buffer.split(b'\n')
+                buffer = lines.pop()
+                for line in lines:
+                    if line:
+                        yield self._result(self.codec.loads(bytes(line)))
+            if buffer.strip():
+                yield self._result(self.codec.loads(bytes(buffer)))
+
+    async def notify(self, method: str, params=None):
+        """
+        Send a notification, there is no result
+        """
+        request = {'jsonrpc': '2.0', 'method': method,
+                   'params': params if params is not None else []}
+        await self._post(request)
+
+    async def dir(self, prefix: str=''):
+        """
+        List the names under a prefix, '' for the companies
+        """
+        return await self.call('%s.__dir__' % prefix if prefix else '__dir__')
+
+    async def _post(self, payload):
+        async with self.session.post(self.url, data=self.codec.dumps(payload),
+                                     headers=tracing.inject({'Content-Type': 'application/json'})) as response:
+            body = await response.read()
+        if not body:
+            return None
+        return self.codec.loads(body)
+
+    async def _send(self, request):
+        return self._result(await self._post(request))
+
+    def _result(self, response):
+        if not isinstance(response, dict):
+            raise InternalError('Invalid response: %r' % (response,))
+        error = response.get('error')
+        if error is not None:
+            raise fault_from_error(error)
+        return response.get('result')
+
+    def _enqueue(self, request):
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((request, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_event_loop().call_later(self.batch_window, self._flush)
+        return future
+
+    def _take_batch(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _flush(self):
+        batch = self._take_batch()
+        if batch:
+            asyncio.ensure_future(self._send_batch(batch))
+
+    async def _send_batch(self, batch):
+        try:
+            if len(batch) == 1:
+                response = await self._post(batch[0][0])
+            else:
+                response = await self._post([request for request, future in batch])
+        except Exception as e:
+            for request, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if isinstance(response, list):
+            by_id = {item.get('id'): item for item in response if isinstance(item, dict)}
+        else:
+            # a single call, or a fault answering for the whole batch
+            by_id = None
+        for request, future in batch:
+            if future.done():
+                # timed out or cancelled
+                continue
+            try:
+                result = self._result(response if by_id is None else by_id.get(request['id']))
+            except RPCFault as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    async def close(self):
+        batch = self._take_batch()
+        if batch:
+            await self._send_batch(batch)
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,371 @@
+"""
+Content-Encoding of the HTTP transport.
+
+gzip and deflate come with zlib, zstd (zstandard) and br (brotli) are
+optional and only offered once installed. Responses are compressed with
+the encoding of CONFIG['compression'] the client prefers, once they are
+CONFIG['compression_min_size'] bytes or more, and in the thread pool
+from CONFIG['compression_offload_size'] bytes so a big response doesn't
+hold the loop up. Request bodies are decompressed as they arrive.
+"""
+import asyncio
+import zlib
+
+from asynciorpc import pool
+from asynciorpc.config import CONFIG
+from asynciorpc.exceptions import BodyTooLarge, ContentEncodingError
+
+
+class ZlibEncoding(object):
+    name = 'deflate'
+    # zlib container, which is what HTTP calls deflate
+    wbits = zlib.MAX_WBITS
+    default_level = 6
+
+    def compress(self, data: bytes, level: int) -> bytes:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, self.wbits)
+        return compressor.compress(data) + compressor.flush()
+
+    def compressor(self, level: int):
+        return _ZlibCompressor(zlib.compressobj(level, zlib.DEFLATED, self.wbits))
+
+    def decompressor(self):
+        return _ZlibDecompressor(zlib.decompressobj(self.wbits))
+
+
+class GzipEncoding(ZlibEncoding):
+    name = 'gzip'
+    wbits = 16 + zlib.MAX_WBITS
+
+
+class ZstdEncoding(object):
+    name = 'zstd'
+    default_level = 3
+    # largest window of a request body, the one of level 19, a frame
+    # asking for more is refused instead of allocated
+    max_window_size = 1 << 23
+
+    def __init__(self):
+        import zstandard
+        self._zstd = zstandard
+
+    def compress(self, data, level):
+        return self._zstd.ZstdCompressor(level=level).compress(data)
+
+    def compressor(self, level):
+        return _ZstdCompressor(self._zstd, self._zstd.ZstdCompressor(level=level).compressobj())
+
+    def decompressor(self):
+        return _ZstdDecompressor(
+            self._zstd.ZstdDecompressor(max_window_size=self.max_window_size).decompressobj())
+
+
+class BrotliEncoding(object):
+    name = 'br'
+    default_level = 4
+
+    def __init__(self):
+        import brotli
+        self._brotli = brotli
+        # output_buffer_limit came with brotli 1.2, without it a
+        # request body can't be inflated in bounded steps
+        self.decompresses = hasattr(brotli.Decompressor, 'can_accept_more_data')
+
+    def compress(self, data, level):
+        return self._brotli.compress(data, quality=level)
+
+    def compressor(self, level):
+        return _BrotliCompressor(self._brotli.Compressor(quality=level))
+
+    def decompressor(self):
+        if not self.decompresses:
+            raise ContentEncodingError('Unsupported Content-Encoding br, brotli 1.2 is needed')
+        return _BrotliDecompressor(self._brotli.Decompressor())
+
+
+ENCODINGS = {
+    'zstd': ZstdEncoding,
+    'br': BrotliEncoding,
+    'gzip': GzipEncoding,
+    'deflate': ZlibEncoding,
+}
+
+
+class _ZlibCompressor(object):
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def compress(self, data):
+        # flushed, so the client can read what is written so far
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _ZstdCompressor(object):
+    def __init__(self, zstd, compressor):
+        self._flush_block = zstd.COMPRESSOBJ_FLUSH_BLOCK
+        self._compressor = compressor
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(self._flush_block)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliCompressor(object):
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZlibDecompressor(object):
+    def __init__(self, decompressor):
+        self._decompressor = decompressor
+
+    def decompress(self, data, max_length=0):
+        data = self._decompressor.decompress(data, max_length)
+        if self._decompressor.unconsumed_tail:
+            # stopped at max_length
+            raise BodyTooLarge()
+        return data
+
+    def finish(self):
+        if not self._decompressor.eof:
+            raise ContentEncodingError('Truncated body')
+
+
+class _ZstdDecompressor(object):
+    # a block of 4 bytes inflates to 128KB at most
+    max_ratio = 1 << 15
+
+    def __init__(self, decompressor):
+        self._decompressor = decompressor
+
+    def decompress(self, data, max_length=0):
+        if not max_length:
+            return self._decompressor.decompress(data)
+        # zstd has no max_length, the data goes in slices small
+        # enough to inflate to about max_length each at most
+        step = max(64, max_length // self.max_ratio)
+        view = memoryview(data)
+        output = []
+        size = 0
+        for start in range(0, len(view), step):
+            chunk = self._decompressor.decompress(view[start:start + step])
+            size += len(chunk)
+            if size > max_length:
+                raise BodyTooLarge()
+            output.append(chunk)
+        return b''.join(output)
+
+    def finish(self):
+        if not self._decompressor.eof:
+            raise ContentEncodingError('Truncated body')
+
+
+class _BrotliDecompressor(object):
+    def __init__(self, decompressor):
+        self._decompressor = decompressor
+
+    def decompress(self, data, max_length=0):
+        if not max_length:
+            return self._decompressor.process(data)
+        data = self._decompressor.process(data, output_buffer_limit=max_length)
+        if len(data) > max_length or not self._decompressor.can_accept_more_data():
+            # the buffer grows in steps, it can pass the limit a little
+            raise BodyTooLarge()
+        return data
+
+    def finish(self):
+        if not self._decompressor.is_finished():
+            raise ContentEncodingError('Truncated body')
+
+
+_encodings = {}
+
+
+def get_encoding(name: str):
+    """
+    The encoding instance of a Content-Encoding name, None if it is
+    unknown or not installed
+    """
+    if name not in _encodings:
+        try:
+            _encodings[name] = ENCODINGS[name]()
+        except (KeyError, ImportError):
+            _encodings[name] = None
+    return _encodings[name]
+
+
+def level(encoding) -> int:
+    return CONFIG['compression_levels'].get(encoding.name, encoding.default_level)
+
+
+# Accept-Encoding header -> negotiated encoding, clients send few distinct ones
+_negotiated = {}
+
+
+def negotiate(accept_encoding: str):
+    """
+    The encoding to answer with, of CONFIG['compression'] in that
+    order of preference, the client's q-values first. None for
+    identity.
+    """
+    if not accept_encoding or not CONFIG['compression']:
+        return None
+    try:
+        return _negotiated[accept_encoding]
+    except KeyError:
+        pass
+
+    weights = {}
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip()] = weight
+
+    chosen = None
+    best = 0.0
+    for name in CONFIG['compression']:
+        weight = weights.get(name, weights.get('*', 0.0))
+        if weight > best and get_encoding(name) is not None:
+            chosen, best = name, weight
+    encoding = get_encoding(chosen) if chosen else None
+
+    if len(_negotiated) >= 256:
+        _negotiated.clear()
+    _negotiated[accept_encoding] = encoding
+    return encoding
+
+
+async def compress(encoding, data: bytes) -> bytes:
+    """
+    Compress a whole body, in the thread pool once it is large
+    """
+    if len(data) >= CONFIG['compression_offload_size']:
+        return await asyncio.get_event_loop().run_in_executor(
+            pool.thread_pool(), encoding.compress, data, level(encoding))
+    return encoding.compress(data, level(encoding))
+
+
+class StreamWriter(object):
+    """
+    Writes the body of a StreamResponse, prepared by the first write.
+    With an `encoding`, the start of the body is held while more of it
+    is ready: it is compressed once it is CONFIG['compression_min_size']
+    bytes, sent as it is, as the rest of the body, once the writer has
+    to wait for more before that. A stream isn't held up to be
+    compressed.
+    """
+
+    def __init__(self, request, response, encoding=None):
+        self.request = request
+        self.response = response
+        self._encoding = encoding
+        self._compressor = None
+        # start of the body, until it is known to be worth compressing
+        self._held = []
+        self._held_size = 0
+        # sends what is held once the loop is free, and the task doing it
+        self._release = None
+        self._sending = None
+
+    async def write(self, data: bytes):
+        if self._sending is not None:
+            await self._sending
+        if not self.response.prepared:
+            if self._encoding is not None:
+                self._held.append(data)
+                self._held_size += len(data)
+                if self._held_size < CONFIG['compression_min_size']:
+                    if self._release is None:
+                        self._release = asyncio.get_event_loop().call_soon(self._send_held)
+                    return
+                if self._release is not None:
+                    self._release.cancel()
+                data = b''.join(self._held)
+                self._held = []
+                self._compressor = self._encoding.compressor(level(self._encoding))
+                self.response.headers['Content-Encoding'] = self._encoding.name
+                self.response.headers['Vary'] = 'Accept-Encoding'
+            await self.response.prepare(self.request)
+        if self._compressor is not None:
+            if len(data) >= CONFIG['compression_offload_size']:
+                # one call at a time, the compressor is never shared
+                data = await asyncio.get_event_loop().run_in_executor(
+                    pool.thread_pool(), self._compressor.compress, data)
+            else:
+                data = self._compressor.compress(data)
+        await self.response.write(data)
+
+    async def write_eof(self):
+        if self._sending is not None:
+            await self._sending
+        if not self.response.prepared:
+            # too short to be compressed
+            if self._release is not None:
+                self._release.cancel()
+            await self.response.prepare(self.request)
+            await self.response.write_eof(b''.join(self._held))
+            return
+        await self.response.write_eof(self._compressor.finish() if self._compressor is not None else b'')
+
+    async def discard(self) -> bool:
+        """
+        Drop what is held of the body
+        :return: whether none of it was sent, the request can be
+                 answered with another response then
+        """
+        if self._sending is not None:
+            await self._sending
+        if self.response.prepared:
+            return False
+        if self._release is not None:
+            self._release.cancel()
+        self._held = []
+        return True
+
+    def _send_held(self):
+        # nothing more was ready, too short to be compressed
+        self._encoding = None
+        self._sending = asyncio.ensure_future(self._write_held())
+        # a failure is raised by the next write, if there is one
+        self._sending.add_done_callback(_retrieve)
+
+    async def _write_held(self):
+        await self.response.prepare(self.request)
+        data, self._held = b''.join(self._held), []
+        await self.response.write(data)
+
+
+def _retrieve(task):
+    if not task.cancelled():
+        task.exception()
+
+
+def decoder(content_encoding: str):
+    """
+    The decompressor of a request body, None for identity
+    :raises ContentEncodingError: the encoding is unknown or not installed
+    """
+    name = content_encoding.strip().lower()
+    if not name or name == 'identity':
+        return None
+    encoding = get_encoding(name)
+    if encoding is None:
+        raise ContentEncodingError('Unsupported Content-Encoding %s' % name)
+    return encoding.decompressor()
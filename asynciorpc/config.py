@@ -1,20 +1,171 @@
-import yaml
+"""
+Settings of the server.
+
+CONFIG is read on first use, not when the package is imported: the
+first lookup of a setting which isn't set yet reads the defaults below
+and config.yaml of the working directory (or $ASYNCIORPC_CONFIG). Call
+`configure()` beforehand to read another file, or none, and to set
+values explicitly. Values set before the file is read win over it.
+"""
+import os
+import sys
 from . import exceptions
 
 
-CONFIG = {
+DEFAULTS = {
     'company': None,
     'service': None,
     'rpc_port': 10080,
     'threadpool_size': 100,
-    'processpool_size': 10
+    'processpool_size': 10,
+    # 'concurrent' runs batch entries side by side, 'sequential' runs
+    # them one after another in request order
+    'batch_mode': 'concurrent',
+    'batch_concurrency': 10,
+    # orjson, ujson, stdlib or auto for the fastest one installed
+    'json_codec': 'auto',
+    'websocket_path': '/ws',
+    # calls running at the same time on one connection
+    'websocket_max_inflight': 64,
+    'websocket_max_connections': 1024,
+    'websocket_max_msg_size': 4 * 1024 * 1024,
+    # raw tcp / unix socket transport, framing is 'length' or 'newline'
+    'stream_framing': 'length',
+    # frames of a connection read and not answered yet
+    'stream_max_inflight': 64,
+    'stream_max_frame_size': 4 * 1024 * 1024,
+    'unix_path': '/tmp/asynciorpc.sock',
+    # worker processes, threadpool_size and processpool_size are shared among them
+    'workers': 1,
+    # workers bind their own socket with SO_REUSEPORT instead of sharing one,
+    # a single process never sets it
+    'reuse_port': True,
+    # asyncio, uvloop, or auto for uvloop when it is installed
+    'event_loop': 'asyncio',
+    # seconds an idle keep-alive connection stays open
+    'keepalive_timeout': 75,
+    # connections waiting to be accepted
+    'backlog': 128,
+    # false to let the kernel coalesce small writes (Nagle's algorithm)
+    'tcp_nodelay': True,
+    # seconds given to in-flight calls on shutdown
+    'shutdown_timeout': 10,
+    'metrics': True,
+    'metrics_path': '/metrics',
+    # spans of every request, and the slowest of the last tracing_buffer ones on tracing_path
+    'tracing': False,
+    'tracing_path': '/admin/traces',
+    'tracing_buffer': 1000,
+    # sampling profiler on profiler_path, profiles of at most profiler_max_seconds,
+    # a sample every profiler_interval seconds taking at most profiler_max_overhead of a CPU
+    'profiler': False,
+    'profiler_path': '/admin/profile',
+    'profiler_max_seconds': 60,
+    'profiler_interval': 0.01,
+    'profiler_max_overhead': 0.02,
+    # calls running at once over all methods, 0 for no limit
+    'max_in_flight': 0,
+    # seconds a call may wait for a pool worker, 0 for no limit
+    'queue_timeout': 0,
+    # method group -> size of its own thread pool, see register(pool=...)
+    'thread_pools': {},
+    # bytes of a request body, and calls of a batch, 0 for no limit
+    'max_body_size': 16 * 1024 * 1024,
+    'max_batch_size': 1000,
+    # batch responses written entry by entry as the calls complete
+    'stream_responses': False,
+    # items a sync generator handler may run ahead of the client
+    'stream_window': 64,
+    # response encodings by preference, zstd and br once installed, [] to disable
+    'compression': ['zstd', 'br', 'gzip', 'deflate'],
+    # bytes from which responses are compressed, and compressed in the thread pool
+    'compression_min_size': 1024,
+    'compression_offload_size': 256 * 1024,
+    # encoding -> level, the defaults are gzip / deflate 6, zstd 3, br 4
+    'compression_levels': {},
+    # seconds an inline handler may hold the event loop before a LoopBlockedWarning
+    'inline_warn_threshold': 0.01,
+    # sync handlers without an executor move inline once their calls are
+    # shorter than auto_inline_threshold seconds, judged every auto_inline_samples calls
+    'auto_inline': False,
+    'auto_inline_threshold': 0.0002,
+    'auto_inline_samples': 100
 }
 
+# settings which can't be empty
+REQUIRED = ('company', 'service', 'rpc_port', 'threadpool_size', 'processpool_size')
+
+
+
+class Config(dict):
+    """
+    The settings, a dict filled on first use. Once loaded a lookup is a
+    plain dict lookup, only a missing key goes through __missing__.
+    """
+
+    def __init__(self, path: str='config.yaml'):
+        super().__init__()
+        # read on first use
+        self.path = path
+        self.loaded = False
+
+    def __missing__(self, key):
+        if self.loaded:
+            raise KeyError(key)
+        self.load(self.path if os.path.exists(self.path) else None)
+        return self[key]
+
+    def load(self, path: str=None, settings: dict=None):
+        """
+        Fill in the defaults, the settings of a YAML file and `settings`
+        :param path: the YAML file, None for none
+        :raises InvalidConfig: a required setting is empty
+        """
+        values = dict(DEFAULTS)
+        if path is not None:
+            # only paid for once the settings are needed
+            import yaml
+            with open(path) as yaml_file:
+                values.update(yaml.safe_load(yaml_file) or {})
+        if not self.loaded:
+            # set before the file was read
+            values.update(self)
+        values.update(settings or {})
+        missing = [key for key in REQUIRED if not values[key]]
+        if missing:
+            raise exceptions.InvalidConfig('Invalid Config, %s not set%s' % (
+                ', '.join(missing), '' if path else ' (no %s)' % os.path.abspath(self.path)))
+        self.update(values)
+        self.loaded = True
+
+
+CONFIG = Config(os.environ.get('ASYNCIORPC_CONFIG', 'config.yaml'))
+
 TIMEOUTS = dict()
 INTERFACES = dict()
 
-with open('config.yaml') as yaml_file:
-    config = yaml.load(yaml_file.read())
-    CONFIG.update(config)
-    if not all(CONFIG.values()):
-        raise exceptions.InvalidConfig('Invalid Config')
\ No newline at end of file
+
+def lazy_settings(module_name: str, **attributes):
+    """
+    A module __getattr__ reading module attributes from CONFIG on first
+    use rather than on import, then they are plain module attributes
+    :param attributes: attribute name -> setting
+    """
+    def __getattr__(name):
+        if name in attributes:
+            value = CONFIG[attributes[name]]
+            setattr(sys.modules[module_name], name, value)
+            return value
+        raise AttributeError('module %r has no attribute %r' % (module_name, name))
+    return __getattr__
+
+
+def configure(path: str='config.yaml', **settings) -> Config:
+    """
+    Load CONFIG explicitly, instead of from config.yaml on first use
+    :param path: YAML file of the settings, None to only use the defaults
+                 and `settings`
+    :param settings: values set over the file, such as company and service
+    """
+    CONFIG.load(path, settings)
+    return CONFIG
\ No newline at end of file
@@ -1,4 +1,120 @@
 
 
 class InvalidConfig(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class UnpicklableResult(Exception):
+    pass
+
+
+class CallCancelled(Exception):
+    """
+    Raised by `cancellation.check()` once the call is timed out
+    """
+    pass
+
+
+class QueueTimeout(Exception):
+    """
+    A call waited in a pool queue past its queue_timeout
+    """
+    pass
+
+
+class BodyTooLarge(Exception):
+    """
+    A request body is longer than max_body_size
+    """
+    pass
+
+
+class ContentEncodingError(Exception):
+    """
+    A request body can't be decoded with its Content-Encoding
+    """
+    pass
+
+
+class LoopBlockedWarning(RuntimeWarning):
+    """
+    An inline handler held the event loop longer than inline_warn_threshold
+    """
+    pass
+
+
+# JSON-RPC error codes of the faults, by fault name
+FAULT_CODES = {
+    'parse_error': -32700,
+    'method_not_found': -32601,
+    'invalid_request': -32600,
+    'invalid_params': -32602,
+    'internal_error': -32603,
+    'not_authorized': -32602,
+    'service_timeout': -32090,
+    'server_busy': -32091
+}
+
+
+class RPCFault(Exception):
+    """
+    A fault returned by a remote call, subclassed per error code
+    """
+    code = None
+
+    def __init__(self, message, code=None, data=None):
+        super().__init__(message)
+        self.message = message
+        if code is not None:
+            self.code = code
+        self.data = data
+
+
+class ParseError(RPCFault):
+    code = FAULT_CODES['parse_error']
+
+
+class MethodNotFound(RPCFault):
+    code = FAULT_CODES['method_not_found']
+
+
+class InvalidRequest(RPCFault):
+    code = FAULT_CODES['invalid_request']
+
+
+class InvalidParams(RPCFault):
+    code = FAULT_CODES['invalid_params']
+
+
+class NotAuthorized(InvalidParams):
+    # shares its code with invalid_params, told apart by the message
+    message = 'Not Authorized'
+
+
+class InternalError(RPCFault):
+    code = FAULT_CODES['internal_error']
+
+
+class ServiceTimeout(RPCFault):
+    code = FAULT_CODES['service_timeout']
+
+
+class ServerBusy(RPCFault):
+    code = FAULT_CODES['server_busy']
+
+
+FAULT_CLASSES = {cls.code: cls for cls in
+                 (ParseError, MethodNotFound, InvalidRequest, InvalidParams,
+                  InternalError, ServiceTimeout, ServerBusy)}
+
+
+def fault_from_error(error: dict):
+    """
+    Build the RPCFault of a JSON-RPC error object
+    """
+    code = error.get('code')
+    message = error.get('message', '')
+    cls = FAULT_CLASSES.get(code, RPCFault)
+    if cls is InvalidParams and message == NotAuthorized.message:
+        cls = NotAuthorized
+    return cls(message, code=code, data=error.get('data'))
@@ -4,13 +4,33 @@ from .config import CONFIG
 
 
 class HandlerMeta(type):
-    def __new__(cls, name, bases, attrs):
+    """
+    Puts the COMPANY.SERVICE tree of the interfaces on the class on its
+    first lookup, rather than when the class is defined, so CONFIG
+    isn't read on import
+    """
+    def __getattr__(cls, attr):
+        if attr.startswith('__') or '_service' in cls.__dict__:
+            raise AttributeError(attr)
         service = type(CONFIG['service'], (Interface,), {})()
         company = type(CONFIG['company'], (Interface,), {CONFIG['service']: service})()
-        attrs[CONFIG['company']] = company
-        attrs['_service'] = service
-        return super().__new__(cls, name, bases, attrs)
+        setattr(cls, CONFIG['company'], company)
+        cls._service = service
+        return getattr(cls, attr)
 
 
 class Handler(JSONRPCHandler, metaclass=HandlerMeta):
-    pass
\ No newline at end of file
+    pass
+
+
+_handler = None
+
+
+def get_handler() -> Handler:
+    """
+    The Handler shared by all the requests, built on first use
+    """
+    global _handler
+    if _handler is None:
+        _handler = Handler()
+    return _handler
@@ -0,0 +1,77 @@
+"""
+Sync handlers run on the event loop.
+
+A handler registered with executor='inline' is called right on the
+loop, without the thread switches and futures of the thread pool. It
+has to be cheap: it holds up every other request while it runs, and
+a call longer than CONFIG['inline_warn_threshold'] seconds raises a
+LoopBlockedWarning. Its timeout can't interrupt it, the cancellation
+token is still set.
+
+With CONFIG['auto_inline'], the sync handlers registered without an
+executor are profiled in the thread pool. Over every
+CONFIG['auto_inline_samples'] calls, a handler with at most one call
+in twenty slower than CONFIG['auto_inline_threshold'] seconds moves
+inline. It goes back to the thread pool as soon as more of its calls
+are slow.
+"""
+import time
+import warnings
+
+from asynciorpc import cancellation, metrics
+from asynciorpc.config import CONFIG
+from asynciorpc.exceptions import LoopBlockedWarning
+
+
+class Profile(object):
+    """
+    Run times of the calls of a handler which may run inline,
+    only updated on the loop
+    """
+    __slots__ = ('inline', 'calls', 'slow')
+
+    def __init__(self):
+        self.inline = False
+        self.calls = 0
+        self.slow = 0
+
+    def observe(self, seconds: float):
+        self.calls += 1
+        if seconds > CONFIG['auto_inline_threshold']:
+            self.slow += 1
+        samples = CONFIG['auto_inline_samples']
+        if self.inline and self.slow * 20 > samples:
+            # too slow for the loop, don't wait for the end of the window
+            self.inline = False
+        elif self.calls < samples:
+            return
+        else:
+            self.inline = self.slow * 20 <= self.calls
+        self.calls = self.slow = 0
+
+
+def call(route, args, kwargs, token):
+    """
+    Run a sync handler on the loop under the cancellation token of the call
+    """
+    reset = cancellation.set_token(token)
+    started = time.perf_counter()
+    try:
+        return route.func(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - started
+        cancellation.reset_token(reset)
+        if route.profile is not None:
+            route.profile.observe(elapsed)
+        if elapsed > CONFIG['inline_warn_threshold']:
+            blocked(route)
+
+
+def blocked(route):
+    if metrics.enabled:
+        metrics.loop_blocked_total.inc(route.name)
+    # without the duration, so it is shown once per handler
+    warnings.warn('Inline handler %s blocked the event loop longer than %gs%s' % (
+        route.name, CONFIG['inline_warn_threshold'],
+        ', it goes back to the thread pool' if route.profile is not None
+        else ", register it with executor='thread'"), LoopBlockedWarning)
@@ -1,21 +1,46 @@
 from asynciorpc import config as rpc_config
 from asynciorpc.handler import Handler
+from asynciorpc.routes import build_route, add_route
+from asynciorpc.rpc.utils import getfullmethod
 
 
-def register(func, name: str=None, timeout: (int, float)=None):
+def register(func, name: str=None, timeout: (int, float)=None, executor: str=None, cache=None,
+             concurrency: int=None, queue_timeout: (int, float)=None, pool: str=None):
     """
     Register a handler as RPC interface
     :param func: handler function
-    :type func: coroutine function or normal function
+    :type func: coroutine function or normal function, generator functions
+                of either kind stream their items
     :param name: interface name (rpc name will be COMPANY.SERVICE.name)
-    :param timeout: set maximum timeout to run the handler function
+    :param timeout: set maximum timeout to run the handler function. A
+                    'process' handler running past it is stopped by
+                    recycling the process pool, which fails every other
+                    call running in the pool with an internal_error
+    :param executor: 'thread' or 'process' pool to run a normal function in,
+                     or 'inline' to call a cheap one right on the event loop,
+                     defaults to 'process' if the function has `_new_process`,
+                     see CONFIG['auto_inline'] for the others
+    :param cache: cache the responses, a `asynciorpc.cache.CachePolicy`,
+                  a dict of its arguments or True for the defaults
+    :param concurrency: maximum calls running at once, more are refused
+                        with a server_busy fault
+    :param queue_timeout: maximum seconds to wait for a pool worker,
+                          defaults to CONFIG['queue_timeout']
+    :param pool: method group of CONFIG['thread_pools'] whose own thread pool
+                 runs the handler, so slow methods can't starve the others
     """
     if not name:
         name = func.__name__
 
+    # raises before anything is registered if the handler doesn't fit
+    route = build_route(func, getfullmethod(name), timeout, executor, cache,
+                        concurrency, queue_timeout, pool)
+
     if timeout:
         rpc_config.TIMEOUTS[func] = timeout
 
     rpc_config.INTERFACES[name] = func
 
     setattr(Handler._service, name, func)
+
+    add_route(route)
@@ -0,0 +1,56 @@
+"""
+Event loop implementations of the server.
+
+CONFIG['event_loop'] is 'asyncio', 'uvloop' or 'auto' for uvloop when
+it is installed. uvloop is optional, 'uvloop' falls back to asyncio
+with a warning when it isn't installed, as the json codecs do.
+"""
+import asyncio
+import warnings
+
+from asynciorpc.config import CONFIG
+
+LOOPS = ('auto', 'uvloop', 'asyncio')
+
+
+def _uvloop():
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop
+
+
+def loop_name(name: str=None) -> str:
+    """
+    The implementation a setting resolves to, 'uvloop' or 'asyncio'
+    :param name: one of LOOPS, defaults to CONFIG['event_loop']
+    """
+    name = name or CONFIG['event_loop']
+    if name not in LOOPS:
+        raise ValueError('Unknown event loop %r' % name)
+    if name == 'asyncio':
+        return 'asyncio'
+    if _uvloop() is not None:
+        return 'uvloop'
+    if name == 'uvloop':
+        warnings.warn('uvloop is not installed, falling back to asyncio')
+    return 'asyncio'
+
+
+def new_event_loop(name: str=None):
+    """
+    A new event loop of the implementation of `name`
+    """
+    if loop_name(name) == 'uvloop':
+        return _uvloop().new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def install(name: str=None):
+    """
+    Make asyncio create loops of the implementation of `name`, for
+    servers which create their loop themselves, such as gunicorn workers
+    """
+    if loop_name(name) == 'uvloop':
+        asyncio.set_event_loop_policy(_uvloop().EventLoopPolicy())
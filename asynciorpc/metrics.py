@@ -0,0 +1,182 @@
+"""
+Prometheus style metrics.
+
+Metrics are updated on the event loop thread only, so there are no locks
+on the recording path: a counter is a dict increment and a histogram a
+bisect plus two increments. `metrics_handler` renders them in the
+Prometheus text format on CONFIG['metrics_path'].
+"""
+from bisect import bisect_left
+from aiohttp import web
+from asynciorpc import cache, pool
+from asynciorpc.config import lazy_settings
+
+# seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry = []
+
+
+__getattr__ = lazy_settings(__name__, enabled='metrics')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in zip(names, values))
+
+
+class Counter(object):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        registry.append(self)
+
+    def inc(self, *labels, value=1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _labels(self.labels, labels), value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, value=1):
+        self.values[labels] = self.values.get(labels, 0) - value
+
+    def set(self, *labels, value):
+        self.values[labels] = value
+
+
+class CallbackCounter(Counter):
+    """
+    A counter read on scrape from `callback`, returning {labels: value}
+    """
+
+    def __init__(self, name, documentation, callback, labels=()):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def samples(self):
+        self.values = self.callback()
+        return super().samples()
+
+
+class CallbackGauge(CallbackCounter):
+    kind = 'gauge'
+
+
+class Histogram(object):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., +Inf count, sum]
+        self.values = {}
+        registry.append(self)
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                yield self.name + '_bucket', _labels(self.labels + ('le',), labels + (bound,)), cumulative
+            yield self.name + '_count', _labels(self.labels, labels), cumulative
+            yield self.name + '_sum', _labels(self.labels, labels), series[-1]
+
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+        lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+        for name, labels, value in metric.samples():
+            lines.append('%s%s %s' % (name, labels, value))
+    return '\n'.join(lines) + '\n'
+
+
+def _thread_pool_stats(values, name, tpool):
+    values[(name, 'max')] = tpool._max_workers
+    values[(name, 'started')] = len(tpool._threads)
+    values[(name, 'queued')] = tpool._work_queue.qsize()
+
+
+def _pool_stats():
+    # only the pools in use, reporting doesn't create them
+    values = {}
+    ppool = pool.ppool
+    if ppool is not None:
+        values[('process', 'max')] = ppool._max_workers
+        values[('process', 'started')] = len(getattr(ppool, '_processes', None) or ())
+        values[('process', 'pending')] = len(ppool._pending_work_items)
+    if pool.tpool is not None:
+        _thread_pool_stats(values, 'thread', pool.tpool)
+    for group, tpool in list(pool.tpools.items()):
+        _thread_pool_stats(values, 'thread.%s' % group, tpool)
+    return values
+
+
+def _cache_lookups():
+    values = {}
+    for name, response_cache in cache.caches.items():
+        values[(name, 'hit')] = response_cache.hits
+        values[(name, 'miss')] = response_cache.misses
+    return values
+
+
+def _cache_stats():
+    values = {}
+    for name, response_cache in cache.caches.items():
+        values[(name, 'entries')] = len(response_cache)
+        values[(name, 'evictions')] = response_cache.evictions
+    return values
+
+
+requests_total = Counter('rpc_requests_total', 'Calls by method', ['method'])
+faults_total = Counter('rpc_faults_total', 'Faults returned by method and fault', ['method', 'fault'])
+in_flight = Gauge('rpc_in_flight', 'Calls being dispatched by method', ['method'])
+http_in_flight = Gauge('rpc_http_requests_in_flight', 'HTTP requests being processed')
+parse_seconds = Histogram('rpc_parse_seconds', 'Time to parse a request body')
+queue_seconds = Histogram('rpc_queue_seconds', 'Time waiting for a thread pool worker', ['method'])
+execute_seconds = Histogram('rpc_execute_seconds', 'Time running the handler', ['method'])
+serialize_seconds = Histogram('rpc_serialize_seconds', 'Time to serialize a response body')
+executor_in_flight = Gauge('rpc_executor_in_flight', 'Calls submitted to a pool and not done yet',
+                           ['executor'])
+pool_stats = CallbackGauge('rpc_pool', 'Thread and process pool size, started workers and queue',
+                           _pool_stats, ['pool', 'stat'])
+zombies_total = Counter('rpc_zombies_total', 'Calls timed out while running in a pool thread',
+                        ['method'])
+zombie_threads = Gauge('rpc_zombie_threads', 'Pool threads still running a timed out call',
+                       ['pool'])
+loop_blocked_total = Counter('rpc_loop_blocked_total', 'Inline calls holding the event loop past '
+                             'inline_warn_threshold', ['method'])
+cache_lookups_total = CallbackCounter('rpc_cache_lookups_total', 'Response cache hits and misses by method',
+                                      _cache_lookups, ['method', 'result'])
+cache_stats = CallbackGauge('rpc_cache', 'Response cache entries and evictions by method',
+                            _cache_stats, ['method', 'stat'])
+
+
+def fault_name(fault):
+    return getattr(fault, 'fault_name', None) or str(getattr(fault, 'faultCode', 'unknown'))
+
+
+async def metrics_handler(request):
+    return web.Response(text=render(), content_type='text/plain')
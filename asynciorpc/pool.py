@@ -1,8 +1,221 @@
+import importlib
+import inspect
+import itertools
+import multiprocessing
+import pickle
+import time
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from asynciorpc import cancellation
 from asynciorpc.config import CONFIG
+from asynciorpc.exceptions import UnpicklableResult, QueueTimeout
 
-# use threadpool for IO-intensive job
-tpool = ThreadPoolExecutor(max_workers=CONFIG['threadpool_size'])
+# use threadpool for IO-intensive job, created on first use
+tpool = None
 
-# use threadpool for CPU-intensive job
-ppool = ProcessPoolExecutor(max_workers=CONFIG['processpool_size'])
\ No newline at end of file
+# use processpool for CPU-intensive job, created on first use
+ppool = None
+
+# id of the call each worker of ppool is running, 0 when idle. A call
+# handed to a worker but still waiting in its queue shows as running()
+# on its future, this tells the ones actually started
+_executing = None
+
+# ids of the process pool calls, 0 is no call
+_call_ids = itertools.count(1)
+
+# in a worker process: the shared ids and the index of its own one
+_worker_executing = None
+_worker_slot = None
+
+# thread pools of the method groups in CONFIG['thread_pools'], created on first use
+tpools = {}
+
+# number of worker processes sharing the pool sizes
+_workers = 1
+
+# sizes of tpool and ppool, CONFIG['threadpool_size'] / CONFIG['processpool_size'] if None
+_threadpool_size = None
+_processpool_size = None
+
+
+def thread_pool(group: str=None) -> ThreadPoolExecutor:
+    """
+    The thread pool of a method group, the shared one for None
+    """
+    global tpool
+    if group is None:
+        if tpool is None:
+            tpool = ThreadPoolExecutor(max_workers=_threadpool_size or CONFIG['threadpool_size'])
+        return tpool
+    executor = tpools.get(group)
+    if executor is None:
+        size = max(1, CONFIG['thread_pools'][group] // _workers)
+        executor = tpools[group] = ThreadPoolExecutor(max_workers=size,
+                                                      thread_name_prefix='asynciorpc-%s' % group)
+    return executor
+
+
+def process_pool() -> ProcessPoolExecutor:
+    """
+    The process pool, created on first use
+    """
+    if ppool is None:
+        _new_ppool(_processpool_size or CONFIG['processpool_size'])
+    return ppool
+
+
+def _new_ppool(size: int):
+    global ppool, _executing
+    _executing = multiprocessing.Array('q', size)
+    ppool = ProcessPoolExecutor(max_workers=size, initializer=_init_worker,
+                                initargs=(_executing, multiprocessing.Value('i', 0)))
+
+
+def _init_worker(executing, slots):
+    global _worker_executing, _worker_slot
+    with slots.get_lock():
+        _worker_slot = slots.value
+        slots.value += 1
+    _worker_executing = executing
+
+
+def next_call_id() -> int:
+    return next(_call_ids)
+
+
+def executing(executor: ProcessPoolExecutor, call_id: int) -> bool:
+    """
+    Whether the call `call_id` of `executor` runs in one of its workers
+    right now, False for one queued, done, or of a pool replaced since
+    """
+    if executor is not ppool or _executing is None:
+        return False
+    return call_id in _executing[:]
+
+
+def configure(threadpool_size: int, processpool_size: int, workers: int=1):
+    """
+    Size both pools, used by the workers of a multi-process server to
+    take their share. Pools already created are replaced on next use.
+    :param workers: the group pools are shared among that many workers
+    """
+    global tpool, ppool, _workers, _threadpool_size, _processpool_size
+    if tpool is not None:
+        tpool.shutdown(wait=False)
+    if ppool is not None:
+        ppool.shutdown(wait=False)
+    tpool = ppool = None
+    _threadpool_size = threadpool_size
+    _processpool_size = processpool_size
+    _workers = workers
+    for executor in tpools.values():
+        executor.shutdown(wait=False)
+    tpools.clear()
+
+
+def recycle_ppool(old: ProcessPoolExecutor=None):
+    """
+    Replace the process pool by a fresh one and kill the workers of the
+    old one. A running call can't be cancelled in a worker process, this
+    is how a timed out handler gets stopped. Other calls still running in
+    the old pool fail with BrokenProcessPool.
+    :param old: the pool to replace, nothing is done when it was replaced
+                already, so calls failing at once recycle it only once
+    """
+    if ppool is None or (old is not None and ppool is not old):
+        return
+    old = ppool
+    _new_ppool(old._max_workers)
+    # _processes is private, but it is the only handle to the workers
+    processes = list((getattr(old, '_processes', None) or {}).values())
+    old.shutdown(wait=False)
+    for process in processes:
+        process.terminate()
+
+
+class ProcessTarget(object):
+    """
+    Picklable reference to a handler running in the process pool.
+    A function is sent to the worker by its import path, a bound method
+    is pickled together with its instance.
+    """
+
+    def __init__(self, func):
+        self.name = getattr(func, '__qualname__', repr(func))
+        if inspect.ismethod(func):
+            self.path = None
+            self.func = func
+        else:
+            self.path = (func.__module__, func.__qualname__)
+            self.func = None
+            try:
+                importable = self.resolve() is func
+            except (ImportError, AttributeError):
+                importable = False
+            if not importable:
+                raise ValueError('%s is not importable as %s.%s, it can not run in the '
+                                 'process pool' % (func, self.path[0], self.path[1]))
+        try:
+            pickle.dumps(self)
+        except Exception as e:
+            raise ValueError('%s can not be pickled for the process pool: %s' % (func, e))
+
+    def __getstate__(self):
+        if self.path is not None:
+            return {'name': self.name, 'path': self.path, 'func': None}
+        return self.__dict__
+
+    def resolve(self):
+        if self.func is None:
+            module, qualname = self.path
+            obj = importlib.import_module(module)
+            for attr in qualname.split('.'):
+                obj = getattr(obj, attr)
+            self.func = obj
+        return self.func
+
+
+def run_timed(marks, func, args, kwargs, deadline=None):
+    """
+    Run a call in the thread pool, appending its start and end times to
+    `marks` so the caller can tell the queue wait from the run time.
+    :param deadline: time.monotonic() after which the call is dropped
+                     instead of started
+    """
+    marks.append(time.perf_counter())
+    if deadline is not None and time.monotonic() > deadline:
+        raise QueueTimeout()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        marks.append(time.perf_counter())
+
+
+def run_in_process(target, payload, deadline=None, call_deadline=None, call_id=0):
+    """
+    Entry of a call in the worker process. Arguments come pickled by the
+    caller, the result goes back pickled so that an unpicklable result is
+    reported as such instead of breaking the pool.
+    :param deadline: as for run_timed, the monotonic clock is system-wide
+                     so it holds across processes
+    :param call_deadline: deadline of the cancellation token of the call
+    :param call_id: from next_call_id(), shown by executing() while the
+                    call runs
+    """
+    if _worker_executing is not None:
+        # marked before the deadline check: a caller timing out that
+        # doesn't see it yet knows the call won't start
+        _worker_executing[_worker_slot] = call_id
+    try:
+        if deadline is not None and time.monotonic() > deadline:
+            raise QueueTimeout()
+        args, kwargs = pickle.loads(payload)
+        token = cancellation.CancelToken(call_deadline)
+        result = cancellation.run_with(token, target.resolve(), *args, **kwargs)
+    finally:
+        if _worker_executing is not None:
+            _worker_executing[_worker_slot] = 0
+    try:
+        return pickle.dumps(result)
+    except Exception as e:
+        raise UnpicklableResult('Result of %s can not be pickled: %s' % (target.name, e))
@@ -0,0 +1,232 @@
+"""
+Sampling profiler of a live server.
+
+With CONFIG['profiler'], `GET CONFIG['profiler_path']?seconds=5` samples
+the stacks of the event loop thread and of the thread pool workers for
+that many seconds and answers them as collapsed stacks, one line per
+stack with its number of samples, ready for flamegraph.pl or speedscope:
+
+    dmall.ams.TestApi;thread_pool;_worker (thread.py:69);...;TestApi (server.py:12) 41
+
+The first frame is the RPC method the thread was working on when it was
+sampled, found from the dispatch frames on its stack ('-' for framework
+code outside any call), the second one the thread. Idle threads, a loop
+waiting in select or a worker waiting for a call, are left out unless
+`idle=1`.
+
+The overhead is bounded: one profile runs at a time, for at most
+CONFIG['profiler_max_seconds'], a sample is taken every
+CONFIG['profiler_interval'] seconds at most, and less often when sampling
+would take more than CONFIG['profiler_max_overhead'] of a CPU. A server
+of several processes is profiled one process at a time, the one the
+request reaches.
+"""
+import asyncio
+import collections
+import os
+import selectors
+import sys
+import threading
+import time
+from concurrent.futures import thread as futures_thread
+
+from aiohttp import web
+
+from asynciorpc import pool
+from asynciorpc.config import CONFIG
+from asynciorpc.routes import ROUTES
+
+# frames kept per stack, from the innermost one
+MAX_DEPTH = 128
+
+# the running Sampler, one at a time
+_running = None
+
+
+def _label(code):
+    name = getattr(code, 'co_qualname', code.co_name)
+    return '%s (%s:%d)' % (name.replace(';', ':'), os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+def _markers():
+    """
+    Code of the dispatch frames -> method name of such a frame
+    """
+    from asynciorpc.rpc.base import BaseRPCParser
+    from asynciorpc.streaming import ThreadStream
+
+    names = {}
+    for name, route in ROUTES.items():
+        try:
+            names[route.func] = name
+        except TypeError:
+            # unhashable handler, its samples go to '-'
+            pass
+    return {
+        # the event loop thread, coroutine and inline handlers
+        BaseRPCParser._dispatch.__code__: lambda frame: frame.f_locals.get('method_name'),
+        # the pool threads
+        pool.run_timed.__code__: lambda frame: names.get(frame.f_locals.get('func')),
+        ThreadStream.produce.__code__: lambda frame: frame.f_locals['self'].route.name,
+    }
+
+
+def _pool_threads():
+    """
+    thread id -> name of its pool, for the worker threads of the pools
+    created so far
+    """
+    executors = [('thread_pool', pool.tpool)]
+    executors += [('thread_pool:%s' % group, executor) for group, executor in pool.tpools.items()]
+    threads = {}
+    for name, executor in executors:
+        # _threads is private, but it is the only handle to the workers
+        for thread in list(getattr(executor, '_threads', None) or ()):
+            if thread.ident is not None:
+                threads[thread.ident] = name
+    return threads
+
+
+class Sampler(object):
+    """
+    Samples the stacks of the loop thread and of the pool threads from
+    its own thread, until `seconds` have passed or it is stopped
+    """
+
+    def __init__(self, loop_thread: int, seconds: float, interval: float,
+                 max_overhead: float, idle: bool=False):
+        self.loop_thread = loop_thread
+        self.seconds = seconds
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.idle = idle
+        self.stacks = collections.Counter()
+        self.samples = 0
+        # seconds spent sampling
+        self.busy = 0.0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._labels = {}
+        self._markers = _markers()
+        self._idle_codes = {futures_thread._worker.__code__, selectors.DefaultSelector.select.__code__}
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        started = time.perf_counter()
+        deadline = started + self.seconds
+        threads = {}
+        while True:
+            before = time.perf_counter()
+            if not self.samples % 10:
+                # pools grow as calls come in
+                threads = _pool_threads()
+                threads[self.loop_thread] = 'event_loop'
+            self.sample(threads)
+            now = time.perf_counter()
+            cost = now - before
+            self.busy += cost
+            if now >= deadline:
+                break
+            # no more than max_overhead of a CPU on sampling
+            wait = max(self.interval, cost / self.max_overhead - cost)
+            if self._stop.wait(min(wait, deadline - now)):
+                break
+        self.elapsed = time.perf_counter() - started
+
+    def sample(self, threads):
+        self.samples += 1
+        labels = self._labels
+        markers = self._markers
+        for ident, frame in sys._current_frames().items():
+            thread = threads.get(ident)
+            if thread is None:
+                continue
+            if not self.idle and frame.f_code in self._idle_codes:
+                continue
+            stack = []
+            method = None
+            while frame is not None and len(stack) < MAX_DEPTH:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _label(code)
+                stack.append(label)
+                if method is None and code in markers:
+                    try:
+                        method = markers[code](frame)
+                    except Exception:
+                        pass
+                frame = frame.f_back
+            if frame is not None:
+                # cut at MAX_DEPTH
+                stack.append('...')
+            stack.append(thread)
+            stack.append(method or '-')
+            stack.reverse()
+            self.stacks[';'.join(stack)] += 1
+
+    def collapsed(self) -> str:
+        return ''.join('%s %d\n' % (stack, count) for stack, count in self.stacks.most_common())
+
+
+async def profile(seconds: float, interval: float=None, idle: bool=False) -> Sampler:
+    """
+    Sample the stacks of this process for `seconds`, called on the
+    event loop thread
+    :raise RuntimeError: when a profile is already running
+    """
+    global _running
+    if _running is not None:
+        raise RuntimeError('A profile is already running')
+    loop = asyncio.get_event_loop()
+    sampler = _running = Sampler(threading.get_ident(), seconds,
+                                 max(interval or CONFIG['profiler_interval'], 0.001),
+                                 CONFIG['profiler_max_overhead'], idle)
+    done = loop.create_future()
+
+    def run():
+        try:
+            sampler.run()
+        finally:
+            try:
+                loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+            except RuntimeError:
+                # the loop is closed
+                pass
+
+    try:
+        threading.Thread(target=run, name='asynciorpc-profiler', daemon=True).start()
+        await done
+    finally:
+        # stops a sampler whose request is gone too
+        sampler.stop()
+        _running = None
+    return sampler
+
+
+async def profile_handler(request):
+    """
+    Collapsed stacks of `?seconds=` (5) of sampling, `?interval=` seconds
+    apart, `?idle=1` to keep the idle threads
+    """
+    try:
+        seconds = float(request.query.get('seconds', 5))
+        interval = float(request.query['interval']) if 'interval' in request.query else None
+    except ValueError:
+        raise web.HTTPBadRequest(text='seconds and interval must be numbers')
+    if not seconds > 0 or not (interval is None or interval > 0):
+        raise web.HTTPBadRequest(text='seconds and interval must be positive')
+    seconds = min(seconds, CONFIG['profiler_max_seconds'])
+    try:
+        sampler = await profile(seconds, interval, request.query.get('idle') == '1')
+    except RuntimeError as e:
+        raise web.HTTPConflict(text=str(e))
+    headers = {
+        'X-Profile-Samples': str(sampler.samples),
+        'X-Profile-Seconds': '%.3f' % sampler.elapsed,
+        # share of a CPU the sampling took
+        'X-Profile-Overhead': '%.4f' % (sampler.busy / sampler.elapsed if sampler.elapsed else 0),
+    }
+    return web.Response(text=sampler.collapsed(), headers=headers)
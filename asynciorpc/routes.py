@@ -0,0 +1,130 @@
+"""
+Routing index of the registered interfaces.
+
+`register` adds a prebuilt `Route` for every interface, so the parser
+finds a method with a single dict lookup instead of walking the
+attribute tree of the Handler on every call.
+"""
+import inspect
+from collections import namedtuple
+from types import MappingProxyType
+from .admission import Limiter
+from .cache import make_cache
+from .config import CONFIG
+from .inline import Profile
+from .pool import ProcessTarget
+
+
+Route = namedtuple('Route', ['name', 'func', 'private', 'auth', 'timeout', 'executor', 'binder', 'target',
+                             'cache', 'limiter', 'queue_timeout', 'pool', 'stream', 'profile'])
+Route.__doc__ = """
+Call descriptor of a registered interface
+:param name: full rpc name (COMPANY.SERVICE.name)
+:param func: the handler function
+:param private: hidden from dispatch and introspection
+:param auth: `_need_authenticated` function of the handler or None
+:param timeout: maximum seconds to run the handler or None
+:param executor: 'coroutine', 'inline', 'thread' or 'process'
+:param binder: compiled `ArgumentBinder` of func
+:param target: picklable `ProcessTarget` of func for the 'process' executor
+:param cache: `ResponseCache` of the interface or None
+:param limiter: `Limiter` of the calls running at once or None
+:param queue_timeout: maximum seconds to wait for a pool worker or None
+:param pool: method group of CONFIG['thread_pools'] to run in, None for the shared thread pool
+:param stream: the handler is a generator, its items are streamed
+:param profile: run times of a 'thread' handler which moves inline once it is cheap,
+                see CONFIG['auto_inline'], or None
+"""
+
+_routes = {}
+_directory = {}
+
+# read-only views, only `add_route` writes to them
+ROUTES = MappingProxyType(_routes)
+DIRECTORY = MappingProxyType(_directory)
+
+
+def build_route(func, name: str, timeout: (int, float)=None, executor: str=None, cache=None,
+                concurrency: int=None, queue_timeout: (int, float)=None, pool: str=None):
+    """
+    Build the call descriptor of a handler
+    :param func: handler function
+    :param name: full rpc name
+    :param timeout: maximum timeout to run the handler function
+    :param executor: 'inline', 'thread' or 'process', guessed from the handler if None
+    :param cache: CachePolicy, dict of its arguments or True to cache the responses
+    :param concurrency: maximum calls running at once
+    :param queue_timeout: maximum seconds to wait for a pool worker
+    :param pool: method group with its own thread pool
+    """
+    private = any(part.startswith('_') for part in name.split('.')) \
+        or getattr(func, 'private', False) is True
+    stream = inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func)
+    profiled = False
+    if inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func):
+        if executor is not None:
+            raise ValueError('Coroutine handler %s runs on the event loop, '
+                             'executor must be None' % name)
+        executor = 'coroutine'
+    elif executor is None:
+        executor = 'process' if hasattr(func, '_new_process') else 'thread'
+        # only guessed thread handlers are profiled, an explicit executor is kept
+        profiled = executor == 'thread' and CONFIG['auto_inline'] and pool is None
+    elif executor not in ('inline', 'thread', 'process'):
+        raise ValueError('Unknown executor %r for %s' % (executor, name))
+    if pool is not None:
+        if executor != 'thread':
+            raise ValueError('Only thread handlers run in a method group pool, %s runs in %s'
+                             % (name, executor))
+        if pool not in CONFIG['thread_pools']:
+            raise ValueError('Unknown thread pool %r for %s, add it to thread_pools in config.yaml'
+                             % (pool, name))
+
+    if stream:
+        if executor in ('process', 'inline'):
+            raise ValueError('Generator handler %s can not run in the %s executor' % (name, executor))
+        profiled = False
+        if cache:
+            raise ValueError('The results of generator handler %s can not be cached' % name)
+
+    # the asynciorpc.rpc package imports this module
+    from .rpc.utils import get_binder
+    binder = get_binder(func)
+    limiter = Limiter(concurrency) if concurrency else None
+    return Route(name=name, func=func, private=private,
+                 auth=getattr(func, '_need_authenticated', None),
+                 timeout=timeout or None, executor=executor,
+                 binder=binder,
+                 target=ProcessTarget(func) if executor == 'process' else None,
+                 cache=make_cache(name, cache, binder) if cache else None,
+                 limiter=limiter,
+                 queue_timeout=queue_timeout or None,
+                 pool=pool,
+                 stream=stream,
+                 profile=Profile() if profiled else None)
+
+
+def add_route(route: Route):
+    """
+    Put a route into the index and list it for `__dir__` introspection
+    """
+    _routes[route.name] = route
+    if route.private:
+        return
+
+    # every prefix lists its direct children, '' being the root
+    parts = route.name.split('.')
+    for i in range(len(parts)):
+        prefix = '.'.join(parts[:i])
+        children = set(_directory.get(prefix, ()))
+        children.add(parts[i])
+        _directory[prefix] = tuple(sorted(children))
+
+
+def list_children(method_name: str):
+    """
+    Resolve a `__dir__` call such as `company.service.__dir__`
+    :return: names under the prefix or None if the prefix is unknown
+    """
+    prefix = method_name[:-len('__dir__')].rstrip('.')
+    return _directory.get(prefix)
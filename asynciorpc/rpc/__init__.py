@@ -13,4 +13,4 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from .base import private, async, config
+from .base import private, async_, config
@@ -10,12 +10,17 @@ You can use the utility functions like 'private' and 'start_server'.
 import asyncio
 import base64
 import concurrent
-import inspect
+import contextvars
+import pickle
+import sys
+import time
 import traceback
-from .. bases import Interface
-from .. pool import tpool
-from .utils import getcallargs
-from asynciorpc import config as rpc_config
+from concurrent.futures.process import BrokenProcessPool
+from .. import admission, cancellation, compression, inline, metrics, pool, streaming, tracing
+from .. exceptions import UnpicklableResult, QueueTimeout, CallCancelled, BodyTooLarge, \
+    ContentEncodingError, FAULT_CODES
+from .. routes import ROUTES, list_children
+from asynciorpc.config import CONFIG
 from aiohttp import web
 
 # Configuration element
@@ -25,16 +30,51 @@ class Config(object):
 
 config = Config()
 
+class RequestContext(object):
+    """
+    State of one request going through the shared parser
+    :param request: the aiohttp request, or what stands for it
+                    on the other transports
+    """
+    __slots__ = ('request', 'deadline', 'requests', 'batch', 'status', 'headers', 'streams')
+
+    def __init__(self, request=None):
+        self.request = request
+        # time.monotonic() the client gave the whole request
+        self.deadline = None
+        # the parsed request objects, set once the body is parsed
+        self.requests = None
+        self.batch = False
+        self.status = 200
+        # extra response headers
+        self.headers = None
+        # the transport writes the items of generator handlers
+        # as they come, the others get them as a list
+        self.streams = False
+
+    def set_header(self, key, value):
+        if self.headers is None:
+            self.headers = {}
+        self.headers[key] = value
+
+    def set_status(self, status: int):
+        self.status = status
+
+
 class BaseRPCParser(object):
     """
     This class is responsible for managing the request, dispatch,
     and response formatting of the system. It is tied into the
     _RPC_ attribute of the BaseRPCHandler (or subclasses) and
-    populated as necessary throughout the request. Use the
-    .faults attribute to take advantage of the built-in error
-    codes.
+    shared by all the requests, their state is kept in the
+    RequestContext passed along. Use the .faults attribute to
+    take advantage of the built-in error codes.
     """
     content_type = 'text/plain'
+    # whether the protocol has encode_entry, stream_frame and
+    # encode_items, the handler writes streamed responses with them,
+    # and only then
+    streams_responses = False
 
     def __init__(self, library, encode=None, decode=None):
         # Attaches the RPC library and encode / decode functions.
@@ -45,15 +85,10 @@ class BaseRPCParser(object):
             decode = getattr(library, 'loads')
         self.encode = encode
         self.decode = decode
-        self.requests_in_progress = 0
-        self.responses = []
-
-    @property
-    def faults(self):
-        # Grabs the fault tree on request
-        return Faults(self)
+        # the fault tree, built once
+        self.faults = Faults(self)
 
-    async def run(self, handler, request_body):
+    async def run(self, context, request_body):
         """
         This is the main loop -- it passes the request body to
         the parse_request method, and then takes the resulting
@@ -62,117 +97,153 @@ class BaseRPCParser(object):
         into text and returns it to the parent Handler to send back
         to the client.
         """
-        self.handler = handler
+        requests = self.parse(context, request_body)
+        if not isinstance(requests, tuple):
+            # SHOULD be the result of a fault call,
+            # according tothe parse_request spec below.
+            # parse_responses turns it into the response.
+            return [requests]
+        if len(requests) == 1:
+            # one call needs no task of its own
+            return [await self.dispatch(context, *requests[0], index=0)]
+        return await self.start_batch(context, requests).results()
+
+    def parse(self, context, request_body):
+        """
+        parse_request, timed, the parse_error fault if it raises
+        """
+        started = time.perf_counter()
         try:
-            request_body = request_body.decode()
-            requests = self.parse_request(request_body)
+            requests = self.parse_request(context, request_body)
         except:
             #self.traceback()
-            return [self.faults.parse_error()]
+            return self.faults.parse_error()
+        if metrics.enabled:
+            metrics.parse_seconds.observe(time.perf_counter() - started)
+        if tracing.enabled:
+            tracing.record('rpc.parse', started, time.perf_counter())
+        return requests
+
+    async def run_stream(self, context, chunks):
+        """
+        run() over an async iterator of the chunks of the body.
+        Protocols able to parse a body while it arrives override
+        this, here it is read whole first.
+        """
+        request_body = b''.join([chunk async for chunk in chunks])
+        return await self.run(context, request_body)
+
+    async def start_stream(self, context, chunks):
+        """
+        Like run_stream, but returns as soon as the calls are started,
+        for a response written as they complete. Returns a Batch, or
+        the fault answering for the whole request.
+        """
+        request_body = b''.join([chunk async for chunk in chunks])
+        return self.start(context, request_body)
 
+    def start(self, context, request_body):
+        requests = self.parse(context, request_body)
         if not isinstance(requests, tuple):
-            # SHOULD be the result of a fault call,
-            # according tothe parse_request spec below.
-            if isinstance(requests, str):
-                # Should be the response text of a fault
-                # This will break in Python 3.x
-                return requests
-            elif hasattr(requests, 'response'):
-                # Fault types should have a 'response' method
-                return requests.response()
-            elif hasattr(requests, 'faultCode'):
-                # XML-RPC fault types need to be properly dispatched. This
-                # should only happen if there was an error parsing the
-                # request above.
-                #return self.handler.result(requests)
-                return requests.response()
-            else:
-                # No idea, hopefully the handler knows what it
-                # is doing.
-                return requests
-        self.handler._requests = len(requests)
-        responses = []
+            return requests
+        return self.start_batch(context, requests)
+
+    def start_batch(self, context, requests):
+        """
+        Start the calls of the parsed requests, see Batch
+        """
+        batch = Batch(self, context)
         for request in requests:
-            responses.append(await self.dispatch(request[0], request[1]))
-        return responses
+            batch.start(request)
+        return batch
+
+    def batch_limit_fault(self):
+        return self.faults.invalid_request(
+            'Batches are limited to %d calls' % CONFIG['max_batch_size'])
 
-    async def dispatch(self, method_name, params):
+    async def dispatch(self, context, method_name, params, deadline=None, index=None):
         """
-        This method walks the attribute tree in the method
-        and passes the parameters, either in positional or
-        keyword form, into the appropriate method on the
-        Handler class. Currently supports only positional
-        or keyword arguments, not mixed.
+        Dispatch one call, counting it in the metrics and tracing it.
+        :param index: position of the call in its batch, None for a single call
         """
+        if tracing.enabled:
+            return await self._traced_dispatch(context, method_name, params, deadline, index)
+        if not metrics.enabled:
+            return await self._dispatch(context, method_name, params, deadline)
+        return await self._measured_dispatch(context, method_name, params, deadline)
+
+    async def _measured_dispatch(self, context, method_name, params, deadline=None):
+        if not metrics.enabled:
+            return await self._dispatch(context, method_name, params, deadline)
+        label = method_name if method_name in ROUTES else 'unknown'
+        metrics.requests_total.inc(label)
+        metrics.in_flight.inc(label)
+        try:
+            response = await self._dispatch(context, method_name, params, deadline)
+        finally:
+            metrics.in_flight.dec(label)
+        if isinstance(response, self.library.Fault):
+            metrics.faults_total.inc(label, metrics.fault_name(response))
+        return response
+
+    async def _traced_dispatch(self, context, method_name, params, deadline=None, index=None):
+        span, token = tracing.start('rpc.call', method=method_name)
+        if span is None:
+            # not within a traced request
+            return await self._measured_dispatch(context, method_name, params, deadline)
+        if index is not None and context.batch:
+            span.set('batch_index', index)
+        response = None
+        try:
+            response = await self._measured_dispatch(context, method_name, params, deadline)
+            return response
+        finally:
+            if isinstance(response, self.library.Fault):
+                span.set('fault_code', response.faultCode)
+            tracing.finish(span, token)
 
-        INNER_METHOD = []
-        INNER_CLASS = []
+    async def _dispatch(self, context, method_name, params, deadline=None):
+        """
+        This method looks the method up in the routing index
+        built by `register` and passes the parameters, either
+        in positional or keyword form, into the handler.
+        Currently supports only positional or keyword
+        arguments, not mixed.
+        `deadline` is the time.monotonic() the client gave
+        this call, the one of the whole request applies too.
+        """
+        if context.deadline is not None and (deadline is None or context.deadline < deadline):
+            deadline = context.deadline
+        if deadline is not None and deadline <= time.monotonic():
+            # nobody is waiting for the result anymore
+            return self.faults.service_timeout()
 
         # list all methods
-        if method_name == '__dir__':
-            return [i for i in dir(self.handler)
-                                 if not inspect.isroutine(getattr(self.handler, i))
-                                 and not i.startswith('_')
-                                 and isinstance(getattr(self.handler, i), Interface)
-                                 and i not in INNER_METHOD
-                                 ]
-
-        # if hasattr(RequestHandler, method_name):
-        #     # Pre-existing, not an implemented attribute
-        #     return self.faults.method_not_found()
-
-        method = self.handler
-        method_list = dir(method)
-        method_list.sort()
-        attr_tree = method_name.split('.')
-
-        # check list method
-        if '__dir__' not in method_name:
-            try:
-                for attr_name in attr_tree:
-                    method = self.check_method(attr_name, method)
-            except AttributeError:
+        if method_name.endswith('__dir__'):
+            children = list_children(method_name)
+            if children is None:
                 return self.faults.method_not_found()
-        else:
-            for attr_name in attr_tree[:-1]:
-                if attr_name != '__dir__':
-                    method = self.check_method(attr_name, method)
-                else:
-                    break
-            return [i for i in dir(method) if not i.startswith('_')
-                                 and not getattr(getattr(method, i), 'private', False)
-                                 and not inspect.isroutine(method)
-                                 and i not in INNER_METHOD
-                                 and not any([isinstance(getattr(method, i), cls) for cls in INNER_CLASS])]
-
-        if not callable(method):
-            # Not callable, so not a method
-            return self.faults.method_not_found()
+            return list(children)
 
-        if (method_name.startswith('_')) or \
-                getattr(method, 'private', False) is True:
-            # No, no. That's private.
+        route = ROUTES.get(method_name)
+        if route is None or route.private:
+            # Not registered, or that's private.
             return self.faults.method_not_found()
 
-        def _request_auth(handler):
-            handler.set_header('WWW-Authenticate', 'Basic realm=tmr')
-            handler.set_status(401)
-            return self.faults.not_authorized()
-
         # HTTP Basic Authentication
-        if hasattr(method, '_need_authenticated'):
-            auth_func = getattr(method, '_need_authenticated')
-            auth_header = self.handler.request.headers.get('Authorization')
+        if route.auth is not None:
+            auth_func = route.auth
+            auth_header = context.request.headers.get('Authorization')
             if auth_header is None:
-                return _request_auth(self.handler)
+                return self._request_auth(context)
             if not auth_header.startswith('Basic '):
-                return _request_auth(self.handler)
+                return self._request_auth(context)
 
             auth_decoded = base64.decodebytes(auth_header.encode()[6:])
             username, password = auth_decoded.decode().split(':', 2)
 
             if not auth_func(username, password):
-                return _request_auth(self.handler)
+                return self._request_auth(context)
 
         args = []
         kwargs = {}
@@ -188,38 +259,240 @@ class BaseRPCParser(object):
         # Validating call arguments
 
         try:
-            final_kwargs, extra_args = getcallargs(method, *args, **kwargs)
-            # check type hints
-            type_hints = method.__annotations__
-            for k, v in final_kwargs.items():
-                if k in type_hints:
-                    assert isinstance(v, type_hints[k])
-        except (TypeError, AssertionError):
+            # bind and check type hints
+            # the handler gets its defaults from Python, the cache key needs them
+            final_kwargs, extra_args = route.binder.bind(args, kwargs, validate=True,
+                                                         defaults=route.cache is not None)
+        except TypeError:
             return self.faults.invalid_params()
+        if tracing.enabled:
+            span = tracing.current()
+            if span is not None:
+                span.set('bound_args', len(final_kwargs) + len(extra_args))
+
+        if route.cache is not None:
+            key = route.cache.key(final_kwargs, extra_args)
+            if key is not None:
+                # answered before reaching any pool, the shared call
+                # runs with the registered timeout, each caller waits
+                # within its own deadline
+                call = route.cache.call(
+                    key, lambda: self._call(route, params, extra_args, final_kwargs),
+                    self._is_fault)
+                if deadline is None:
+                    return await call
+                try:
+                    return await asyncio.wait_for(call, deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    return self.faults.service_timeout()
+        return await self._call(route, params, extra_args, final_kwargs, deadline, context)
+
+    def _request_auth(self, context):
+        context.set_header('WWW-Authenticate', 'Basic realm=tmr')
+        context.set_status(401)
+        return self.faults.not_authorized()
+
+    def _refuse_busy(self, context):
+        if context is not None and not context.batch:
+            # a request of one call is refused as a whole, a load
+            # balancer can send it elsewhere
+            context.set_status(503)
+        return self.faults.server_busy()
+
+    def _is_fault(self, response):
+        return isinstance(response, self.library.Fault)
+
+    async def _call(self, route, params, extra_args, final_kwargs, deadline=None, context=None):
+        """
+        Run the handler of a route with its bound arguments, unless
+        the server is too busy to take it
+        """
+        if not admission.admit(route):
+            return self._refuse_busy(context)
+        response = None
+        try:
+            if route.stream:
+                response = await self._stream(route, params, extra_args, final_kwargs, deadline,
+                                              context)
+            else:
+                response = await self._execute(route, params, extra_args, final_kwargs, deadline)
+            return response
+        finally:
+            if isinstance(response, streaming.ResultStream):
+                # the call goes on until the stream is written
+                response.add_close_callback(admission.release, route)
+            else:
+                admission.release(route)
+
+    async def _stream(self, route, params, extra_args, final_kwargs, deadline=None, context=None):
+        """
+        Start a generator handler. Returns its ResultStream once the
+        first items are there when the transport streams them, the
+        list of all the items otherwise.
+        """
+        timeout = route.timeout
+        if deadline is not None:
+            budget = deadline - time.monotonic()
+            if budget <= 0:
+                return self.faults.service_timeout()
+            if not timeout or budget < timeout:
+                timeout = budget
+        # the timeout is the one of the whole stream
+        token = cancellation.CancelToken(time.monotonic() + timeout if timeout else None)
+
+        if route.executor == 'thread':
+            stream = streaming.ThreadStream(route, params, token, CONFIG['stream_window'])
+            queue_timeout = route.queue_timeout or CONFIG['queue_timeout']
+            queue_deadline = time.monotonic() + queue_timeout if queue_timeout else None
+            context_copy = contextvars.copy_context()
+            context_copy.run(cancellation.set_token, token)
+            stream.future = pool.thread_pool(route.pool).submit(
+                context_copy.run, stream.produce, route.func, extra_args, final_kwargs,
+                queue_deadline)
+        else:
+            stream = streaming.AsyncGeneratorStream(route, params, token,
+                                                    route.func(*extra_args, **final_kwargs))
+
+        try:
+            if context is None or not context.streams or context.batch:
+                return await stream.collect()
+            await stream.start()
+        except Exception as error:
+            await stream.close()
+            return self.stream_fault(stream, error)
+        return stream
+
+    def stream_fault(self, stream, error):
+        """
+        The fault of a generator handler which raised `error`
+        """
+        if isinstance(error, (asyncio.TimeoutError, CallCancelled)):
+            return self.faults.service_timeout()
+        if isinstance(error, QueueTimeout):
+            return self.faults.server_busy()
+        try:
+            raise error
+        except Exception:
+            self.traceback(stream.route.name, stream.params)
+        if isinstance(error, ValueError):
+            return self.faults.invalid_params()
+        return self.faults.internal_error()
+
+    async def _execute(self, route, params, extra_args, final_kwargs, deadline=None):
+        method_name = route.name
+        method = route.func
+        executor = route.executor
+        if route.profile is not None and route.profile.inline:
+            executor = 'inline'
+        # the client budget cuts the registered timeout
+        timeout = route.timeout
+        if deadline is not None:
+            budget = deadline - time.monotonic()
+            if budget <= 0:
+                return self.faults.service_timeout()
+            if not timeout or budget < timeout:
+                timeout = budget
+        if executor == 'process':
+            try:
+                payload = pickle.dumps((extra_args, final_kwargs))
+            except Exception:
+                return self.faults.invalid_params(
+                    'Arguments of %s can not be pickled for the process pool' % method_name)
 
         try:
             # Call method
-            # modified: pass self.handler to class of method
-            #method.__self__.rpc_handler = self.handler
-            timeout = rpc_config.TIMEOUTS.get(method)
-            if not inspect.iscoroutinefunction(method):
-                future = asyncio.wrap_future(tpool.submit(method, *extra_args, **final_kwargs))
+            # handlers check it to stop cooperatively once timed out
+            token = cancellation.CancelToken(time.monotonic() + timeout if timeout else None)
+            # a call still queued past this isn't started at all
+            queue_timeout = route.queue_timeout or CONFIG['queue_timeout']
+            queue_deadline = time.monotonic() + queue_timeout if queue_timeout else None
+            if token.deadline is not None and (queue_deadline is None or token.deadline < queue_deadline):
+                queue_deadline = token.deadline
+            # perf_counter at submission, the thread pool appends
+            # the ones at the start and the end of the call
+            marks = [time.perf_counter()]
+            reset = None
+            future = None
+            ppool = None
+            if executor == 'inline':
+                # no thread hop, the handler holds the loop while it runs
+                response = inline.call(route, extra_args, final_kwargs, token)
+            elif executor == 'thread':
+                # the pool thread runs in a copy of the context of the call
+                context = contextvars.copy_context()
+                context.run(cancellation.set_token, token)
+                thread_future = pool.thread_pool(route.pool).submit(
+                    context.run, pool.run_timed, marks, method, extra_args, final_kwargs, queue_deadline)
+                future = asyncio.wrap_future(thread_future)
+            elif executor == 'process':
+                ppool = pool.process_pool()
+                call_id = pool.next_call_id()
+                process_future = ppool.submit(pool.run_in_process, route.target, payload,
+                                              queue_deadline, token.deadline, call_id)
+                future = asyncio.wrap_future(process_future)
             else:
+                reset = cancellation.set_token(token)
                 future = method(*extra_args, **final_kwargs)
 
-            if not timeout:
-                response = await future
-            else:
-                response = await asyncio.wait_for(future, timeout=timeout)
+            if future is not None:
+                try:
+                    if metrics.enabled and executor != 'coroutine':
+                        response = await self._measure_pool(executor, future, timeout)
+                    elif not timeout:
+                        response = await future
+                    else:
+                        response = await asyncio.wait_for(future, timeout=timeout)
+                finally:
+                    if reset is not None:
+                        cancellation.reset_token(reset)
+                if route.profile is not None and len(marks) > 2:
+                    route.profile.observe(marks[2] - marks[1])
+            if executor == 'process':
+                response = pickle.loads(response)
+            if metrics.enabled:
+                done = time.perf_counter()
+                started = marks[1] if len(marks) > 1 else marks[0]
+                if len(marks) > 1:
+                    metrics.queue_seconds.observe(started - marks[0], method_name)
+                metrics.execute_seconds.observe(done - started, method_name)
+            if tracing.enabled:
+                tracing.record_execution(executor, marks, time.perf_counter())
         except (asyncio.TimeoutError, concurrent.futures.TimeoutError):
+            token.cancel()
+            if executor == 'thread':
+                # not started yet: dropped, started: left running
+                # until it checks its token
+                if not thread_future.cancel() and not thread_future.done():
+                    self._watch_zombie(route, thread_future)
+            elif executor == 'process' and not process_future.cancel() \
+                    and timeout == route.timeout and pool.executing(ppool, call_id):
+                # the worker can't be interrupted, replace it. Not for
+                # a client budget, clients don't get to break the
+                # calls of others, the token tells the handler to stop.
+                # Not for a call still queued to a worker either, it is
+                # past its deadline and won't start
+                pool.recycle_ppool(ppool)
             return self.faults.service_timeout()
+        except CallCancelled:
+            return self.faults.service_timeout()
+        except QueueTimeout:
+            return self.faults.server_busy()
+        except UnpicklableResult as e:
+            return self.faults.internal_error(str(e))
+        except BrokenProcessPool:
+            self.traceback(method_name, params)
+            if ppool is not None:
+                # a crashed worker breaks the whole pool, replace it
+                # for the calls to come
+                pool.recycle_ppool(ppool)
+            return self.faults.internal_error('Process pool worker died')
         except ValueError:
             return self.faults.invalid_params()
         except Exception:
             self.traceback(method_name, params)
             return self.faults.internal_error()
 
-        if getattr(method, 'async', False):
+        if getattr(method, 'async_', False):
             # Asynchronous response -- the method should have called
             # self.result(RESULT_VALUE)
             if response is not None:
@@ -229,24 +502,45 @@ class BaseRPCParser(object):
             # Synchronous result -- we call result manually.
             return response
 
-    def response(self, handler, results):
+    def _watch_zombie(self, route, thread_future):
+        """
+        Count a timed out call still holding its pool thread until it returns
+        """
+        if not metrics.enabled:
+            return
+        group = route.pool or 'default'
+        metrics.zombies_total.inc(route.name)
+        metrics.zombie_threads.inc(group)
+        loop = asyncio.get_event_loop()
+
+        def done(future):
+            # runs in the pool thread, metrics are updated on the loop
+            try:
+                loop.call_soon_threadsafe(metrics.zombie_threads.dec, group)
+            except RuntimeError:
+                # the loop is closed
+                pass
+
+        thread_future.add_done_callback(done)
+
+    async def _measure_pool(self, executor, future, timeout):
+        metrics.executor_in_flight.inc(executor)
+        try:
+            if not timeout:
+                return await future
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            metrics.executor_in_flight.dec(executor)
+
+    def response(self, context, results):
         """
         This is the callback for a single finished dispatch.
         Once all the dispatches have been run, it calls the
         parser library to parse responses and then calls the
         handler's async method.
         """
-        #handler._requests -= 1
-        #if handler._requests > 0:
-        #    return
-        # We are finished with requests, send response
-        # if handler._RPC_finished:
-        #     # We've already sent the response
-        #     raise Exception("Error trying to send response twice.")
-        #handler._RPC_finished = True
-
         responses = tuple(results)
-        response_text = self.parse_responses(responses)
+        response_text = self.parse_responses(context, responses)
         if type(response_text) not in [str, bytes]:
             # Likely a fault, or something messed up
             response_text = self.encode(response_text)
@@ -255,6 +549,10 @@ class BaseRPCParser(object):
         return response_text
 
     def traceback(self, method_name='REQUEST', params=[]):
+        if tracing.enabled:
+            span = tracing.current()
+            if span is not None:
+                span.set('error', traceback.format_exception_only(*sys.exc_info()[:2])[-1].strip())
         err_lines = traceback.format_exc().splitlines()
         err_title = "ERROR IN %s" % method_name
         if len(params) > 0:
@@ -271,9 +569,10 @@ class BaseRPCParser(object):
         # Log here
         return
 
-    def parse_request(self, request_body):
+    def parse_request(self, context, request_body):
         """
-        Extend this on the implementing protocol. If it
+        Extend this on the implementing protocol, keeping
+        what parse_responses needs in the context. If it
         should error out, return the output of the
         'self.faults.fault_name' response. Otherwise,
         it MUST return a TUPLE of TUPLE. Each entry
@@ -281,13 +580,15 @@ class BaseRPCParser(object):
         ('method_name', params)
         ...where params is a list or dictionary of
         arguments (positional or keyword, respectively.)
+        An entry may carry a third item, the time.monotonic()
+        deadline the client gave the call.
         So, the result should look something like
         the following:
         ( ('add', [5,4]), ('add', {'x':5, 'y':4}) )
         """
         return ([], [])
 
-    def parse_responses(self, responses):
+    def parse_responses(self, context, responses):
         """
         Extend this on the implementing protocol. It must
         return a response that can be returned as output to
@@ -309,64 +610,310 @@ class BaseRPCParser(object):
             raise AttributeError('Private object or method.')
         return attr
 
-class BaseRPCHandler:
+class Batch(object):
     """
-    This is the base handler to be subclassed by the actual
-    implementations and by the end user.
+    The calls of a request started one by one as tasks, in the
+    order of the entries. In sequential batch_mode each starts once
+    the one before it is done, otherwise up to
+    CONFIG['batch_concurrency'] of them run at once.
     """
-    _RPC_finished = False
-
-    def __init__(self, *args, **kwargs):
-        self._RPC_ = None
-        self._requests = 0
-        self._results = None
-        self.status = 200
-        self.request = None
-        self.response = web.Response(text='', content_type='application/json')
-        super().__init__(*args, **kwargs)
 
-    def set_header(self, key, value):
-        self.response._headers[key] = value
+    def __init__(self, parser, context):
+        self.parser = parser
+        self.context = context
+        self.tasks = []
+        self.limit = CONFIG['max_batch_size']
+        self.sequential = CONFIG['batch_mode'] == 'sequential'
+        self.semaphore = asyncio.Semaphore(CONFIG['batch_concurrency'])
+
+    def start(self, entry):
+        if self.limit and len(self.tasks) >= self.limit:
+            # past the limit, answered without running
+            task = asyncio.get_event_loop().create_future()
+            task.set_result(self.parser.batch_limit_fault())
+        elif self.sequential:
+            previous = self.tasks[-1] if self.tasks else None
+            task = asyncio.ensure_future(self._dispatch_after(entry, len(self.tasks), previous))
+        else:
+            task = asyncio.ensure_future(self._dispatch_limited(entry, len(self.tasks)))
+        self.tasks.append(task)
 
-    def set_status(self, status: int):
-        self.response._status = status
+    async def _dispatch_limited(self, entry, index):
+        async with self.semaphore:
+            return await self.parser.dispatch(self.context, *entry, index=index)
 
-    async def post(self, request):
-        self._results = []
-        self.request = request
-        request_body = await request.payload.read()
+    async def _dispatch_after(self, entry, index, previous):
+        # every entry sees the side effects of the ones before it
+        if previous is not None:
+            await asyncio.wait((previous,))
+        return await self.parser.dispatch(self.context, *entry, index=index)
 
-        responses = await self._RPC_.run(self, request_body)
+    def cancel(self):
+        for task in self.tasks:
+            task.cancel()
 
-        response_text = self._RPC_.parse_responses(responses)
-        # response_text = self.parse_responses(responses)
-        # if type(response_text) not in [str, bytes]:
-        #     # Likely a fault, or something messed up
-        #     response_text = self.encode(response_text)
-        #
-        # import ipdb; ipdb.set_trace()
-        self.response._status = self.status
-        self.response.text = response_text
-        return self.response
+    async def results(self):
+        """
+        The responses, in the order of the entries
+        """
+        return list(await asyncio.gather(*self.tasks))
 
-        #self.finish(response_text)
+    async def completed(self):
+        """
+        Yield (index of the entry, response) as the calls complete
+        """
+        indexes = {task: index for index, task in enumerate(self.tasks)}
+        pending = set(self.tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=indexes.get):
+                yield indexes[task], task.result()
 
 
-    def result(self, result, *results):
-        """ Use this to return a result. """
-        if results:
-            results = [result] + results
-        else:
-            results = result
-        self._results.append(results)
-        self._RPC_.response(self)
-
-    def on_result(self, response_text):
-        """ Asynchronous callback. """
-        self.set_header('Content-Type', self._RPC_.content_type)
-        self.finish(response_text)
+class BaseRPCHandler:
+    """
+    This is the base handler to be subclassed by the actual
+    implementations and by the end user. One handler serves
+    all the requests, their state lives in a RequestContext.
+    """
+    # the parser, set by the implementations
+    _RPC_ = None
 
+    async def post(self, request):
+        if not tracing.enabled:
+            return await self._post(request)
+        span, token = tracing.start_request('rpc.request', request.headers, transport='http')
+        try:
+            response = await self._post(request)
+            span.set('status', response.status)
+            return response
+        finally:
+            tracing.finish(span, token)
+
+    async def _post(self, request):
+        context = RequestContext(request)
+        budget = request.headers.get(cancellation.DEADLINE_HEADER)
+        if budget is not None:
+            # counted from the arrival, reading the body takes from it
+            context.deadline = cancellation.parse_budget(budget)
+        limit = CONFIG['max_body_size']
+        if limit and request.content_length is not None and request.content_length > limit:
+            # refused before reading any of it
+            return self.body_too_large(context, limit)
+        try:
+            decoder = compression.decoder(request.headers.get('Content-Encoding', ''))
+        except ContentEncodingError as e:
+            return self.refuse(context, 415, self._RPC_.faults.invalid_request(str(e)))
 
+        if metrics.enabled:
+            metrics.http_in_flight.inc()
+        try:
+            # the body is parsed while it arrives
+            chunks = self.read_body(request, limit, decoder)
+            context.streams = self._RPC_.streams_responses
+            if CONFIG['stream_responses'] and self._RPC_.streams_responses:
+                return await self.post_streamed(request, chunks, context)
+            responses = await self._RPC_.run_stream(context, chunks)
+            return await self.respond(request, context, responses)
+        except BodyTooLarge:
+            # chunked, compressed, or a wrong Content-Length
+            return self.body_too_large(context, limit)
+        except ContentEncodingError as e:
+            return self.refuse(context, 400, self._RPC_.faults.parse_error(str(e)))
+        finally:
+            if metrics.enabled:
+                metrics.http_in_flight.dec()
+
+    async def respond(self, request, context, responses):
+        if len(responses) == 1 and isinstance(responses[0], streaming.ResultStream):
+            return await self.write_stream(request, context, responses[0])
+        return await self.make_response(request, context, self.serialize(context, responses))
+
+    async def make_response(self, request, context, body):
+        """
+        The response with `body`, compressed when it is large
+        enough and the client accepts an encoding
+        """
+        encoding = None
+        if len(body) >= CONFIG['compression_min_size']:
+            encoding = compression.negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is not None:
+            body = await compression.compress(encoding, body)
+            context.set_header('Content-Encoding', encoding.name)
+            context.set_header('Vary', 'Accept-Encoding')
+        return web.Response(body=body, status=context.status, headers=context.headers,
+                            content_type='application/json', charset='utf-8')
+
+    async def stream_response(self, request, context, content_type='application/json'):
+        """
+        A chunked response
+        :return: the StreamWriter of its body, compressing it when
+                 the client accepts an encoding and it is large enough
+        """
+        encoding = compression.negotiate(request.headers.get('Accept-Encoding'))
+        response = web.StreamResponse(status=context.status, headers=context.headers)
+        response.content_type = content_type
+        response.charset = 'utf-8'
+        response.enable_chunked_encoding()
+        return compression.StreamWriter(request, response, encoding)
+
+    async def write_stream(self, request, context, stream):
+        """
+        Write the items of a generator handler as they come, as the
+        array result of a chunked JSON-RPC response, or one response
+        object per line when the client accepts application/x-ndjson
+        """
+        rpc = self._RPC_
+        frame = rpc.stream_frame(context)
+        if frame is None:
+            # a notification
+            await stream.drain()
+            return web.Response(body=b'', status=context.status, headers=context.headers,
+                                content_type='application/json', charset='utf-8')
+
+        ndjson = 'application/x-ndjson' in request.headers.get('Accept', '')
+        head, tail = frame
+        try:
+            writer = await self.stream_response(
+                request, context, 'application/x-ndjson' if ndjson else 'application/json')
+            if not ndjson:
+                await writer.write(head)
+            first = True
+            while True:
+                try:
+                    items = await stream.next_items()
+                    if not items:
+                        break
+                    data = rpc.encode_items(context, items, ndjson)
+                except Exception as error:
+                    fault = rpc.stream_fault(stream, error)
+                    if not ndjson:
+                        if await writer.discard():
+                            # nothing sent yet, the fault can answer the call
+                            return await self.respond(request, context, [fault])
+                        # a JSON body can't tell, the connection is dropped
+                        # so the client doesn't take the items for all of them
+                        request.transport.close()
+                        return writer.response
+                    await writer.write(rpc.encode_entry(context, 0, fault) + b'\n')
+                    break
+                if not ndjson and not first:
+                    data = b',' + data
+                first = False
+                await writer.write(data)
+            if not ndjson and stream.exhausted:
+                await writer.write(tail)
+            await writer.write_eof()
+        finally:
+            await stream.close()
+        return writer.response
+
+    async def post_streamed(self, request, chunks, context):
+        """
+        Answer a batch with a chunked response, each entry written as
+        soon as its call completes, in the order they complete
+        """
+        batch = await self._RPC_.start_stream(context, chunks)
+        if not isinstance(batch, Batch) or not context.batch:
+            # one call, or a fault answering for the request
+            responses = await batch.results() if isinstance(batch, Batch) else [batch]
+            return await self.respond(request, context, responses)
+
+        writer = None
+        serialize_seconds = 0
+        try:
+            async for index, result in batch.completed():
+                started = time.perf_counter()
+                entry = self._RPC_.encode_entry(context, index, result)
+                serialize_seconds += time.perf_counter() - started
+                if entry is None:
+                    # a notification
+                    continue
+                if writer is None:
+                    # the status and headers are the ones known by then
+                    writer = await self.stream_response(request, context)
+                    await writer.write(b'[' + entry)
+                else:
+                    await writer.write(b',' + entry)
+        except BaseException:
+            # the client is gone
+            batch.cancel()
+            raise
+        if metrics.enabled:
+            metrics.serialize_seconds.observe(serialize_seconds)
+        if tracing.enabled and tracing.current() is not None:
+            # entry by entry, in between the calls
+            tracing.current().set('serialize_ms', round(serialize_seconds * 1000, 3))
+
+        if writer is None:
+            # notifications only, no response entry
+            return web.Response(body=b'', status=context.status, headers=context.headers,
+                                content_type='application/json', charset='utf-8')
+        await writer.write(b']')
+        await writer.write_eof()
+        return writer.response
+
+    async def read_body(self, request, limit=0, decoder=None):
+        """
+        Yield the chunks of the request body as they arrive,
+        decompressed by `decoder` if any. Raises BodyTooLarge
+        past `limit` bytes, ContentEncodingError on a body the
+        decoder can't decompress.
+        """
+        size = 0
+        async for chunk in request.content.iter_any():
+            if decoder is not None:
+                try:
+                    # max_length stops a compression bomb before it's inflated
+                    chunk = decoder.decompress(chunk, limit - size + 1 if limit else 0)
+                except (BodyTooLarge, ContentEncodingError):
+                    raise
+                except Exception as e:
+                    raise ContentEncodingError('Body can not be decompressed: %s' % e)
+            size += len(chunk)
+            if limit and size > limit:
+                raise BodyTooLarge()
+            yield chunk
+        if decoder is not None:
+            decoder.finish()
+
+    def body_too_large(self, context, limit):
+        return self.refuse(context, 413, self._RPC_.faults.invalid_request(
+            'Request body is larger than %d bytes' % limit))
+
+    def refuse(self, context, status, fault):
+        # whatever was parsed is dropped, the fault answers for the request
+        context.requests = None
+        context.batch = False
+        context.set_status(status)
+        return web.Response(body=self.serialize(context, [fault]), status=context.status,
+                            headers=context.headers, content_type='application/json', charset='utf-8')
+
+    async def process(self, request_body, context):
+        """
+        Run a request body through the parser and return the
+        response body, for transports other than a plain POST.
+        """
+        if not tracing.enabled:
+            responses = await self._RPC_.run(context, request_body)
+            return self.serialize(context, responses)
+        span, token = tracing.start_request('rpc.request', transport='message')
+        try:
+            responses = await self._RPC_.run(context, request_body)
+            return self.serialize(context, responses)
+        finally:
+            tracing.finish(span, token)
+
+    def serialize(self, context, responses):
+        started = time.perf_counter()
+        response_body = self._RPC_.parse_responses(context, responses)
+        if metrics.enabled:
+            metrics.serialize_seconds.observe(time.perf_counter() - started)
+        if tracing.enabled:
+            tracing.record('rpc.serialize', started, time.perf_counter())
+        if isinstance(response_body, str):
+            response_body = response_body.encode()
+        return response_body
 
 
 class FaultMethod(object):
@@ -374,24 +921,34 @@ class FaultMethod(object):
     This is the 'dynamic' fault method so that the message can
     be changed on request from the parser.faults call.
     """
-    def __init__(self, fault, code, message):
+    def __init__(self, fault, code, message, name=None):
         self.fault = fault
         self.code = code
         self.message = message
+        self.name = name
+        # returned by every call without a message of its own,
+        # faults are never changed once built
+        self.default = self.build(message)
+
+    def build(self, message):
+        fault = self.fault(self.code, message)
+        # the key in Faults.codes, several faults share a code
+        fault.fault_name = self.name
+        return fault
 
     def __call__(self, message=None):
         if message:
-            self.message = message
-        return self.fault(self.code, self.message)
+            return self.build(message)
+        return self.default
 
 
 class Faults(object):
     """
     This holds the codes and messages for the RPC implementation.
-    It is attached (dynamically) to the Parser when called via the
-    parser.faults query, and returns a FaultMethod to be called so
-    that the message can be changed. If the 'dynamic' attribute is
-    not a key in the codes list, then it will error.
+    It is attached to the Parser as parser.faults, and returns a
+    FaultMethod to be called so that the message can be changed.
+    If the 'dynamic' attribute is not a key in the codes list,
+    then it will error.
 
     USAGE:
         parser.fault.parse_error('Error parsing content.')
@@ -401,15 +958,7 @@ class Faults(object):
     the code 'key' from the codes dict.
 
     """
-    codes = {
-        'parse_error': -32700,
-        'method_not_found': -32601,
-        'invalid_request': -32600,
-        'invalid_params': -32602,
-        'internal_error': -32603,
-        'not_authorized': -32602,
-        'service_timeout': -32090
-    }
+    codes = FAULT_CODES
 
     messages = {}
 
@@ -418,6 +967,9 @@ class Faults(object):
         self.fault = fault
         if not self.fault:
             self.fault = getattr(self.library, 'Fault')
+        # the fault methods of the known codes are built once
+        for attr in self.codes:
+            setattr(self, attr, self.__getattr__(attr))
 
     def __getattr__(self, attr):
         message = 'Error'
@@ -425,7 +977,7 @@ class Faults(object):
             message = self.messages[attr]
         else:
             message = ' '.join(map(str.capitalize, attr.split('_')))
-        fault = FaultMethod(self.fault, self.codes[attr], message)
+        fault = FaultMethod(self.fault, self.codes[attr], message, attr)
         return fault
 
 
@@ -446,7 +998,7 @@ def private(func):
     return func
 
 
-def async(func):
+def async_(func):
     """
     Use this to make a method asynchronous
     It is intended to be used as a decorator.
@@ -454,5 +1006,5 @@ def async(func):
     async method. Also, trees do not currently
     support async methods.
     """
-    func.async = True
+    func.async_ = True
     return func
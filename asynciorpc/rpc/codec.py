@@ -0,0 +1,87 @@
+"""
+JSON codecs of the JSON-RPC parser.
+
+Every codec decodes from and encodes to bytes, so the request body is
+parsed without a str copy and the response body is written as is.
+orjson and ujson are optional, the stdlib json module is the fallback.
+"""
+import json
+import warnings
+
+
+class StdlibCodec(object):
+    name = 'stdlib'
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+
+class UJSONCodec(object):
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def loads(self, data):
+        return self._ujson.loads(data)
+
+    def dumps(self, obj):
+        return self._ujson.dumps(obj).encode()
+
+
+class ORJSONCodec(object):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        # dict keys other than str are stringified, as the json module does
+        self._option = orjson.OPT_NON_STR_KEYS
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+    def dumps(self, obj):
+        return self._orjson.dumps(obj, option=self._option)
+
+
+CODECS = {
+    'orjson': ORJSONCodec,
+    'ujson': UJSONCodec,
+    'stdlib': StdlibCodec,
+}
+
+# errors raised by the codecs on values they can't encode
+ENCODE_ERRORS = (TypeError, ValueError, OverflowError)
+
+_codecs = {}
+
+
+def get_codec(name: str='auto'):
+    """
+    Get a codec instance by name
+    :param name: 'orjson', 'ujson', 'stdlib' or 'auto' for the fastest one installed
+    """
+    if name in _codecs:
+        return _codecs[name]
+
+    if name == 'auto':
+        candidates = ['orjson', 'ujson', 'stdlib']
+    elif name in CODECS:
+        candidates = [name, 'stdlib']
+    else:
+        raise ValueError('Unknown json codec %r' % name)
+
+    for candidate in candidates:
+        try:
+            codec = CODECS[candidate]()
+            break
+        except ImportError:
+            if name != 'auto':
+                warnings.warn('json codec %r is not installed, falling back to stdlib' % name)
+    _codecs[name] = codec
+    return codec
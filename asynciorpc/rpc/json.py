@@ -1,6 +1,10 @@
-import uuid
-
-from .base import BaseRPCParser, BaseRPCHandler
+import time
+from .base import Batch, BaseRPCParser, BaseRPCHandler
+from .codec import get_codec, ENCODE_ERRORS
+from .splitter import ArraySplitter, blank, starts_array
+from asynciorpc import metrics, tracing
+from asynciorpc.cancellation import DEADLINE_FIELD, parse_budget
+from asynciorpc.config import CONFIG
 import jsonrpclib
 from jsonrpclib.jsonrpc import isbatch, isnotification, Fault
 from jsonrpclib.jsonrpc import dumps, loads
@@ -9,79 +13,273 @@ from jsonrpclib.jsonrpc import dumps, loads
 class JSONRPCParser(BaseRPCParser):
 
     content_type = 'application/json-rpc'
+    streams_responses = True
+    # bytes read before deciding to split a batch while it arrives
+    stream_threshold = 64 * 1024
+
+    def __init__(self, library, codec=None):
+        super().__init__(library)
+        self.codec = codec or get_codec(CONFIG['json_codec'])
 
-    def parse_request(self, request_body):
+    def parse_request(self, context, request_body):
         try:
-            request = loads(request_body)
+            request = self.codec.loads(request_body)
         except:
             # Bad request formatting
             #self.traceback()
             return self.faults.parse_error()
-        self._requests = request
-        self._batch = False
         request_list = []
         if isbatch(request):
-            self._batch = True
             for req in request:
-                req_tuple = (req['method'], req.get('params', []))
-                request_list.append(req_tuple)
+                request_list.append(self.entry(req))
+            context.batch = True
+            context.requests = request
         else:
-            self._requests = [request]
-            request_list.append(
-                (request['method'], request.get('params', []))
-            )
+            request_list.append(self.entry(request))
+            context.requests = [request]
         return tuple(request_list)
 
-    def parse_responses(self, responses):
-        if any([isinstance(i, Fault) for i in responses]):
-            return dumps(responses[0])
+    def entry(self, request):
+        return (request['method'], request.get('params', []),
+                self.deadline(request))
 
-        if len(responses) != len(self._requests):
-            return dumps(self.faults.internal_error())
-        response_list = []
-        for i in range(0, len(responses)):
-            version = jsonrpclib.config.version
+    async def run_stream(self, context, chunks):
+        """
+        A batch is split while the body arrives and each call is
+        dispatched as soon as its entry is parsed, other bodies
+        are read whole. So are the ones ending within the first
+        `stream_threshold` bytes, decoding them in one pass is
+        faster.
+        """
+        head, chunks = await self._read_head(chunks)
+        if chunks is None:
+            return await self.run(context, b''.join(head))
+        batch = await self.split_batch(context, head, chunks)
+        if batch is None:
+            return [self.faults.parse_error()]
+        return await batch.results()
 
-            if isinstance(responses[i], Fault):
-                return dumps(
-                    responses[i],
-                    rpcid=0, version=version
-                )
+    async def start_stream(self, context, chunks):
+        head, chunks = await self._read_head(chunks)
+        if chunks is None:
+            return self.start(context, b''.join(head))
+        batch = await self.split_batch(context, head, chunks)
+        if batch is None:
+            return self.faults.parse_error()
+        return batch
 
-            request = self._requests[i]
-            response = responses[i]
-            rpcid = request.get('id', str(uuid.uuid4()))
+    async def _read_head(self, chunks):
+        """
+        Read the body up to stream_threshold bytes, and the rest of it
+        unless it is a batch
+        :return: (chunks read, the iterator of the others or None once
+                  the body is read whole)
+        """
+        chunks = chunks.__aiter__()
+        head = []
+        size = 0
+        async for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size >= self.stream_threshold:
+                break
+        else:
+            return head, None
 
-            if isnotification(request):
-                # Even in batches, notifications have no
-                # response entry
-                continue
+        first = next((chunk for chunk in head if not blank(chunk)), b'')
+        if not starts_array(first):
+            head += [chunk async for chunk in chunks]
+            return head, None
+        return head, chunks
 
+    async def split_batch(self, context, head, chunks):
+        """
+        Start the calls of a batch as its entries arrive
+        :return: the Batch, None if the body is malformed
+        """
+        splitter = ArraySplitter()
+        context.batch = True
+        context.requests = []
+        batch = Batch(self, context)
+        parse_seconds = 0
 
-            if 'jsonrpc' not in request.keys():
-                version = 1.0
+        def feed(chunk):
             try:
-                response_json = dumps(
-                    response, version=version,
-                    rpcid=rpcid, methodresponse=True
-                )
-            except TypeError:
-                return dumps(
-                    self.faults.parse_error(),
-                    rpcid=rpcid, version=version
-                )
-            response_list.append(response_json)
-
-        if not self._batch:
+                for element in splitter.feed(chunk):
+                    request = self.codec.loads(element)
+                    entry = self.entry(request)
+                    context.requests.append(request)
+                    batch.start(entry)
+            except Exception:
+                return False
+            return True
+
+        malformed = False
+        first_started = time.perf_counter()
+        try:
+            async for chunk in _chain(head, chunks):
+                started = time.perf_counter()
+                malformed = not feed(chunk)
+                parse_seconds += time.perf_counter() - started
+                if malformed:
+                    break
+            else:
+                # cut short, or []
+                malformed = not splitter.done or not splitter.count
+        except BaseException:
+            # the body couldn't be read, the calls started are dropped
+            batch.cancel()
+            raise
+        if malformed:
+            batch.cancel()
+            context.requests = None
+            context.batch = False
+            return None
+        if metrics.enabled:
+            metrics.parse_seconds.observe(parse_seconds)
+        if tracing.enabled:
+            # from the first chunk to the last, the calls start in between
+            tracing.record('rpc.parse', first_started, time.perf_counter(),
+                           entries=splitter.count, parse_ms=round(parse_seconds * 1000, 3))
+        return batch
+
+    def deadline(self, request):
+        # extension member with the budget of the call in seconds
+        budget = request.get(DEADLINE_FIELD)
+        if budget is None:
+            return None
+        return parse_budget(budget)
+
+    def envelope(self, response, rpcid=None, version=None):
+        """
+        Build the response object of one call, `response` being
+        its result or a Fault.
+        """
+        if not version:
+            version = jsonrpclib.config.version
+        if isinstance(response, Fault):
+            error = {'code': response.faultCode, 'message': response.faultString}
+            result = None
+        else:
+            error = None
+            result = response
+
+        if version >= 2:
+            envelope = {'jsonrpc': '2.0', 'id': rpcid}
+            if error is not None:
+                envelope['error'] = error
+            else:
+                envelope['result'] = result
+            return envelope
+        return {'result': result, 'error': error, 'id': rpcid}
+
+    def parse_responses(self, context, responses):
+        if context.requests is None:
+            # The body couldn't be parsed, the fault answers
+            # for the whole request
+            return self.codec.dumps(self.envelope(responses[0]))
+
+        if len(responses) != len(context.requests):
+            return self.codec.dumps(self.envelope(self.faults.internal_error()))
+        response_list = []
+        for request, response in zip(context.requests, responses):
+            envelope = self.entry_envelope(request, response)
+            if envelope is not None:
+                response_list.append(envelope)
+
+        if not context.batch:
             # Ensure it wasn't a batch to begin with, then
             # return 1 or 0 responses depending on if it was
             # a notification.
             if len(response_list) < 1:
-                return ''
-            return response_list[0]
-        # Batch, return list
-        return '[ %s ]' % ', '.join(response_list)
+                return b''
+            response_list = response_list[0]
+
+        # Serialize the whole response in one pass
+        try:
+            return self.codec.dumps(response_list)
+        except ENCODE_ERRORS:
+            return self.encode_error(response_list)
+
+    def entry_envelope(self, request, response):
+        if isnotification(request):
+            # Even in batches, notifications have no
+            # response entry
+            return None
+
+        version = jsonrpclib.config.version
+        if 'jsonrpc' not in request.keys():
+            version = 1.0
+        return self.envelope(response, request.get('id'), version)
+
+    def encode_entry(self, context, index, response):
+        """
+        The serialized response entry of the request at `index`,
+        None when there is none
+        """
+        envelope = self.entry_envelope(context.requests[index], response)
+        if envelope is None:
+            return None
+        try:
+            return self.codec.dumps(envelope)
+        except ENCODE_ERRORS:
+            return self.encode_error(envelope)
+
+    def stream_frame(self, context):
+        """
+        The (head, tail) around the items of a generator handler in
+        the response of a single call, None when there is no response
+        """
+        request = context.requests[0]
+        if isnotification(request):
+            return None
+        envelope = self.codec.dumps(self.entry_envelope(request, _ITEMS))
+        if envelope.startswith(b'{"result"'):
+            # version 1.0, the result comes first
+            head, _, tail = envelope.partition(_ITEMS_ENCODED)
+        else:
+            head, _, tail = envelope.rpartition(_ITEMS_ENCODED)
+        return head + b'[', b']' + tail
+
+    def encode_items(self, context, items, lines=False):
+        """
+        The serialized items, separated to go in between the
+        stream_frame, or one response per line
+        """
+        if not lines:
+            return b','.join([self.codec.dumps(item) for item in items])
+        request = context.requests[0]
+        return b''.join([self.codec.dumps(self.entry_envelope(request, item)) + b'\n'
+                         for item in items])
+
+    def encode_error(self, response_list):
+        """
+        Find the response that can't be serialized and answer
+        with a parse_error fault on its id.
+        """
+        if isinstance(response_list, dict):
+            response_list = [response_list]
+        for envelope in response_list:
+            try:
+                self.codec.dumps(envelope)
+            except ENCODE_ERRORS:
+                version = 2.0 if 'jsonrpc' in envelope else 1.0
+                return self.codec.dumps(self.envelope(
+                    self.faults.parse_error(), envelope['id'], version
+                ))
+        return self.codec.dumps(self.envelope(self.faults.internal_error()))
+
+
+# stands for the items in the envelope of a streamed result
+_ITEMS = '__asynciorpc_stream_items__'
+_ITEMS_ENCODED = b'"__asynciorpc_stream_items__"'
+
 
+async def _chain(head, chunks):
+    for chunk in head:
+        yield chunk
+    async for chunk in chunks:
+        yield chunk
 
 
 class JSONRPCLibraryWrapper(object):
@@ -98,4 +296,4 @@ class JSONRPCHandler(BaseRPCHandler):
     """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._RPC_ = JSONRPCParser(JSONRPCLibraryWrapper)
\ No newline at end of file
+        self._RPC_ = JSONRPCParser(JSONRPCLibraryWrapper)
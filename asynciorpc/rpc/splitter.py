@@ -0,0 +1,151 @@
+"""
+Incremental splitting of a JSON array arriving in chunks.
+
+The splitter only finds where the elements of the top-level array
+start and end, each element is then decoded on its own by the codec,
+so the first calls of a large batch are dispatched while the rest of
+the body is still on its way. It works on bytes, the body is never
+decoded to str. Only the structural characters are looked at, long
+runs of anything else are skipped by the regex engine.
+"""
+import re
+
+_STRUCTURE = re.compile(rb'["\[\]{},]')
+_STRING = re.compile(rb'["\\]')
+_BLANK = re.compile(rb'[ \t\n\r]*')
+_ARRAY_START = re.compile(rb'[ \t\n\r]*\[')
+
+_QUOTE, _BACKSLASH, _COMMA = ord('"'), ord('\\'), ord(',')
+_OPEN = (ord('['), ord('{'))
+
+
+class ArraySplitter(object):
+    """
+    Feed it the chunks of a body holding a JSON array, it returns the
+    elements complete so far as bytes. Raises ValueError on a body
+    which isn't an array or is malformed around the elements, the
+    elements themselves are checked when they are decoded.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # scan position and start of the current element in _buffer
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        # the current entry is an object or array already returned
+        self._closed = False
+        self.count = 0
+        self.done = False
+
+    def feed(self, chunk: bytes) -> list:
+        if self.done:
+            if not blank(chunk):
+                raise ValueError('Data after the end of the array')
+            return []
+
+        buffer = self._buffer
+        buffer += chunk
+        elements = []
+        pos = self._pos
+        end = len(buffer)
+
+        while pos < end:
+            if self._in_string:
+                match = _STRING.search(buffer, pos)
+                if match is None:
+                    pos = end
+                    break
+                if buffer[match.start()] == _BACKSLASH:
+                    if match.end() >= end:
+                        # the escaped character is in the next chunk
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                else:
+                    self._in_string = False
+                    pos = match.end()
+                continue
+
+            if self._depth == 0:
+                # before the array
+                pos = _BLANK.match(buffer, pos).end()
+                if pos == end:
+                    break
+                if buffer[pos] != _OPEN[0]:
+                    raise ValueError('Not a JSON array')
+                pos += 1
+                self._depth = 1
+                self._start = pos
+                continue
+
+            match = _STRUCTURE.search(buffer, pos)
+            if match is None:
+                pos = end
+                break
+            char = buffer[match.start()]
+            pos = match.end()
+            if char == _QUOTE:
+                self._in_string = True
+            elif char in _OPEN:
+                if self._depth == 1 and self._closed:
+                    raise ValueError('Missing comma')
+                self._depth += 1
+            elif char == _COMMA:
+                if self._depth == 1:
+                    if not self._closed:
+                        elements.append(self._element(buffer, match.start(), last=False))
+                    elif not blank(buffer[self._start:match.start()]):
+                        raise ValueError('Missing comma')
+                    self._closed = False
+                    self._start = pos
+            else:
+                self._depth -= 1
+                if self._depth == 1:
+                    # an object or array entry is complete at its
+                    # closing bracket, no need to wait for the comma
+                    elements.append(self._element(buffer, pos, last=False))
+                    self._closed = True
+                    self._start = pos
+                elif self._depth == 0:
+                    if self._closed:
+                        if not blank(buffer[self._start:match.start()]):
+                            raise ValueError('Missing comma')
+                    else:
+                        element = self._element(buffer, match.start(), last=True)
+                        if element is not None:
+                            elements.append(element)
+                    self.done = True
+                    if _BLANK.match(buffer, pos).end() != end:
+                        raise ValueError('Data after the end of the array')
+                    break
+
+        # drop what is consumed
+        if self._start is not None and self._start > 0:
+            del buffer[:self._start]
+            pos -= self._start
+            self._start = 0
+        self._pos = pos
+        return elements
+
+    def _element(self, buffer, stop, last):
+        element = bytes(buffer[self._start:stop]).strip()
+        if not element:
+            if last and self.count == 0:
+                # []
+                return None
+            raise ValueError('Missing array element')
+        self.count += 1
+        return element
+
+
+def blank(chunk) -> bool:
+    return _BLANK.fullmatch(chunk) is not None
+
+
+def starts_array(chunk) -> bool:
+    """
+    Whether the chunk, first of a body, opens a JSON array
+    """
+    return _ARRAY_START.match(chunk) is not None
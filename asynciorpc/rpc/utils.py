@@ -2,72 +2,225 @@
 Various utilities for the TornadoRPC library.
 """
 
+import collections.abc
 import inspect
+import types
+import typing
 from .. config import CONFIG
 
+# `int | str` hints, python 3.10+
+_UnionType = getattr(types, 'UnionType', None)
 
-def getcallargs(func, *positional, **named):
-    """
-    Simple implementation of inspect.getcallargs function in
-    the Python 2.7 standard library.
+# the types a float or complex hint accepts
+_PROMOTIONS = {float: (int, float), complex: (int, float, complex)}
 
-    Takes a function and the position and keyword arguments and
-    returns a dictionary with the appropriate named arguments.
-    Raises an exception if invalid arguments are passed.
-    """
-    signature = inspect.getfullargspec(func)
-    args = signature.args
-    varargs = signature.varargs
-    varkw = signature.varkw
-    defaults = signature.defaults
-
-    final_kwargs = {}
-    extra_args = []
-    # has_self = inspect.ismethod(func) and func.im_self is not None
+
+def _has_self(func):
     # Note: statement after or is a bullshit way to determine a function-like
     #       object is a bound method
-    has_self = inspect.ismethod(func) and hasattr(func, '__self__') \
-               or (not hasattr(func, '__self__') and 'self' in func.__code__.co_varnames)
+    return inspect.ismethod(func) and hasattr(func, '__self__') \
+        or (not hasattr(func, '__self__') and 'self' in func.__code__.co_varnames)
+
+
+def _type_hints(func):
+    try:
+        return typing.get_type_hints(func)
+    except Exception:
+        # unresolvable forward references, fall back to the raw annotations
+        return dict(getattr(func, '__annotations__', {}))
+
+
+def compile_hint(hint):
+    """
+    Build a predicate checking a value against a type hint.
+    Supports plain classes, tuples of classes and the typing generics
+    (List[int], Optional[str], Dict[str, float], Union, Tuple ...).
+    :return: the predicate or None if any value is accepted
+    """
+    if hint is typing.Any or hint is inspect.Parameter.empty:
+        return None
+    if hint is None or hint is type(None):
+        return lambda value: value is None
+
+    origin = typing.get_origin(hint)
+    args = typing.get_args(hint)
+
+    if isinstance(hint, tuple) or origin is typing.Union or \
+            (_UnionType is not None and origin is _UnionType):
+        checks = [compile_hint(i) for i in (hint if isinstance(hint, tuple) else args)]
+        if None in checks:
+            return None
+        return lambda value: any(check(value) for check in checks)
+
+    if origin is typing.Literal:
+        return lambda value: value in args
+
+    if origin is None:
+        if isinstance(hint, type):
+            if hint in _PROMOTIONS:
+                # PEP 484 numeric promotion, 1 is a valid float, True isn't
+                accepted = _PROMOTIONS[hint]
+                return lambda value: isinstance(value, accepted) and not isinstance(value, bool)
+            return lambda value: isinstance(value, hint)
+        # TypeVar, NewType, string annotations ... not checkable
+        return None
+
+    if not isinstance(origin, type):
+        return None
+
+    if not args:
+        return lambda value: isinstance(value, origin)
+
+    if issubclass(origin, tuple):
+        if len(args) == 2 and args[1] is Ellipsis:
+            item = compile_hint(args[0])
+            if item is None:
+                return lambda value: isinstance(value, tuple)
+            return lambda value: isinstance(value, tuple) and all(item(i) for i in value)
+        items = [compile_hint(i) for i in args]
+        return lambda value: isinstance(value, tuple) and len(value) == len(items) \
+            and all(check is None or check(i) for check, i in zip(items, value))
+
+    if issubclass(origin, collections.abc.Mapping):
+        key_check = compile_hint(args[0])
+        value_check = compile_hint(args[1]) if len(args) > 1 else None
+        return lambda value: isinstance(value, origin) \
+            and (key_check is None or all(key_check(k) for k in value.keys())) \
+            and (value_check is None or all(value_check(v) for v in value.values()))
+
+    if issubclass(origin, collections.abc.Iterable) and not issubclass(origin, (str, bytes)):
+        item = compile_hint(args[0])
+        if item is None:
+            return lambda value: isinstance(value, origin)
+        return lambda value: isinstance(value, origin) and all(item(i) for i in value)
+
+    return lambda value: isinstance(value, origin)
 
 
+class ArgumentBinder(object):
+    """
+    Argument binding of one function, compiled once.
+
+    The signature is inspected when the binder is built, so binding
+    a call only touches the supplied arguments.
+    """
+
+    def __init__(self, func):
+        signature = inspect.getfullargspec(func)
+        args = list(signature.args)
+        if _has_self(func) and len(args) > 0:
+            args.pop(0)
+        self.args = tuple(args)
+        self.positions = {name: i for i, name in enumerate(args)}
+        self.names = frozenset(args + signature.kwonlyargs)
+        self.varargs = signature.varargs is not None
+        self.varkw = signature.varkw is not None
 
+        self.defaults = {}
+        if signature.defaults:
+            self.defaults.update(zip(args[-len(signature.defaults):], signature.defaults))
+        if signature.kwonlydefaults:
+            self.defaults.update(signature.kwonlydefaults)
+        self.default_items = tuple(self.defaults.items())
+        self.required = frozenset(self.names - set(self.defaults))
+        # required_before[n]: required parameters among the first n positional ones
+        self.required_before = [0]
+        for name in args:
+            self.required_before.append(self.required_before[-1] + (name in self.required))
 
-    if has_self and len(args) > 0:
-        args.pop(0)
+        hints = _type_hints(func)
+        self.validators = {}
+        for name in self.names:
+            if name in hints:
+                check = compile_hint(hints[name])
+                if check is not None:
+                    self.validators[name] = check
 
-    # (Since our RPC supports only positional OR named.)
-    if named:
-        for key, value in named.items():
-            arg_key = None
-            try:
-                arg_key = args[args.index(key)]
-            except ValueError:
-                if not varkw:
+    def bind(self, positional=(), named=None, validate=False, defaults=True):
+        """
+        Map the call arguments to the parameters, positional and
+        keyword arguments can be mixed.
+        :param validate: check the supplied values against the type hints
+        :param defaults: add the defaults of the parameters not supplied,
+                         without them Python fills them in when the
+                         function is called
+        :return: (final_kwargs, extra_args) as getcallargs does
+        :raise TypeError: when the arguments don't fit the signature
+        """
+        nargs = len(positional)
+        extra_args = []
+        if nargs > len(self.args):
+            if not self.varargs:
+                raise TypeError("Too many positional arguments")
+            extra_args = list(positional[len(self.args):])
+            nargs = len(self.args)
+
+        final_kwargs = dict(zip(self.args, positional))
+        supplied = self.required_before[nargs]
+        bound = nargs
+        if validate and self.validators:
+            for name, value in zip(self.args, positional):
+                self._check(name, value)
+
+        if named:
+            for key, value in named.items():
+                if self.positions.get(key, nargs) < nargs:
+                    message = "Keyword argument '%s' used more than once" % key
+                    raise TypeError(message)
+                if key in self.names:
+                    bound += 1
+                elif not self.varkw:
                     raise TypeError("Keyword argument '%s' not valid" % key)
-            if key in final_kwargs.keys():
-                message = "Keyword argument '%s' used more than once" % key
-                raise TypeError(message)
-            final_kwargs[key] = value
-    else:
-        for i in range(len(positional)):
-            value = positional[i]
-            arg_key = None
-            try:
-                arg_key = args[i]
-            except IndexError:
-                if not varargs:
-                    raise TypeError("Too many positional arguments")
-            if arg_key:
-                final_kwargs[arg_key] = value
-            else:
-                extra_args.append(value)
-    if defaults:
-        for kwarg, default in zip(args[-len(defaults):], defaults):
-            final_kwargs.setdefault(kwarg, default)
-    for arg in args:
-        if arg not in final_kwargs:
-            raise TypeError("Not all arguments supplied. (%s)", arg)
-    return final_kwargs, extra_args
+                if key in self.required:
+                    supplied += 1
+                if validate:
+                    self._check(key, value)
+                final_kwargs[key] = value
+
+        if supplied < len(self.required):
+            for arg in self.args + tuple(self.required - set(self.args)):
+                if arg in self.required and arg not in final_kwargs:
+                    raise TypeError("Not all arguments supplied. (%s)" % arg)
+        if defaults and bound < len(self.names):
+            # only the parameters left out
+            for name, value in self.default_items:
+                if name not in final_kwargs:
+                    final_kwargs[name] = value
+        return final_kwargs, extra_args
+
+    def _check(self, name, value):
+        check = self.validators.get(name)
+        if check is not None and not check(value):
+            raise TypeError("Argument '%s' doesn't match its type hint" % name)
+
+
+_binders = {}
+
+
+def get_binder(func):
+    """
+    Cached `ArgumentBinder` of a function
+    """
+    try:
+        return _binders[func]
+    except KeyError:
+        binder = _binders[func] = ArgumentBinder(func)
+        return binder
+    except TypeError:
+        # unhashable callable, nothing to cache on
+        return ArgumentBinder(func)
+
+
+def getcallargs(func, *positional, **named):
+    """
+    Simple implementation of inspect.getcallargs function in
+    the Python 2.7 standard library.
+
+    Takes a function and the position and keyword arguments and
+    returns a dictionary with the appropriate named arguments.
+    Raises an exception if invalid arguments are passed.
+    """
+    return get_binder(func).bind(positional, named)
 
 def getfullmethod(method_name):
     return '%s.%s.%s' % (CONFIG['company'], CONFIG['service'], method_name)
\ No newline at end of file
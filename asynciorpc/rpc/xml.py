@@ -19,7 +19,7 @@ from version 2.3 on.
 
 """
 
-from asynciorpc.rpc.base import BaseRPCParser, BaseRPCHandler
+from asynciorpc.rpc.base import BaseRPCParser, BaseRPCHandler, RequestContext
 import xmlrpc.client as xmlrpclib
 
 
@@ -33,14 +33,14 @@ class XMLRPCSystem(object):
         for call in calls:
             method_name = call['methodName']
             params = call['params']
-            self._dispatch(method_name, params)
+            self._dispatch(RequestContext(), method_name, params)
 
 
 class XMLRPCParser(BaseRPCParser):
 
     content_type = 'text/xml'
 
-    def parse_request(self, request_body):
+    def parse_request(self, context, request_body):
         try:
             params, method_name = xmlrpclib.loads(request_body)
         except:
@@ -48,7 +48,7 @@ class XMLRPCParser(BaseRPCParser):
             return self.faults.parse_error()
         return ((method_name, params),)
 
-    def parse_responses(self, responses):
+    def parse_responses(self, context, responses):
         try:
             if isinstance(responses[0], xmlrpclib.Fault):
                 return xmlrpclib.dumps(responses[0])
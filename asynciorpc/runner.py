@@ -1,13 +1,18 @@
 import argparse
 import asyncio
+import os
+import signal
+import socket
 from aiohttp import web
-from asynciorpc.handler import Handler
+from asynciorpc import loops, pool
+from asynciorpc.handler import get_handler
 from asynciorpc.config import CONFIG, INTERFACES
 from asynciorpc.application import get_application
+from asynciorpc.stream import start_server, close_connections
+from asynciorpc.supervisor import Supervisor
 
 async def rpc_handler(request):
-    handler_obj = Handler()
-    return await handler_obj.post(request)
+    return await get_handler().post(request)
 
 def run(*, wsgi=False):
     app = get_application()
@@ -33,22 +38,108 @@ Current registered interfaces
                         default=CONFIG['rpc_port'],
                         help='service runs on this port')
 
+    parser.add_argument('--transport', choices=['http', 'tcp', 'unix'],
+                        default='http',
+                        help='http (default), or raw tcp / unix socket '
+                             'with %s framed JSON-RPC' % CONFIG['stream_framing'])
+
+    parser.add_argument('--path', metavar='path',
+                        default=CONFIG['unix_path'],
+                        help='unix socket path of the unix transport')
+
+    parser.add_argument('--workers', metavar='workers',
+                        type=int,
+                        default=CONFIG['workers'],
+                        help='number of worker processes sharing the port')
+
+    parser.add_argument('--loop', choices=loops.LOOPS,
+                        default=CONFIG['event_loop'],
+                        help='event loop, auto for uvloop when it is installed')
+
     args = parser.parse_args()
+    CONFIG['event_loop'] = args.loop
+
+    if args.workers <= 1:
+        # a single process has nobody to share the port with, SO_REUSEPORT
+        # would only let another server bind it unnoticed
+        serve(app, args.transport, make_socket(args.transport, args.port, args.path))
+        return
+
+    # every worker binds its own socket with SO_REUSEPORT so the kernel
+    # balances the connections, or they share the socket of the supervisor
+    reuse_port = CONFIG['reuse_port'] and args.transport != 'unix' \
+        and hasattr(socket, 'SO_REUSEPORT')
+    shared_sock = None if reuse_port else make_socket(args.transport, args.port, args.path)
+
+    def worker(worker_id):
+        pool.configure(max(1, CONFIG['threadpool_size'] // args.workers),
+                       max(1, CONFIG['processpool_size'] // args.workers),
+                       args.workers)
+        sock = shared_sock or make_socket(args.transport, args.port, args.path, reuse_port=True)
+        serve(app, args.transport, sock, worker_id)
+
+    print('Starting %d workers' % args.workers)
+    Supervisor(worker, args.workers, CONFIG['shutdown_timeout']).run()
+
+
+def make_socket(transport, port, path, reuse_port=False):
+    """
+    Bind the listening socket of a transport, with a backlog of
+    CONFIG['backlog'] connections
+    """
+    if transport == 'unix':
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(('0.0.0.0', port))
+    sock.listen(CONFIG['backlog'])
+    sock.setblocking(False)
+    return sock
+
+
+def serve(app, transport, sock, worker_id=None):
+    """
+    Serve on a bound socket until SIGINT / SIGTERM, then stop accepting
+    and give the calls in flight CONFIG['shutdown_timeout'] to finish.
+    The loop is the one of CONFIG['event_loop'].
+    """
+    loop = loops.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    if transport == 'http':
+        runner = web.AppRunner(app, keepalive_timeout=CONFIG['keepalive_timeout'],
+                               shutdown_timeout=CONFIG['shutdown_timeout'])
+        loop.run_until_complete(runner.setup())
+        # the socket is bound before the workers fork, so the site
+        # serves it rather than binding a TCPSite of its own
+        site = web.SockSite(runner, sock, backlog=CONFIG['backlog'])
+        loop.run_until_complete(site.start())
+    else:
+        srv = loop.run_until_complete(start_server(transport, sock=sock))
 
-    loop = asyncio.get_event_loop()
-    handler = app.make_handler()
-    f = loop.create_server(handler, '0.0.0.0', args.port)
-    srv = loop.run_until_complete(f)
+    address = sock.getsockname()
+    if worker_id is None:
+        print('Server listening on %s (%s loop)' % (address, loops.loop_name()))
+    else:
+        print('Worker %d (pid %d) listening on %s' % (worker_id, os.getpid(), address))
 
-    print('Server listening on port', args.port)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, loop.stop)
 
     try:
         loop.run_forever()
-    except KeyboardInterrupt:
-        pass
     finally:
-        loop.run_until_complete(handler.finish_connections(1.0))
-        srv.close()
-        loop.run_until_complete(srv.wait_closed())
-        loop.run_until_complete(app.finish())
+        if transport == 'http':
+            # stops accepting, then shuts the app and its connections down
+            loop.run_until_complete(runner.cleanup())
+        else:
+            srv.close()
+            loop.run_until_complete(srv.wait_closed())
+            loop.run_until_complete(close_connections(CONFIG['shutdown_timeout']))
     loop.close()
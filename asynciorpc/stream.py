@@ -0,0 +1,190 @@
+"""
+JSON-RPC over raw TCP or Unix sockets.
+
+A lighter transport than HTTP for service-to-service traffic. Each frame
+carries a request or a batch, framed either by a 4 bytes big-endian
+length prefix or by a trailing newline (CONFIG['stream_framing']).
+Calls are pipelined: a client can send many frames without waiting,
+they are dispatched concurrently and answered in the order they came.
+Notifications get no answer frame.
+"""
+import asyncio
+import struct
+import weakref
+from types import MappingProxyType
+from aiohttp.tcp_helpers import tcp_nodelay
+from asynciorpc.config import CONFIG
+from asynciorpc.handler import get_handler
+from asynciorpc.rpc.base import RequestContext
+
+_length = struct.Struct('>I')
+
+connections = weakref.WeakSet()
+
+
+class FrameError(Exception):
+    pass
+
+
+async def read_frame(reader: asyncio.StreamReader, framing: str=None):
+    """
+    Read one frame, None once the peer closed the connection
+    """
+    framing = framing or CONFIG['stream_framing']
+    try:
+        if framing == 'length':
+            size, = _length.unpack(await reader.readexactly(_length.size))
+            if size > CONFIG['stream_max_frame_size']:
+                raise FrameError('Frame of %d bytes is too large' % size)
+            return await reader.readexactly(size)
+        return (await reader.readuntil(b'\n'))[:-1]
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise FrameError('Frame is too large')
+
+
+def write_frame(writer: asyncio.StreamWriter, data: bytes, framing: str=None):
+    framing = framing or CONFIG['stream_framing']
+    if framing == 'length':
+        writer.write(_length.pack(len(data)))
+        writer.write(data)
+    else:
+        writer.write(data + b'\n')
+
+
+class StreamRequest(object):
+    """
+    Stands for the aiohttp request on a stream transport,
+    there are no headers, so no HTTP authentication.
+    """
+    headers = MappingProxyType({})
+
+    def __init__(self, peername):
+        self.peername = peername
+
+
+class StreamConnection(object):
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.request = StreamRequest(writer.get_extra_info('peername'))
+        self._inflight = asyncio.Semaphore(CONFIG['stream_max_inflight'])
+        # dispatched calls in arrival order, None ends the connection
+        self._pending = asyncio.Queue()
+
+    async def serve(self):
+        connections.add(self)
+        responder = asyncio.ensure_future(self._respond())
+        try:
+            while True:
+                try:
+                    data = await read_frame(self.reader)
+                except FrameError:
+                    break
+                if data is None:
+                    break
+                # backpressure, up to the calls answered
+                await self._inflight.acquire()
+                self._pending.put_nowait((data, asyncio.ensure_future(self._call(data))))
+        finally:
+            connections.discard(self)
+            self._pending.put_nowait(None)
+            await responder
+            self.writer.close()
+
+    def close(self):
+        """
+        Stop reading, the calls already read are still answered
+        """
+        self.reader.feed_eof()
+
+    async def _call(self, data):
+        return await get_handler().process(data, RequestContext(self.request))
+
+    async def _respond(self):
+        connected = True
+        while True:
+            entry = await self._pending.get()
+            if entry is None:
+                return
+            data, task = entry
+            try:
+                try:
+                    response_body = await task
+                except Exception:
+                    get_handler()._RPC_.traceback()
+                    response_body = self._internal_error(data)
+                if not response_body or not connected:
+                    # notification, or nobody to answer
+                    continue
+                write_frame(self.writer, response_body)
+                try:
+                    await self.writer.drain()
+                except ConnectionError:
+                    # the calls read are still awaited for their slots
+                    connected = False
+                    self.close()
+            finally:
+                # the slot is free once the response is written, so
+                # calls done behind a slow one can't pile up
+                self._inflight.release()
+
+    def _internal_error(self, data):
+        """
+        The internal_error answer of a frame whose processing failed,
+        on the ids of its calls so the client isn't left waiting
+        """
+        handler = get_handler()
+        context = RequestContext(self.request)
+        fault = handler._RPC_.faults.internal_error()
+        try:
+            requests = handler._RPC_.parse_request(context, data)
+        except Exception:
+            context.requests = None
+            requests = ()
+        if context.requests is None:
+            # unparsable, the fault answers for the whole frame
+            return handler.serialize(context, [fault])
+        return handler.serialize(context, [fault] * len(requests))
+
+
+async def _client_connected(reader, writer):
+    if not CONFIG['tcp_nodelay']:
+        # asyncio turns Nagle's algorithm off on every tcp connection
+        tcp_nodelay(writer.transport, False)
+    await StreamConnection(reader, writer).serve()
+
+
+def start_server(transport: str, *, host: str='0.0.0.0', port: int=None, path: str=None,
+                 sock=None):
+    """
+    Start a stream server
+    :param transport: 'tcp' or 'unix'
+    :param port: tcp port
+    :param path: unix socket path
+    :param sock: an already bound socket to serve on instead
+    :return: coroutine of the asyncio Server
+    """
+    limit = CONFIG['stream_max_frame_size'] + 1
+    if transport == 'tcp':
+        if sock is not None:
+            return asyncio.start_server(_client_connected, sock=sock, limit=limit)
+        return asyncio.start_server(_client_connected, host, port, limit=limit)
+    elif transport == 'unix':
+        if sock is not None:
+            return asyncio.start_unix_server(_client_connected, sock=sock, limit=limit)
+        return asyncio.start_unix_server(_client_connected, path, limit=limit)
+    raise ValueError('Unknown transport %r' % transport)
+
+
+async def close_connections(timeout: float):
+    """
+    Let the open connections answer what they read and close
+    """
+    for connection in list(connections):
+        connection.close()
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    if tasks:
+        await asyncio.wait(tasks, timeout=timeout)
@@ -0,0 +1,234 @@
+"""
+Results of generator handlers, streamed item by item.
+
+A sync generator is iterated by a single pool task, which runs at
+most CONFIG['stream_window'] items ahead of the writer: it takes a
+credit for every item and gets the credits back once the writer asks
+for more, so a slow client holds back the generator instead of
+filling the memory. Items are handed to the loop in bunches, the
+thread only wakes the loop up when it is waiting for items.
+
+An async generator is iterated on the loop by the writer itself.
+
+Over HTTP the items are written as they come, see
+BaseRPCHandler.write_stream. Other transports and batches get the
+whole list.
+"""
+import asyncio
+import collections
+import threading
+import time
+
+from asynciorpc import cancellation
+from asynciorpc.exceptions import QueueTimeout
+
+
+class ResultStream(object):
+    """
+    The items of a generator handler call
+    :param route: Route of the handler
+    :param params: params of the call, for the error report
+    :param token: CancelToken of the call, its deadline bounds the stream
+    """
+
+    def __init__(self, route, params, token):
+        self.route = route
+        self.params = params
+        self.token = token
+        self.exhausted = False
+        self._ready = None
+        self._closed = False
+        self._close_callbacks = []
+
+    async def start(self):
+        """
+        Wait for the first items, so a handler failing straight away
+        is answered with a plain fault
+        """
+        self._ready = await self.next_items()
+
+    async def next_items(self) -> list:
+        """
+        The items produced since the last call, at least one,
+        [] once the generator is exhausted
+        """
+        if self._ready is not None:
+            items, self._ready = self._ready, None
+            return items
+        deadline = self.token.deadline
+        if deadline is None:
+            items = await self._next()
+        else:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            items = await asyncio.wait_for(self._next(), remaining)
+        if not items:
+            self.exhausted = True
+        return items
+
+    async def collect(self) -> list:
+        """
+        All the items, for the transports which can't stream them
+        """
+        result = []
+        try:
+            while True:
+                items = await self.next_items()
+                if not items:
+                    return result
+                result.extend(items)
+        finally:
+            await self.close()
+
+    async def drain(self):
+        """
+        Run the generator to its end, dropping the items
+        """
+        try:
+            while await self.next_items():
+                pass
+        finally:
+            await self.close()
+
+    def add_close_callback(self, callback, *args):
+        self._close_callbacks.append((callback, args))
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if not self.exhausted:
+            # not read to the end, stop the handler
+            self.token.cancel()
+        try:
+            await self._close()
+        finally:
+            for callback, args in self._close_callbacks:
+                callback(*args)
+
+    async def _next(self):
+        """
+        Extend this to pull the items from the generator, it must
+        return the items produced since the last call, [] at the end
+        """
+        return []
+
+    async def _close(self):
+        pass
+
+
+class AsyncGeneratorStream(ResultStream):
+    """
+    Items of an async generator, pulled one at a time
+    """
+
+    def __init__(self, route, params, token, generator):
+        super().__init__(route, params, token)
+        self._generator = generator
+
+    async def _next(self):
+        # the generator runs in the task of the writer, under the token of the call
+        reset = cancellation.set_token(self.token)
+        try:
+            return [await self._generator.__anext__()]
+        except StopAsyncIteration:
+            return []
+        finally:
+            cancellation.reset_token(reset)
+
+    async def _close(self):
+        await self._generator.aclose()
+
+
+class ThreadStream(ResultStream):
+    """
+    Items of a sync generator iterated in a pool thread by `produce`
+    :param window: items the thread may run ahead of the writer
+    """
+
+    def __init__(self, route, params, token, window):
+        super().__init__(route, params, token)
+        self.future = None
+        self._loop = asyncio.get_event_loop()
+        self._credits = threading.Semaphore(window)
+        # items taken by the writer, their credits are given back
+        # when it asks for more
+        self._taken = 0
+        self._lock = threading.Lock()
+        self._items = collections.deque()
+        self._waiter = None
+        self._done = False
+        self._error = None
+        self._cancelled = False
+
+    def produce(self, func, args, kwargs, deadline=None):
+        """
+        Run in the pool thread, iterates the whole generator
+        :param deadline: time.monotonic() after which the call is
+                         dropped instead of started
+        """
+        try:
+            if deadline is not None and time.monotonic() > deadline:
+                raise QueueTimeout()
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    self._credits.acquire()
+                    if self._cancelled:
+                        break
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        break
+                    with self._lock:
+                        self._items.append(item)
+                        waiter, self._waiter = self._waiter, None
+                    if waiter is not None:
+                        self._loop.call_soon_threadsafe(_wake, waiter)
+            finally:
+                generator.close()
+        except BaseException as error:
+            self._error = error
+        finally:
+            with self._lock:
+                self._done = True
+                waiter, self._waiter = self._waiter, None
+            if waiter is not None:
+                try:
+                    self._loop.call_soon_threadsafe(_wake, waiter)
+                except RuntimeError:
+                    # the loop is closed
+                    pass
+
+    async def _next(self):
+        for _ in range(self._taken):
+            self._credits.release()
+        self._taken = 0
+        while True:
+            with self._lock:
+                if self._items:
+                    items = list(self._items)
+                    self._items.clear()
+                    self._taken = len(items)
+                    return items
+                if self._done:
+                    error, self._error = self._error, None
+                    if error is not None:
+                        raise error
+                    return []
+                waiter = self._waiter = self._loop.create_future()
+            await waiter
+
+    async def _close(self):
+        self._cancelled = True
+        if self.future is not None and self.future.cancel():
+            # never started
+            return
+        # unblock the thread waiting for a credit, it stops at the next item
+        self._credits.release()
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -0,0 +1,129 @@
+"""
+Pre-fork worker fleet.
+
+The supervisor forks the workers and watches them: a worker that dies
+is started again, SIGTERM / SIGINT stops the fleet gracefully and
+SIGHUP replaces the workers one by one. It runs no event loop itself.
+"""
+import os
+import signal
+import time
+import traceback
+
+
+class Supervisor(object):
+    """
+    :param target: function run in every worker with its worker id,
+                   it returns when the worker should exit
+    :param workers: number of worker processes
+    :param shutdown_timeout: seconds a worker gets to finish its calls
+                             before it is killed
+    """
+    # a worker dying sooner than this after its start is restarted with a delay
+    min_lifetime = 1.0
+
+    def __init__(self, target, workers: int, shutdown_timeout: float):
+        self.target = target
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self._pids = {}  # pid -> (worker id, start time)
+        self._stopping = False
+        self._reloading = False
+
+    def spawn(self, worker_id: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                    signal.signal(signum, signal.SIG_DFL)
+                self.target(worker_id)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self._pids[pid] = (worker_id, time.monotonic())
+        return pid
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+
+        for worker_id in range(self.workers):
+            self.spawn(worker_id)
+
+        while not self._stopping:
+            if self._reloading:
+                self._reloading = False
+                self.rolling_restart()
+            self._reap()
+            time.sleep(0.1)
+
+        self.stop()
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reloading = True
+
+    def _reap(self, expected=()):
+        """
+        Collect the exited workers, restarting them unless their
+        exit is expected
+        """
+        while self._pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid not in self._pids:
+                continue
+            worker_id, started = self._pids.pop(pid)
+            if pid not in expected and not self._stopping:
+                print('Worker %d (pid %d) exited with status %d, restarting'
+                      % (worker_id, pid, status))
+                lifetime = time.monotonic() - started
+                if lifetime < self.min_lifetime:
+                    time.sleep(self.min_lifetime - lifetime)
+                self.spawn(worker_id)
+
+    def _terminate(self, pids):
+        """
+        SIGTERM the workers and wait for them, killing the ones
+        still alive after shutdown_timeout
+        """
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.shutdown_timeout
+        while any(pid in self._pids for pid in pids) and time.monotonic() < deadline:
+            self._reap(expected=pids)
+            time.sleep(0.05)
+        for pid in pids:
+            if pid in self._pids:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        while any(pid in self._pids for pid in pids):
+            self._reap(expected=pids)
+            time.sleep(0.05)
+
+    def rolling_restart(self):
+        """
+        Replace the workers one at a time, the new one is started
+        before the old one stops so the port never goes dark
+        """
+        for pid, (worker_id, started) in list(self._pids.items()):
+            self.spawn(worker_id)
+            self._terminate([pid])
+
+    def stop(self):
+        self._terminate(list(self._pids))
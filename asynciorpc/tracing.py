@@ -0,0 +1,280 @@
+"""
+Tracing of the requests.
+
+With CONFIG['tracing'], every request is traced as a tree of spans:
+
+    rpc.request      the whole request (post, or a WebSocket / TCP message)
+      rpc.parse      parsing the body (parse_request)
+      rpc.call       one call (dispatch): its method, index in the batch,
+                     number of bound arguments and fault code
+        rpc.queue    waiting for a pool worker
+        rpc.execute  running the handler
+      rpc.serialize  encoding the response (parse_responses)
+
+An HTTP request continues the trace of its W3C `traceparent` header, and
+the Client calls made while serving it carry the trace on. Spans go to
+the processors of `add_processor` as they start and end. The RingBuffer
+processor keeps the last CONFIG['tracing_buffer'] requests, and the
+slowest of them are listed on CONFIG['tracing_path'].
+
+Spans are only created and ended on the event loop thread.
+"""
+import collections
+import contextvars
+import random
+import re
+import time
+
+from aiohttp import web
+
+from asynciorpc.config import CONFIG, lazy_settings
+
+# perf_counter() + _EPOCH is the wall clock time
+_EPOCH = time.time() - time.perf_counter()
+
+_TRACEPARENT = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current = contextvars.ContextVar('asynciorpc_span', default=None)
+
+processors = []
+
+
+__getattr__ = lazy_settings(__name__, enabled='tracing')
+
+
+def _new_id(bits):
+    return '%0*x' % (bits // 4, random.getrandbits(bits))
+
+
+class Trace(object):
+    """
+    The spans of one request, in the order they started
+    """
+    __slots__ = ('trace_id', 'flags', 'state', 'spans')
+
+    def __init__(self, trace_id=None, flags='01', state=None):
+        self.trace_id = trace_id or _new_id(128)
+        self.flags = flags
+        # the tracestate header, passed on as is
+        self.state = state
+        self.spans = []
+
+    @property
+    def root(self):
+        return self.spans[0]
+
+    def to_dict(self):
+        root = self.root
+        return {
+            'trace_id': self.trace_id,
+            'name': root.name,
+            'start': _EPOCH + root.start,
+            'duration_ms': _ms(root.duration),
+            'attributes': root.attributes,
+            'spans': [span.to_dict(root.start) for span in self.spans[1:]],
+        }
+
+
+class Span(object):
+    """
+    A timed step of a request, perf_counter() start and end
+    """
+    __slots__ = ('name', 'trace', 'span_id', 'parent_id', 'start', 'end', 'attributes')
+
+    def __init__(self, name, trace, parent_id=None, start=None, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.start = time.perf_counter() if start is None else start
+        self.end = None
+        self.attributes = attributes if attributes is not None else {}
+        trace.spans.append(self)
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def to_dict(self, origin=0.0):
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'offset_ms': _ms(self.start - origin),
+            'duration_ms': _ms(self.duration) if self.end is not None else None,
+            'attributes': self.attributes,
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+class SpanProcessor(object):
+    """
+    Base of the processors of `add_processor`, which see every span
+    when it starts and when it ends. A span is a request once
+    `span is span.trace.root`.
+    """
+
+    def on_start(self, span):
+        pass
+
+    def on_end(self, span):
+        pass
+
+
+def add_processor(processor: SpanProcessor):
+    processors.append(processor)
+
+
+def remove_processor(processor: SpanProcessor):
+    processors.remove(processor)
+
+
+class RingBuffer(SpanProcessor):
+    """
+    Keeps the traces of the last `size` requests
+    """
+
+    def __init__(self, size: int):
+        self.traces = collections.deque(maxlen=size)
+
+    def on_end(self, span):
+        if span is span.trace.root:
+            self.traces.append(span.trace)
+
+    def slowest(self, count: int):
+        return sorted(self.traces, key=lambda trace: trace.root.duration, reverse=True)[:count]
+
+
+# the RingBuffer of the admin route, set up on the first request
+buffer = None
+
+
+def parse_traceparent(header: str):
+    """
+    The (trace id, parent span id, flags) of a traceparent header,
+    None if it is missing or malformed
+    """
+    match = _TRACEPARENT.match(header.strip()) if header else None
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags = match.groups()
+    if version == 'ff' or trace_id == '0' * 32 or parent_id == '0' * 16:
+        return None
+    return trace_id, parent_id, flags
+
+
+def start_request(name: str='rpc.request', headers=None, **attributes):
+    """
+    Start the root span of a request and make it current. It continues
+    the trace of the traceparent of `headers` if any.
+    :return: (span, token to give `finish`)
+    """
+    global buffer
+    if buffer is None:
+        buffer = RingBuffer(CONFIG['tracing_buffer'])
+        add_processor(buffer)
+    parent = parse_traceparent(headers.get('traceparent')) if headers is not None else None
+    if parent is None:
+        trace, parent_id = Trace(), None
+    else:
+        trace_id, parent_id, flags = parent
+        trace = Trace(trace_id, flags, headers.get('tracestate'))
+    span = Span(name, trace, parent_id, attributes=attributes)
+    for processor in processors:
+        processor.on_start(span)
+    return span, _current.set(span)
+
+
+def start(name: str, **attributes):
+    """
+    Start a child of the current span and make it current
+    :return: (span, token to give `finish`), (None, None) outside a request
+    """
+    parent = _current.get()
+    if parent is None:
+        return None, None
+    span = Span(name, parent.trace, parent.span_id, attributes=attributes)
+    for processor in processors:
+        processor.on_start(span)
+    return span, _current.set(span)
+
+
+def finish(span, token=None):
+    """
+    End a span, and make its parent current again
+    """
+    span.end = time.perf_counter()
+    if token is not None:
+        _current.reset(token)
+    for processor in processors:
+        processor.on_end(span)
+
+
+def record(name: str, start: float, end: float, **attributes):
+    """
+    Add an ended child to the current span, for steps timed elsewhere
+    such as in a pool thread
+    """
+    parent = _current.get()
+    if parent is None:
+        return None
+    span = Span(name, parent.trace, parent.span_id, start, attributes)
+    span.end = end
+    for processor in processors:
+        processor.on_start(span)
+        processor.on_end(span)
+    return span
+
+
+def record_execution(executor: str, marks, done: float):
+    """
+    Add the queue and execute spans of a call, from the perf_counter
+    marks of pool.run_timed, or only its submission for the others
+    """
+    started = marks[0]
+    end = done
+    if len(marks) > 1:
+        record('rpc.queue', marks[0], marks[1])
+        started = marks[1]
+        if len(marks) > 2:
+            end = marks[2]
+    record('rpc.execute', started, end, executor=executor)
+
+
+def current():
+    """
+    The current span, None outside a traced request
+    """
+    return _current.get()
+
+
+def inject(headers: dict) -> dict:
+    """
+    Add the traceparent (and tracestate) of the current span to the
+    headers of an outgoing call
+    """
+    span = _current.get()
+    if span is not None:
+        trace = span.trace
+        headers['traceparent'] = '00-%s-%s-%s' % (trace.trace_id, span.span_id, trace.flags)
+        if trace.state:
+            headers['tracestate'] = trace.state
+    return headers
+
+
+async def traces_handler(request):
+    """
+    The slowest of the recent requests, `?n=` of them (10)
+    """
+    try:
+        count = int(request.query.get('n', 10))
+    except ValueError:
+        raise web.HTTPBadRequest(text='n must be an integer')
+    traces = buffer.slowest(count) if buffer is not None else []
+    return web.json_response([trace.to_dict() for trace in traces])
@@ -1,8 +1,9 @@
-import asyncio
 import socket
+import types
 
 
-@asyncio.coroutine
+# asyncio.coroutine is gone since Python 3.11
+@types.coroutine
 def future_to_coroutine(future):
     """
     In Mac OS asyncio.coroutine may be turned to generator,
@@ -0,0 +1,115 @@
+"""
+JSON-RPC over WebSocket.
+
+Every message is a request or a batch, dispatched as soon as it arrives
+through the same pipeline as a POST. Many calls can be in flight on one
+connection, their responses are sent as they complete, so clients match
+them by id. The server can push notifications with `notify` or
+`broadcast`.
+"""
+import asyncio
+import contextvars
+import weakref
+from aiohttp import web, WSMsgType
+from asynciorpc.config import CONFIG
+from asynciorpc.handler import get_handler
+from asynciorpc.rpc.base import RequestContext
+from asynciorpc.rpc.codec import get_codec
+
+connections = weakref.WeakSet()
+
+_current_connection = contextvars.ContextVar('asynciorpc_connection', default=None)
+
+
+def current_connection():
+    """
+    The WebSocketConnection of the running call, None over HTTP.
+    Only visible to coroutine handlers, thread and process pools
+    don't carry it.
+    """
+    return _current_connection.get()
+
+
+class WebSocketConnection(object):
+    """
+    One WebSocket client. At most CONFIG['websocket_max_inflight'] calls
+    run at the same time, past that the connection stops reading so the
+    client is slowed down by TCP flow control.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.ws = web.WebSocketResponse(max_msg_size=CONFIG['websocket_max_msg_size'])
+        self._inflight = asyncio.Semaphore(CONFIG['websocket_max_inflight'])
+        self._send_lock = asyncio.Lock()
+        self._tasks = set()
+
+    async def serve(self):
+        await self.ws.prepare(self.request)
+        connections.add(self)
+        try:
+            async for msg in self.ws:
+                if msg.type == WSMsgType.TEXT:
+                    data, binary = msg.data.encode(), False
+                elif msg.type == WSMsgType.BINARY:
+                    data, binary = msg.data, True
+                else:
+                    continue
+                # backpressure
+                await self._inflight.acquire()
+                task = asyncio.ensure_future(self._call(data, binary))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            connections.discard(self)
+            for task in list(self._tasks):
+                task.cancel()
+        return self.ws
+
+    async def _call(self, data, binary):
+        _current_connection.set(self)
+        try:
+            response_body = await get_handler().process(data, RequestContext(self.request))
+            if response_body:
+                await self.send(response_body, binary)
+        finally:
+            self._inflight.release()
+
+    async def send(self, data: bytes, binary: bool=False):
+        if self.ws.closed:
+            return
+        async with self._send_lock:
+            if binary:
+                await self.ws.send_bytes(data)
+            else:
+                await self.ws.send_str(data.decode())
+
+    async def notify(self, method: str, params=None):
+        """
+        Push a JSON-RPC notification to the client
+        """
+        notification = {'jsonrpc': '2.0', 'method': method, 'params': params or []}
+        await self.send(get_codec(CONFIG['json_codec']).dumps(notification))
+
+    async def close(self):
+        await self.ws.close(code=1001, message=b'Server shutdown')
+
+
+async def broadcast(method: str, params=None):
+    """
+    Push a notification to every connected client
+    """
+    await asyncio.gather(*[connection.notify(method, params)
+                           for connection in list(connections)],
+                         return_exceptions=True)
+
+
+async def websocket_handler(request):
+    if len(connections) >= CONFIG['websocket_max_connections']:
+        raise web.HTTPServiceUnavailable(text='Too many websocket connections')
+    return await WebSocketConnection(request).serve()
+
+
+async def close_connections(app):
+    await asyncio.gather(*[connection.close() for connection in list(connections)],
+                         return_exceptions=True)
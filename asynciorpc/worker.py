@@ -0,0 +1,32 @@
+"""
+Gunicorn worker class of the HTTP server.
+
+    gunicorn server:app --bind localhost:8080 --worker-class asynciorpc.worker.GunicornWorker
+
+On top of aiohttp's worker it runs the loop of CONFIG['event_loop'] and
+gives every worker its share of threadpool_size and processpool_size,
+as `--workers` of the runner does. Keep-alive, backlog and reuse_port
+are gunicorn's own settings there (--keep-alive, --backlog,
+--reuse-port). gunicorn is only needed to import this module.
+"""
+import asyncio
+
+from aiohttp.worker import GunicornWebWorker
+
+from asynciorpc import loops, pool
+from asynciorpc.config import CONFIG
+
+
+class GunicornWorker(GunicornWebWorker):
+
+    def init_process(self):
+        # after the fork, before aiohttp's worker creates its loop
+        loops.install()
+        # aiohttp's worker closes the current loop before making its own,
+        # uvloop's policy has none to give until one is set
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        workers = max(1, self.cfg.workers)
+        pool.configure(max(1, CONFIG['threadpool_size'] // workers),
+                       max(1, CONFIG['processpool_size'] // workers),
+                       workers)
+        super().init_process()
@@ -0,0 +1,53 @@
+"""
+Micro-benchmark of argument binding.
+
+Compares the compiled `ArgumentBinder` with a per-call
+`inspect.getfullargspec`, for signatures of growing size.
+The call always passes two arguments, the rest have defaults: the
+dispatch column is the binding of a call, which leaves them to Python.
+
+    python3 benchmarks/binding.py
+"""
+import inspect
+import timeit
+
+from asynciorpc.rpc.utils import get_binder
+
+
+def make_function(size):
+    params = ', '.join(['a: int', 'b: str'] + ['p%d: int = 0' % i for i in range(size - 2)])
+    namespace = {}
+    exec('def func(%s): pass' % params, namespace)
+    return namespace['func']
+
+
+def spec_binding(func, positional):
+    signature = inspect.getfullargspec(func)
+    final_kwargs = dict(zip(signature.args, positional))
+    for kwarg, default in zip(signature.args[-len(signature.defaults):], signature.defaults):
+        final_kwargs.setdefault(kwarg, default)
+    return final_kwargs
+
+
+def main(number=20000):
+    positional = (1, 'x')
+    print('%6s %14s %14s %14s' % ('params', 'getfullargspec', 'compiled', 'dispatch'))
+    for size in (3, 10, 50, 200):
+        func = make_function(size)
+        binder = get_binder(func)
+
+        def compiled():
+            binder.bind(positional, validate=True)
+
+        def dispatch():
+            binder.bind(positional, validate=True, defaults=False)
+
+        spec = timeit.timeit(lambda: spec_binding(func, positional), number=number)
+        fast = timeit.timeit(compiled, number=number)
+        bare = timeit.timeit(dispatch, number=number)
+        print('%6d %12.2fus %12.2fus %12.2fus' % (size, spec / number * 1e6, fast / number * 1e6,
+                                                   bare / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Shared parts of the benchmarks: the handlers they call, statistics
+and the JSON result files.
+
+The benchmarks are run from the root of the repository, where the
+server finds its config.yaml:
+
+    python3 benchmarks/run.py --output results.json
+"""
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from asynciorpc.interface.register import register
+from asynciorpc.rpc.utils import getfullmethod
+
+
+async def echo(value):
+    return value
+
+
+def echo_sync(value):
+    return value
+
+
+def stats():
+    """
+    Garbage collections and memory of the server process, the
+    collections of the young generation tell how much it allocates
+    """
+    return {
+        'gc_collections': [generation['collections'] for generation in gc.get_stats()],
+        'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+register(echo, 'bench_echo')
+register(echo_sync, 'bench_echo_sync')
+register(echo_sync, 'bench_echo_inline', executor='inline')
+register(stats, 'bench_stats')
+
+ECHO = getfullmethod('bench_echo')
+ECHO_SYNC = getfullmethod('bench_echo_sync')
+ECHO_INLINE = getfullmethod('bench_echo_inline')
+STATS = getfullmethod('bench_stats')
+
+
+def percentiles(latencies):
+    """
+    :param latencies: seconds
+    :return: latency statistics in milliseconds
+    """
+    if not latencies:
+        return {}
+    latencies = sorted(latencies)
+    last = len(latencies) - 1
+
+    def at(fraction):
+        return round(latencies[min(last, int(fraction * len(latencies)))] * 1000, 3)
+
+    return {
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'p50_ms': at(0.5),
+        'p99_ms': at(0.99),
+        'p999_ms': at(0.999),
+        'max_ms': round(latencies[-1] * 1000, 3),
+    }
+
+
+def per_call_us(func, number):
+    """
+    Run func `number` times, :return: microseconds per call
+    """
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    return round((time.perf_counter() - started) / number * 1e6, 3)
+
+
+def metadata():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def save(path, section, results):
+    """
+    Store the results of a benchmark under `section` of a JSON file,
+    keeping the sections already in it
+    """
+    document = {}
+    if os.path.exists(path):
+        with open(path) as result_file:
+            document = json.load(result_file)
+    document['meta'] = metadata()
+    document.setdefault('results', {})[section] = results
+    with open(path, 'w') as result_file:
+        json.dump(document, result_file, indent=2, sort_keys=True)
@@ -0,0 +1,63 @@
+"""
+Throughput of the HTTP server on every event loop implementation that
+is installed (asyncio, uvloop, see asynciorpc.loops).
+
+The server runs the load.py workloads in a subprocess started with
+`--loop`, the client stays on the asyncio loop of this process so only
+the server side changes between the runs.
+
+    python3 benchmarks/event_loops.py --workloads single,sync,batch --requests 20000
+"""
+import argparse
+import asyncio
+
+import common
+import load
+from asynciorpc import loops
+
+IMPLEMENTATIONS = ('asyncio', 'uvloop')
+
+
+def main(workloads=('single', 'sync', 'batch'), requests=20000, concurrency=32, workers=1):
+    """
+    :return: load results by loop and workload, and the throughput of
+             every other loop relative to asyncio by workload
+    """
+    results = {}
+    for name in IMPLEMENTATIONS:
+        if loops.loop_name(name) != name:
+            print('-- %s is not installed, skipped' % name)
+            continue
+        print('-- %s' % name)
+        results[name] = asyncio.run(load.main('subprocess', workloads, requests, concurrency,
+                                              workers=workers, loop=name))
+
+    baseline = results.get('asyncio', {})
+    for name, by_workload in list(results.items()):
+        if name == 'asyncio':
+            continue
+        speedup = {}
+        for workload, figures in by_workload.items():
+            if workload in baseline:
+                speedup[workload] = round(figures['calls_per_s'] / baseline[workload]['calls_per_s'], 3)
+                print('%-7s %s / asyncio %6.2fx' % (workload, name, speedup[workload]))
+        results['%s_vs_asyncio' % name] = speedup
+    return results
+
+
+def add_arguments(parser):
+    parser.add_argument('--workloads', default='single,sync,batch',
+                        help='comma separated, of %s' % ', '.join(load.WORKLOADS))
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=1, help='server processes')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    parser.add_argument('--output', help='JSON file to store the results in')
+    args = parser.parse_args()
+    results = main(args.workloads.split(','), args.requests, args.concurrency, args.workers)
+    if args.output:
+        common.save(args.output, 'event_loops', results)
@@ -0,0 +1,227 @@
+"""
+Load test of the HTTP server.
+
+Starts the server in this process (`--mode inprocess`, client and
+server then share the event loop) or as a subprocess on localhost
+(`--mode subprocess`, see server.py), and drives it with workloads:
+
+    single  one coroutine call per request
+    sync    one thread pool call per request
+    batch   batches of --batch-size coroutine calls
+    large   calls echoing --payload-size bytes, on a twentieth of
+            the requests
+    faults  method_not_found and invalid_params faults
+
+For every workload it reports the throughput and the p50 / p99 / p999
+latency of the requests. With a subprocess server of one worker, it
+also reports the young generation collections of the server per 1000
+calls, which tell how much it allocates, and its peak memory. They are
+left out otherwise: an in process server shares them with the client,
+and the stats call of several workers reaches only one of them.
+
+    python3 benchmarks/load.py --mode subprocess --workloads single,batch --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+import common
+from asynciorpc import loops
+from asynciorpc.application import get_application
+
+WORKLOADS = ('single', 'sync', 'batch', 'large', 'faults')
+
+HEADERS = {'Content-Type': 'application/json'}
+
+
+def request(method, params, rpcid=1):
+    return {'jsonrpc': '2.0', 'method': method, 'params': params, 'id': rpcid}
+
+
+def workload_bodies(name, batch_size, payload_size):
+    """
+    :return: (request bodies sent in turn, calls per request)
+    """
+    if name == 'single':
+        return [json.dumps(request(common.ECHO, [1])).encode()], 1
+    if name == 'sync':
+        return [json.dumps(request(common.ECHO_SYNC, [1])).encode()], 1
+    if name == 'batch':
+        batch = [request(common.ECHO, [i], i) for i in range(batch_size)]
+        return [json.dumps(batch).encode()], batch_size
+    if name == 'large':
+        return [json.dumps(request(common.ECHO, ['x' * payload_size])).encode()], 1
+    if name == 'faults':
+        return [json.dumps(request(common.ECHO + '_missing', [1])).encode(),
+                json.dumps(request(common.ECHO, [1, 2])).encode()], 1
+    raise ValueError('Unknown workload %r' % name)
+
+
+async def drive(session, url, bodies, requests, concurrency):
+    """
+    Send `requests` requests from `concurrency` clients
+    :return: (elapsed seconds, request latencies, errors)
+    """
+    latencies = []
+    errors = 0
+    sent = 0
+
+    async def client():
+        nonlocal errors, sent
+        while sent < requests:
+            body = bodies[sent % len(bodies)]
+            sent += 1
+            started = time.perf_counter()
+            try:
+                async with session.post(url, data=body, headers=HEADERS) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return time.perf_counter() - started, latencies, errors
+
+
+async def server_stats(session, url):
+    async with session.post(url, data=json.dumps(request(common.STATS, [])),
+                            headers=HEADERS) as response:
+        return (await response.json())['result']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def start_inprocess():
+    runner = web.AppRunner(get_application())
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return port, runner.cleanup
+
+
+async def start_subprocess(workers, loop='asyncio'):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), 'server.py'),
+                                '--port', str(port), '--workers', str(workers), '--loop', loop],
+                               stdout=subprocess.DEVNULL)
+    url = 'http://127.0.0.1:%d/' % port
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                await server_stats(session, url)
+                break
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+        else:
+            process.kill()
+            raise RuntimeError('The benchmark server did not start')
+
+    async def stop():
+        process.terminate()
+        process.wait()
+
+    return port, stop
+
+
+async def main(mode='inprocess', workloads=WORKLOADS, requests=20000, concurrency=32,
+               batch_size=10, payload_size=256 * 1024, workers=1, loop='asyncio'):
+    """
+    :param loop: event loop of the subprocess server, an in process
+                 server runs on the loop of the caller
+    :return: results by workload
+    """
+    if mode == 'inprocess':
+        port, stop = await start_inprocess()
+    else:
+        port, stop = await start_subprocess(workers, loop)
+    url = 'http://127.0.0.1:%d/' % port
+
+    # the stats call tells about the server alone
+    server_only = mode == 'subprocess' and workers == 1
+    results = {}
+    try:
+        async with aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+            for name in workloads:
+                bodies, calls = workload_bodies(name, batch_size, payload_size)
+                count = max(100, requests // 20) if name == 'large' else requests
+                # warm up the connections and the pools
+                await drive(session, url, bodies, max(100, count // 10), concurrency)
+
+                if server_only:
+                    before = await server_stats(session, url)
+                elapsed, latencies, errors = await drive(session, url, bodies, count, concurrency)
+
+                results[name] = dict(
+                    common.percentiles(latencies),
+                    requests=count,
+                    calls=count * calls,
+                    concurrency=concurrency,
+                    errors=errors,
+                    elapsed_s=round(elapsed, 3),
+                    requests_per_s=round(count / elapsed, 1),
+                    calls_per_s=round(count * calls / elapsed, 1),
+                )
+                if server_only:
+                    after = await server_stats(session, url)
+                    collections = after['gc_collections'][0] - before['gc_collections'][0]
+                    results[name].update(
+                        gc_gen0_per_1k_calls=round(collections * 1000 / (count * calls), 3),
+                        server_maxrss_kb=after['maxrss_kb'],
+                    )
+                print('%-7s %10.0f calls/s  p50 %7.3fms  p99 %7.3fms  p999 %7.3fms  errors %d' % (
+                    name, results[name]['calls_per_s'], results[name]['p50_ms'],
+                    results[name]['p99_ms'], results[name]['p999_ms'], errors))
+    finally:
+        await stop()
+    return results
+
+
+def add_arguments(parser):
+    parser.add_argument('--mode', choices=('inprocess', 'subprocess'), default='inprocess')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS),
+                        help='comma separated, of %s' % ', '.join(WORKLOADS))
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--payload-size', type=int, default=256 * 1024)
+    parser.add_argument('--workers', type=int, default=1, help='server processes in subprocess mode')
+    parser.add_argument('--loop', choices=loops.LOOPS, default='asyncio',
+                        help='event loop of the server, and of the client in inprocess mode')
+
+
+def run_arguments(args):
+    coroutine = main(args.mode, args.workloads.split(','), args.requests, args.concurrency,
+                     args.batch_size, args.payload_size, args.workers, args.loop)
+    if args.mode == 'subprocess':
+        return asyncio.run(coroutine)
+    loop = loops.new_event_loop(args.loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    parser.add_argument('--output', help='JSON file to store the results in')
+    args = parser.parse_args()
+    results = run_arguments(args)
+    if args.output:
+        common.save(args.output, 'load', results)
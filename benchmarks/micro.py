@@ -0,0 +1,99 @@
+"""
+Micro-benchmarks of the request path, in microseconds per operation:
+
+    binding   getcallargs, compiled binder against getfullargspec (binding.py)
+    routing   route lookup, __dir__ listing and a whole dispatch of a call
+    parser    JSONRPCParser parse_request / parse_responses of a call and
+              of a batch of 100, for every installed codec
+
+    python3 benchmarks/micro.py --number 20000 --output results.json
+"""
+import argparse
+import asyncio
+import json
+
+import binding
+import common
+from asynciorpc.handler import get_handler
+from asynciorpc.routes import ROUTES, list_children
+from asynciorpc.rpc.base import RequestContext
+from asynciorpc.rpc.codec import CODECS
+from asynciorpc.rpc.json import JSONRPCParser, JSONRPCLibraryWrapper
+from asynciorpc.rpc.utils import getcallargs
+
+
+def bench_binding(number):
+    results = {}
+    for size in (3, 10, 50):
+        func = binding.make_function(size)
+        positional = (1, 'x')
+        results['getfullargspec_%d_us' % size] = common.per_call_us(
+            lambda: binding.spec_binding(func, positional), number)
+        results['getcallargs_%d_us' % size] = common.per_call_us(
+            lambda: getcallargs(func, *positional), number)
+    return results
+
+
+def bench_routing(number):
+    parser = get_handler()._RPC_
+    context = RequestContext()
+    loop = asyncio.new_event_loop()
+
+    def dispatch():
+        loop.run_until_complete(parser.dispatch(context, common.ECHO, [1]))
+
+    try:
+        return {
+            'route_lookup_us': common.per_call_us(lambda: ROUTES.get(common.ECHO), number),
+            'list_children_us': common.per_call_us(lambda: list_children('dmall.ams.__dir__'), number),
+            'dispatch_coroutine_us': common.per_call_us(dispatch, number),
+        }
+    finally:
+        loop.close()
+
+
+def bench_parser(number):
+    single = {'jsonrpc': '2.0', 'method': common.ECHO, 'params': [1, 'two', {'three': 3}], 'id': 1}
+    batch = [dict(single, id=i) for i in range(100)]
+    results = {}
+    for name, codec_class in CODECS.items():
+        try:
+            codec = codec_class()
+        except ImportError:
+            # not installed
+            continue
+        parser = JSONRPCParser(JSONRPCLibraryWrapper, codec)
+        for kind, body, count in (('single', single, 1), ('batch100', batch, 100)):
+            encoded = json.dumps(body).encode()
+            responses = [[1, 'two', {'three': 3}]] * count
+            context = RequestContext()
+            parser.parse_request(context, encoded)
+            # batches are answered a hundred times less often
+            times = max(1, number // count)
+            results['%s_decode_%s_us' % (name, kind)] = common.per_call_us(
+                lambda: parser.parse_request(RequestContext(), encoded), times)
+            results['%s_encode_%s_us' % (name, kind)] = common.per_call_us(
+                lambda: parser.parse_responses(context, responses), times)
+    return results
+
+
+def main(number=20000):
+    results = {
+        'binding': bench_binding(number),
+        'routing': bench_routing(number),
+        'parser': bench_parser(number),
+    }
+    for group, timings in results.items():
+        for name, value in sorted(timings.items()):
+            print('%-8s %-30s %10.3f' % (group, name, value))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--output', help='JSON file to store the results in')
+    args = parser.parse_args()
+    results = main(args.number)
+    if args.output:
+        common.save(args.output, 'micro', results)
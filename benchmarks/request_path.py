@@ -0,0 +1,80 @@
+"""
+Cost of the request path for tiny calls, without the network.
+
+Runs request bodies through `Handler.process` on the shared handler,
+and on a fresh handler per request to show what building it costs, and
+reports the calls per second and the peak memory a request allocates
+(tracemalloc). The thread and inline bodies call the same sync handler
+through the thread pool and on the loop.
+
+    python3 benchmarks/request_path.py --calls 20000
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+
+import common
+from asynciorpc.handler import Handler, get_handler
+from asynciorpc.rpc.base import RequestContext
+
+BODIES = {
+    'call': json.dumps({'jsonrpc': '2.0', 'method': common.ECHO,
+                        'params': [1], 'id': 1}).encode(),
+    'fault': json.dumps({'jsonrpc': '2.0', 'method': common.ECHO + '_missing',
+                         'params': [1], 'id': 1}).encode(),
+    'thread': json.dumps({'jsonrpc': '2.0', 'method': common.ECHO_SYNC,
+                          'params': [1], 'id': 1}).encode(),
+    'inline': json.dumps({'jsonrpc': '2.0', 'method': common.ECHO_INLINE,
+                          'params': [1], 'id': 1}).encode(),
+}
+
+
+async def run(body, calls, fresh):
+    for _ in range(calls):
+        handler = Handler() if fresh else get_handler()
+        await handler.process(body, RequestContext())
+
+
+async def allocations(body, calls, fresh):
+    """
+    :return: mean peak of the memory traced while serving a request,
+             in bytes, all it allocates is alive at that peak
+    """
+    await run(body, 100, fresh)
+    tracemalloc.start()
+    total = 0
+    for _ in range(calls):
+        current, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await run(body, 1, fresh)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return total / calls
+
+
+async def main(calls):
+    results = {}
+    print('%-6s %-7s %12s %12s' % ('body', 'handler', 'calls/s', 'bytes/req'))
+    for name, body in BODIES.items():
+        for fresh in (True, False):
+            started = time.perf_counter()
+            await run(body, calls, fresh)
+            elapsed = time.perf_counter() - started
+            allocated = await allocations(body, min(calls, 2000), fresh)
+            handler = 'fresh' if fresh else 'shared'
+            print('%-6s %-7s %12.0f %12.0f' % (name, handler, calls / elapsed, allocated))
+            results['%s_%s' % (name, handler)] = {'calls_per_s': round(calls / elapsed, 1),
+                                                  'bytes_per_request': round(allocated)}
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--output', help='JSON file to store the results in')
+    args = parser.parse_args()
+    results = asyncio.run(main(args.calls))
+    if args.output:
+        common.save(args.output, 'request_path', results)
@@ -0,0 +1,98 @@
+"""
+Run the benchmark suite and store the results as JSON, to compare
+them between commits:
+
+    python3 benchmarks/run.py --output before.json
+    git checkout my-branch
+    python3 benchmarks/run.py --output after.json --compare before.json
+
+Sections are micro (micro.py), request_path (request_path.py),
+load (load.py, takes its arguments), transport (transport.py),
+event_loops (event_loops.py, the load workloads on asyncio and uvloop)
+and startup (startup.py, import and boot times).
+"""
+import argparse
+import asyncio
+import json
+
+import common
+import event_loops
+import load
+import micro
+import request_path
+import startup
+import transport
+
+SECTIONS = ('micro', 'request_path', 'load', 'transport', 'event_loops', 'startup')
+
+# lower is better for these, higher for the others
+LOWER_IS_BETTER = ('_us', '_ms', 'elapsed_s', 'bytes_per_request', 'gc_gen0_per_1k_calls',
+                   'maxrss_kb', 'errors')
+# parameters of the run, not figures
+PARAMETERS = ('.requests', '.calls', '.concurrency')
+
+
+def flatten(results, prefix=''):
+    for key, value in results.items():
+        name = '%s.%s' % (prefix, key) if prefix else str(key)
+        if isinstance(value, dict):
+            yield from flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(baseline, results):
+    """
+    Print the change of every figure against a baseline run
+    """
+    before = dict(flatten(baseline.get('results', {})))
+    print('\n%-60s %12s %12s %8s' % ('vs %s' % baseline.get('meta', {}).get('commit'),
+                                     'before', 'after', 'change'))
+    for name, value in flatten(results):
+        old = before.get(name)
+        if old is None or old == 0 or name.endswith(PARAMETERS):
+            continue
+        change = (value - old) / old * 100
+        worse = change > 0 if name.endswith(LOWER_IS_BETTER) else change < 0
+        flag = ' !' if worse and abs(change) >= 10 else ''
+        print('%-60s %12.3f %12.3f %+7.1f%%%s' % (name, old, value, change, flag))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    load.add_arguments(parser)
+    parser.add_argument('--sections', default=','.join(SECTIONS),
+                        help='comma separated, of %s' % ', '.join(SECTIONS))
+    parser.add_argument('--number', type=int, default=20000, help='iterations of the micro-benchmarks')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    args = parser.parse_args()
+
+    results = {}
+    for section in args.sections.split(','):
+        print('== %s' % section)
+        if section == 'micro':
+            results[section] = micro.main(args.number)
+        elif section == 'request_path':
+            results[section] = asyncio.run(request_path.main(args.number))
+        elif section == 'load':
+            results[section] = load.run_arguments(args)
+        elif section == 'transport':
+            results[section] = asyncio.run(transport.main(args.requests, args.concurrency,
+                                                          load.free_port()))
+        elif section == 'event_loops':
+            results[section] = event_loops.main(args.workloads.split(','), args.requests,
+                                                args.concurrency, args.workers)
+        elif section == 'startup':
+            results[section] = startup.main()
+        else:
+            parser.error('Unknown section %r' % section)
+        common.save(args.output, section, results[section])
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(json.load(baseline_file), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+"""
+The server of the benchmarks, started by load.py in a subprocess
+with the arguments of asynciorpc.runner:
+
+    python3 benchmarks/server.py --port 18080 --workers 2
+"""
+import common  # registers the benchmark handlers
+from asynciorpc.runner import run
+
+if __name__ == '__main__':
+    run()
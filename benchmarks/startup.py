@@ -0,0 +1,86 @@
+"""
+Cold start of the server.
+
+Every figure is the best of `--repeat` fresh interpreters, as timeit
+does: the time to import the modules an application imports, the time
+asynciorpc itself takes of it once aiohttp is already imported (most of
+the rest is aiohttp), and the time from starting server.py until it
+answers its first call.
+
+    python3 benchmarks/startup.py --repeat 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import common
+import load
+
+MODULES = ('asynciorpc.interface.register', 'asynciorpc.runner')
+
+IMPORT = 'import time; started = time.perf_counter(); import %s; print(time.perf_counter() - started)'
+
+# the third party and stdlib modules of the runner
+DEPENDENCIES = 'import aiohttp.web, argparse, asyncio, concurrent.futures; '
+
+
+def import_ms(module, repeat, preload=''):
+    times = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', preload + IMPORT % module])
+        times.append(float(output) * 1000)
+    return round(min(times), 2)
+
+
+def boot_ms(repeat):
+    """
+    Time until a subprocess server answers, polling every millisecond
+    """
+    body = json.dumps(load.request(common.STATS, [])).encode()
+    times = []
+    for _ in range(repeat):
+        port = load.free_port()
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), 'server.py'),
+                                    '--port', str(port)], stdout=subprocess.DEVNULL)
+        try:
+            while True:
+                try:
+                    urllib.request.urlopen(urllib.request.Request(
+                        'http://127.0.0.1:%d/' % port, data=body, headers=load.HEADERS), timeout=1).read()
+                    break
+                except (urllib.error.URLError, ConnectionError):
+                    if process.poll() is not None:
+                        raise RuntimeError('The benchmark server did not start')
+                    time.sleep(0.001)
+            times.append((time.perf_counter() - started) * 1000)
+        finally:
+            process.terminate()
+            process.wait()
+    return round(min(times), 2)
+
+
+def main(repeat=10):
+    results = {}
+    for module in MODULES:
+        results['import_%s_ms' % module.rsplit('.', 1)[-1]] = import_ms(module, repeat)
+    results['import_asynciorpc_only_ms'] = import_ms('asynciorpc.runner', repeat, DEPENDENCIES)
+    results['boot_ms'] = boot_ms(repeat)
+    for name, value in results.items():
+        print('%-26s %8.2f' % (name, value))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', help='JSON file to store the results in')
+    args = parser.parse_args()
+    results = main(args.repeat)
+    if args.output:
+        common.save(args.output, 'startup', results)
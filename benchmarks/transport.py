@@ -0,0 +1,85 @@
+"""
+Throughput of the HTTP route against the raw tcp / unix transports.
+
+Both servers run in this process on localhost, `--concurrency` clients
+send `--calls` small calls in total, each client on its own keep-alive
+connection.
+
+    python3 benchmarks/transport.py --calls 20000 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+import common
+from asynciorpc.application import get_application
+from asynciorpc.stream import start_server, read_frame, write_frame
+
+REQUEST = json.dumps({'jsonrpc': '2.0', 'method': common.ECHO,
+                      'params': [1], 'id': 1}).encode()
+
+
+async def http_client(port, calls):
+    async with aiohttp.ClientSession() as session:
+        for _ in range(calls):
+            async with session.post('http://127.0.0.1:%d/' % port, data=REQUEST) as response:
+                await response.read()
+
+
+async def stream_client(open_connection, calls):
+    reader, writer = await open_connection()
+    for _ in range(calls):
+        write_frame(writer, REQUEST)
+        await read_frame(reader)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def measure(name, client, calls, concurrency):
+    started = time.perf_counter()
+    await asyncio.gather(*[client(calls // concurrency) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    print('%-6s %10.0f calls/s' % (name, calls / elapsed))
+    return round(calls / elapsed, 1)
+
+
+async def main(calls, concurrency, port):
+    runner = web.AppRunner(get_application())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    tcp = await start_server('tcp', host='127.0.0.1', port=port + 1)
+    path = os.path.join(tempfile.mkdtemp(), 'bench.sock')
+    unix = await start_server('unix', path=path)
+
+    results = {
+        'http_calls_per_s': await measure('http', lambda n: http_client(port, n),
+                                          calls, concurrency),
+        'tcp_calls_per_s': await measure('tcp', lambda n: stream_client(
+            lambda: asyncio.open_connection('127.0.0.1', port + 1), n), calls, concurrency),
+        'unix_calls_per_s': await measure('unix', lambda n: stream_client(
+            lambda: asyncio.open_unix_connection(path), n), calls, concurrency),
+    }
+
+    for server in (tcp, unix):
+        server.close()
+        await server.wait_closed()
+    await runner.cleanup()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--output', help='JSON file to store the results in')
+    args = parser.parse_args()
+    results = asyncio.run(main(args.calls, args.concurrency, args.port))
+    if args.output:
+        common.save(args.output, 'transport', results)
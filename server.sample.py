@@ -16,6 +16,6 @@ class TestClass:
 
 a = TestClass()
 register(a.test, 'TestApi') # http://127.0.0.1:10080/dmall.ams.TestApi
-register(a.test2, 'TestApi2') # http://127.0.0.1:10080/dmall.ams.TestApi2
+register(a.test2, 'TestApi2', executor='inline') # http://127.0.0.1:10080/dmall.ams.TestApi2
 
 run()
@@ -8,5 +8,6 @@ setup(
     license='MIT',
     author='latyas',
     author_email='latyas@gmail.com',
-    description=''
+    description='',
+    python_requires='>=3.8'
 )
@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from asynciorpc.config import configure
+
+# the defaults only, whatever config.yaml is around, before the test
+# modules register their handlers
+configure(None, company='test', service='svc', metrics=False)
+
+
+def _serve(test, **client_args):
+    """
+    Run the coroutine function `test` with an aiohttp test client of
+    the application, :return: its result
+    """
+    # imported once the test modules set CONFIG up
+    from asynciorpc.application import get_application
+
+    async def main():
+        async with TestClient(TestServer(get_application()), **client_args) as client:
+            return await test(client)
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def serve():
+    return _serve
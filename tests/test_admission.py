@@ -0,0 +1,113 @@
+"""
+Admission control: calls past a concurrency limit are refused straight
+away with a server_busy fault, a request of one call with a 503.
+"""
+import asyncio
+import time
+
+import pytest
+
+from asynciorpc import admission, pool
+from asynciorpc.config import CONFIG
+from asynciorpc.exceptions import FAULT_CODES
+from asynciorpc.interface.register import register
+
+
+async def admission_sleep(seconds):
+    await asyncio.sleep(seconds)
+    return seconds
+
+
+async def admission_other():
+    return 'other'
+
+
+def admission_block(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+register(admission_sleep, concurrency=1)
+register(admission_other)
+register(admission_block, executor='thread', queue_timeout=0.1)
+
+
+def request(method, *params, **members):
+    return dict(members, jsonrpc='2.0', method='test.svc.' + method, params=list(params))
+
+
+async def post(client, body):
+    response = await client.post('/', json=body)
+    return response.status, await response.json()
+
+
+def busy(response):
+    return response['error']['code'] == FAULT_CODES['server_busy']
+
+
+def test_method_concurrency(serve):
+    async def test(client):
+        running = asyncio.ensure_future(post(client, request('admission_sleep', 0.3, id=1)))
+        await asyncio.sleep(0.1)
+        refused = await post(client, request('admission_sleep', 0, id=2))
+        # other methods aren't limited
+        other = await post(client, request('admission_other', id=3))
+        done = await running
+        # the slot is given back
+        after = await post(client, request('admission_sleep', 0, id=4))
+        return refused, other, done, after
+
+    refused, other, done, after = serve(test)
+    status, response = refused
+    assert status == 503
+    assert busy(response) and response['id'] == 2
+    assert other == (200, {'jsonrpc': '2.0', 'id': 3, 'result': 'other'})
+    assert done == (200, {'jsonrpc': '2.0', 'id': 1, 'result': 0.3})
+    assert after[1]['result'] == 0
+    assert admission.in_flight == 0
+
+
+def test_max_in_flight(serve, monkeypatch):
+    monkeypatch.setitem(CONFIG, 'max_in_flight', 1)
+
+    async def test(client):
+        running = asyncio.ensure_future(post(client, request('admission_sleep', 0.3, id=1)))
+        await asyncio.sleep(0.1)
+        refused = await post(client, request('admission_other', id=2))
+        await running
+        return refused, await post(client, request('admission_other', id=3))
+
+    (status, refused), after = serve(test)
+    assert status == 503 and busy(refused)
+    assert after == (200, {'jsonrpc': '2.0', 'id': 3, 'result': 'other'})
+
+
+def test_batch_keeps_200(serve):
+    async def test(client):
+        return await post(client, [request('admission_sleep', 0.2, id=1),
+                                   request('admission_sleep', 0, id=2)])
+
+    status, (admitted, refused) = serve(test)
+    assert status == 200
+    assert admitted['result'] == 0.2
+    assert busy(refused) and refused['id'] == 2
+
+
+@pytest.fixture
+def one_thread():
+    pool.configure(1, None)
+    yield
+    pool.configure(None, None)
+
+
+def test_queue_timeout(serve, one_thread):
+    async def test(client):
+        running = asyncio.ensure_future(post(client, request('admission_block', 0.3, id=1)))
+        await asyncio.sleep(0.05)
+        # waits for the only thread longer than its queue_timeout
+        dropped = await post(client, request('admission_block', 0, id=2))
+        return await running, dropped
+
+    (_, done), (_, dropped) = serve(test)
+    assert done['result'] == 0.3
+    assert busy(dropped)
@@ -0,0 +1,102 @@
+"""
+Batches: their entries run concurrently, up to batch_concurrency at
+once, or one by one in sequential batch_mode, and are answered in the
+request order.
+"""
+import asyncio
+import time
+
+import pytest
+
+from asynciorpc.config import CONFIG
+from asynciorpc.exceptions import FAULT_CODES
+from asynciorpc.interface.register import register
+
+running = {'now': 0, 'max': 0}
+order = []
+
+
+async def batch_sleep(name, seconds):
+    running['now'] += 1
+    running['max'] = max(running['max'], running['now'])
+    order.append(name)
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        running['now'] -= 1
+    return name
+
+
+def batch_thread(name):
+    return name
+
+
+register(batch_sleep)
+register(batch_thread, executor='thread')
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    running['max'] = 0
+    del order[:]
+
+
+def request(method, *params, **members):
+    return dict(members, jsonrpc='2.0', method='test.svc.' + method, params=list(params))
+
+
+def post(serve, body):
+    async def test(client):
+        started = time.monotonic()
+        response = await (await client.post('/', json=body)).json()
+        return response, time.monotonic() - started
+
+    return serve(test)
+
+
+def test_entries_run_concurrently(serve):
+    # the slowest first, answered in the request order all the same
+    body = [request('batch_sleep', str(i), 0.2 - i * 0.05, id=i) for i in range(4)]
+    response, elapsed = post(serve, body)
+    assert [entry['result'] for entry in response] == ['0', '1', '2', '3']
+    assert [entry['id'] for entry in response] == [0, 1, 2, 3]
+    assert running['max'] == 4
+    assert elapsed < 0.4
+
+
+def test_batch_concurrency(serve, monkeypatch):
+    monkeypatch.setitem(CONFIG, 'batch_concurrency', 2)
+    body = [request('batch_sleep', str(i), 0.05, id=i) for i in range(6)]
+    response, _ = post(serve, body)
+    assert len(response) == 6
+    assert running['max'] == 2
+
+
+def test_sequential(serve, monkeypatch):
+    monkeypatch.setitem(CONFIG, 'batch_mode', 'sequential')
+    body = [request('batch_sleep', str(i), 0.1 - i * 0.03, id=i) for i in range(3)]
+    response, elapsed = post(serve, body)
+    assert order == ['0', '1', '2']
+    assert running['max'] == 1
+    assert [entry['result'] for entry in response] == ['0', '1', '2']
+    assert elapsed >= 0.1 + 0.07 + 0.04
+
+
+def test_mixed_executors_and_notifications(serve):
+    body = [request('batch_thread', 'a', id=1),
+            request('batch_sleep', 'note', 0),
+            request('batch_sleep', 'b', 0, id=2),
+            request('missing', id=3)]
+    response, _ = post(serve, body)
+    assert [entry['id'] for entry in response] == [1, 2, 3]
+    assert [entry.get('result') for entry in response] == ['a', 'b', None]
+    assert response[2]['error']['code'] == FAULT_CODES['method_not_found']
+    # the notification ran too
+    assert 'note' in order
+
+
+def test_a_failing_entry_does_not_stop_the_others(serve):
+    body = [request('batch_sleep', 'a', 'not a number', id=1), request('batch_sleep', 'b', 0, id=2)]
+    response, _ = post(serve, body)
+    assert response[0]['error']['code'] == FAULT_CODES['internal_error']
+    assert response[1]['result'] == 'b'
@@ -0,0 +1,125 @@
+"""
+ArgumentBinder: binding the arguments of a call and checking them
+against the type hints of the handler.
+"""
+from typing import Dict, List, Optional, Tuple, Union
+
+import pytest
+
+from asynciorpc.rpc.utils import ArgumentBinder
+
+
+def bind(func, *positional, **named):
+    return ArgumentBinder(func).bind(positional, named, validate=True)
+
+
+def valid(func, value):
+    try:
+        bind(func, value)
+    except TypeError:
+        return False
+    return True
+
+
+def takes_float(value: float):
+    pass
+
+
+def takes_int(value: int):
+    pass
+
+
+def takes_optional(value: Optional[str]):
+    pass
+
+
+def takes_union(value: Union[int, str]):
+    pass
+
+
+def takes_list(value: List[int]):
+    pass
+
+
+def takes_dict(value: Dict[str, float]):
+    pass
+
+
+def takes_tuple(value: Tuple[int, ...]):
+    pass
+
+
+def takes_anything(value, other: 'UnknownType' = None):
+    pass
+
+
+@pytest.mark.parametrize('func, value, expected', [
+    # JSON has one number type, an int is a float
+    (takes_float, 1, True),
+    (takes_float, 1.5, True),
+    (takes_float, True, False),
+    (takes_float, '1', False),
+    (takes_int, 1, True),
+    (takes_int, 1.5, False),
+    (takes_optional, None, True),
+    (takes_optional, 'a', True),
+    (takes_optional, 1, False),
+    (takes_union, 1, True),
+    (takes_union, 'a', True),
+    (takes_union, 1.5, False),
+    (takes_list, [], True),
+    (takes_list, [1, 2], True),
+    (takes_list, [1, 'a'], False),
+    (takes_list, {'a': 1}, False),
+    (takes_dict, {}, True),
+    (takes_dict, {'a': 1, 'b': 2.5}, True),
+    (takes_dict, {'a': 'x'}, False),
+    (takes_dict, {'a': True}, False),
+    (takes_dict, [1], False),
+    (takes_tuple, (1, 2), True),
+    (takes_tuple, [1, 2], False),
+    (takes_anything, object(), True),
+])
+def test_type_hints(func, value, expected):
+    assert valid(func, value) is expected
+
+
+def test_hints_are_checked_for_named_arguments():
+    assert bind(takes_float, value=2) == ({'value': 2}, [])
+    with pytest.raises(TypeError, match="'value' doesn't match"):
+        bind(takes_float, value='2')
+
+
+def test_unresolvable_hint_accepts_anything():
+    assert bind(takes_anything, 1, other='x') == ({'value': 1, 'other': 'x'}, [])
+
+
+def defaults(a, b=2, *, c=3):
+    pass
+
+
+def test_defaults_of_the_parameters_left_out():
+    binder = ArgumentBinder(defaults)
+    assert binder.bind((1,)) == ({'a': 1, 'b': 2, 'c': 3}, [])
+    assert binder.bind((1, 5), {'c': 6}) == ({'a': 1, 'b': 5, 'c': 6}, [])
+    assert binder.bind((), {'a': 1, 'b': None}) == ({'a': 1, 'b': None, 'c': 3}, [])
+    assert binder.bind((1,), defaults=False) == ({'a': 1}, [])
+
+
+def varargs(a, *rest, **options):
+    pass
+
+
+def test_varargs():
+    assert ArgumentBinder(varargs).bind((1, 2, 3), {'x': 4}) == ({'a': 1, 'x': 4}, [2, 3])
+
+
+@pytest.mark.parametrize('positional, named, message', [
+    ((), {}, 'Not all arguments supplied'),
+    ((1, 2, 3), {}, 'Too many positional arguments'),
+    ((1,), {'a': 1}, 'used more than once'),
+    ((1,), {'d': 1}, "'d' not valid"),
+])
+def test_arguments_not_fitting(positional, named, message):
+    with pytest.raises(TypeError, match=message):
+        ArgumentBinder(defaults).bind(positional, named)
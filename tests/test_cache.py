@@ -0,0 +1,196 @@
+"""
+Response cache: eviction, expiry, calls in flight shared by their
+callers, and invalidation, on the cache itself and through the server.
+"""
+import asyncio
+
+import pytest
+
+from asynciorpc import cache
+from asynciorpc.cache import CachePolicy, ResponseCache, invalidate
+from asynciorpc.interface.register import register
+
+
+def not_fault(response):
+    return False
+
+
+def make(**policy):
+    return ResponseCache('test', CachePolicy(**policy), None)
+
+
+def keys(response_cache):
+    # without a lookup, which counts as a use
+    return sorted(response_cache._store.entries)
+
+
+def test_lru_evicts_the_least_recently_used():
+    lru = make(maxsize=3)
+    for key in (1, 2, 3):
+        lru.put(key, key)
+    lru.get(1)
+    lru.put(4, 4)
+    assert keys(lru) == [1, 3, 4]
+    assert lru.evictions == 1
+
+
+def test_lfu_evicts_the_least_frequently_used():
+    lfu = make(maxsize=3, eviction='lfu')
+    for key in (1, 2, 3):
+        lfu.put(key, key)
+    for key in (1, 1, 3):
+        lfu.get(key)
+    lfu.put(4, 4)
+    assert keys(lfu) == [1, 3, 4]
+    # 4 has the lowest count, then the oldest of the rest goes
+    lfu.put(5, 5)
+    assert keys(lfu) == [1, 3, 5]
+
+
+def test_unknown_eviction():
+    with pytest.raises(ValueError):
+        CachePolicy(eviction='fifo')
+
+
+def test_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    expiring = make(ttl=10)
+    expiring.put('a', 1)
+    now[0] += 9
+    assert expiring.get('a') == (True, 1)
+    now[0] += 2
+    assert expiring.get('a') == (False, None)
+    assert len(expiring) == 0
+
+
+def test_no_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    forever = make()
+    forever.put('a', 1)
+    now[0] += 10 ** 6
+    assert forever.get('a') == (True, 1)
+
+
+def test_unhashable_key():
+    assert make().key({'a': [1, {2}]}, ()) is None
+
+
+class Handler(object):
+    """
+    Counts its calls, each waits for `release`
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return 'response %d' % self.calls
+
+
+def test_single_flight():
+    async def test():
+        shared = make()
+        handler = Handler()
+        callers = [asyncio.ensure_future(shared.call('k', handler, not_fault)) for _ in range(5)]
+        await asyncio.sleep(0)
+        handler.release.set()
+        responses = await asyncio.gather(*callers)
+        # and the next caller gets it from the cache
+        return handler.calls, responses, await shared.call('k', handler, not_fault), shared.hits
+
+    calls, responses, cached, hits = asyncio.run(test())
+    assert calls == 1
+    assert responses == ['response 1'] * 5
+    assert (cached, hits) == ('response 1', 1)
+
+
+def test_a_caller_giving_up_does_not_cancel_the_others():
+    async def test():
+        shared = make()
+        handler = Handler()
+        first = asyncio.ensure_future(shared.call('k', handler, not_fault))
+        second = asyncio.ensure_future(shared.call('k', handler, not_fault))
+        await asyncio.sleep(0)
+        first.cancel()
+        handler.release.set()
+        return await second
+
+    assert asyncio.run(test()) == 'response 1'
+
+
+def test_faults_are_not_cached():
+    async def test():
+        shared = make()
+        handler = Handler()
+        handler.release.set()
+        await shared.call('k', handler, lambda response: True)
+        return len(shared), await shared.call('k', handler, lambda response: True)
+
+    assert asyncio.run(test()) == (0, 'response 2')
+
+
+@pytest.mark.parametrize('key', ['k', None])
+def test_invalidate_during_flight(key):
+    async def test():
+        shared = make()
+        handler = Handler()
+        stale = asyncio.ensure_future(shared.call('k', handler, not_fault))
+        await asyncio.sleep(0)
+        shared.invalidate(key)
+        # started after the invalidation, not shared with the stale call
+        fresh = asyncio.ensure_future(shared.call('k', handler, not_fault))
+        await asyncio.sleep(0)
+        handler.release.set()
+        return await stale, await fresh, shared.get('k'), handler.calls
+
+    stale, fresh, entry, calls = asyncio.run(test())
+    assert (stale, fresh, calls) == ('response 2', 'response 2', 2)
+    # only the call started after the invalidation is stored
+    assert entry == (True, 'response 2')
+
+
+def test_invalidate_during_flight_stores_nothing():
+    async def test():
+        shared = make()
+        handler = Handler()
+        stale = asyncio.ensure_future(shared.call('k', handler, not_fault))
+        await asyncio.sleep(0)
+        shared.invalidate('k')
+        handler.release.set()
+        await stale
+        return shared.get('k')
+
+    assert asyncio.run(test()) == (False, None)
+
+
+counter = {'calls': 0}
+
+
+async def cached_user(user_id, verbose=False):
+    counter['calls'] += 1
+    return {'id': user_id, 'calls': counter['calls']}
+
+
+register(cached_user, cache=CachePolicy(maxsize=10))
+
+
+def test_through_the_server(serve):
+    def call(user_id, **params):
+        return {'jsonrpc': '2.0', 'method': 'test.svc.cached_user', 'id': 1,
+                'params': dict(params, user_id=user_id)}
+
+    async def test(client):
+        results = []
+        for body in (call(1), call(1, verbose=False), call(2)):
+            results.append((await (await client.post('/', json=body)).json())['result']['calls'])
+        invalidate('cached_user', 1)
+        results.append((await (await client.post('/', json=call(1))).json())['result']['calls'])
+        return results
+
+    # the default argument spelled out shares the entry
+    assert serve(test) == [1, 1, 2, 3]
@@ -0,0 +1,77 @@
+"""
+Cancellation tokens: a sync handler outliving its timeout sees its
+token cancelled in the pool thread and stops at its next check.
+"""
+import threading
+import time
+
+from asynciorpc import cancellation
+from asynciorpc.exceptions import FAULT_CODES
+from asynciorpc.interface.register import register
+
+stopped = threading.Event()
+
+
+def cancellation_loop():
+    try:
+        for _ in range(500):
+            cancellation.check()
+            time.sleep(0.01)
+    except Exception:
+        stopped.set()
+        raise
+    return 'finished'
+
+
+def cancellation_state():
+    return cancellation.cancelled(), cancellation.remaining()
+
+
+register(cancellation_loop, executor='thread', timeout=0.1)
+register(cancellation_state, executor='thread', timeout=10)
+
+
+def call(serve, method):
+    body = {'jsonrpc': '2.0', 'method': 'test.svc.' + method, 'params': [], 'id': 1}
+
+    async def test(client):
+        return await (await client.post('/', json=body)).json()
+
+    return serve(test)
+
+
+def test_timed_out_thread_handler_stops(serve):
+    stopped.clear()
+    started = time.monotonic()
+    response = call(serve, 'cancellation_loop')
+    assert response['error']['code'] == FAULT_CODES['service_timeout']
+    # the thread quits at its next check, not after the 5s of the loop
+    assert stopped.wait(1)
+    assert time.monotonic() - started < 2
+
+
+def test_token_in_the_pool_thread(serve):
+    cancelled, remaining = call(serve, 'cancellation_state')['result']
+    assert cancelled is False
+    assert 9 < remaining <= 10
+
+
+def test_token_outside_of_a_call():
+    assert cancellation.cancelled() is False
+    assert cancellation.remaining() is None
+    cancellation.check()
+
+
+def test_token():
+    token = cancellation.CancelToken(time.monotonic() + 10)
+    assert not token.cancelled
+    token.cancel()
+    assert token.cancelled
+    expired = cancellation.CancelToken(time.monotonic() - 1)
+    assert expired.cancelled and expired.remaining() == 0.0
+    reset = cancellation.set_token(expired)
+    try:
+        assert cancellation.cancelled()
+    finally:
+        cancellation.reset_token(reset)
+    assert not cancellation.cancelled()
@@ -0,0 +1,96 @@
+"""
+The Client against the application: results, faults, and a timeout
+raised as ServiceTimeout however it runs out.
+"""
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from asynciorpc import cancellation
+from asynciorpc.client import Client
+from asynciorpc.exceptions import InvalidParams, MethodNotFound, ServiceTimeout
+from asynciorpc.interface.register import register
+
+
+async def client_add(a, b):
+    return a + b
+
+
+async def client_sleep(seconds):
+    await asyncio.sleep(seconds)
+    return seconds
+
+
+register(client_add)
+register(client_sleep, timeout=0.05)
+
+
+def call(serve, method, params, **call_args):
+    async def test(client):
+        async with Client(str(client.make_url('/'))) as rpc:
+            return await rpc.call('test.svc.' + method, params, **call_args)
+
+    return serve(test)
+
+
+def test_result(serve):
+    assert call(serve, 'client_add', [1, 2]) == 3
+    assert call(serve, 'client_add', {'a': 'x', 'b': 'y'}) == 'xy'
+
+
+def test_attribute_call(serve):
+    async def test(client):
+        async with Client(str(client.make_url('/'))) as rpc:
+            return await rpc.test.svc.client_add(2, 3)
+
+    assert serve(test) == 5
+
+
+def test_faults(serve):
+    with pytest.raises(MethodNotFound):
+        call(serve, 'missing', [])
+    with pytest.raises(InvalidParams):
+        call(serve, 'client_add', [1])
+
+
+def test_server_timeout(serve):
+    # the server gives up on the call at its registered timeout
+    with pytest.raises(ServiceTimeout):
+        call(serve, 'client_sleep', [1])
+
+
+def test_deadline_spent_before_sending(serve):
+    async def test(client):
+        reset = cancellation.set_token(cancellation.CancelToken(time.monotonic() - 1))
+        try:
+            async with Client(str(client.make_url('/'))) as rpc:
+                return await rpc.call('test.svc.client_add', [1, 2])
+        finally:
+            cancellation.reset_token(reset)
+
+    with pytest.raises(ServiceTimeout, match='before the call was sent'):
+        serve(test)
+
+
+def test_deadline_spent_during_the_call():
+    # a server which never answers in time, the client gives up itself
+    async def slow(request):
+        await asyncio.sleep(5)
+        return web.Response()
+
+    async def test():
+        app = web.Application()
+        app.router.add_route('POST', '/', slow)
+        async with TestServer(app) as server:
+            async with Client(str(server.make_url('/')), timeout=0.05) as rpc:
+                started = time.monotonic()
+                try:
+                    await rpc.call('test.svc.client_add', [1, 2])
+                finally:
+                    assert time.monotonic() - started < 1
+
+    with pytest.raises(ServiceTimeout, match='after'):
+        asyncio.run(test())
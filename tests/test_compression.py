@@ -0,0 +1,93 @@
+"""
+Request bodies are inflated in bounded steps, a compressed bomb is
+refused once it passes max_length instead of being inflated whole.
+Streamed responses are compressed once they are large enough.
+"""
+import gzip
+import json
+
+import pytest
+
+from asynciorpc import compression
+from asynciorpc.config import CONFIG
+from asynciorpc.exceptions import BodyTooLarge, ContentEncodingError
+from asynciorpc.interface.register import register
+
+BODY = b'{"jsonrpc":"2.0","method":"echo","params":[%s],"id":1}' % b','.join(
+    b'%d' % i for i in range(20000))
+
+ENCODINGS = [name for name in ('zstd', 'br', 'gzip', 'deflate')
+             if compression.get_encoding(name) is not None]
+
+
+def decoder(name):
+    try:
+        return compression.decoder(name)
+    except ContentEncodingError:
+        pytest.skip('%s request bodies are not supported here' % name)
+
+
+def inflate(name, data, limit, chunk=4096):
+    """
+    Decompress `data` as read_body does
+    """
+    decompressor = decoder(name)
+    output = []
+    size = 0
+    for start in range(0, len(data), chunk):
+        output.append(decompressor.decompress(data[start:start + chunk], limit - size + 1))
+        size += len(output[-1])
+    decompressor.finish()
+    return b''.join(output)
+
+
+@pytest.mark.parametrize('name', ENCODINGS)
+def test_round_trip(name):
+    data = compression.get_encoding(name).compress(BODY, 3)
+    assert inflate(name, data, len(BODY)) == BODY
+    assert inflate(name, data, len(BODY), chunk=7) == BODY
+
+
+@pytest.mark.parametrize('name', ENCODINGS)
+def test_bomb_stops_at_the_limit(name):
+    data = compression.get_encoding(name).compress(b'\0' * (64 << 20), 3)
+    decompressor = decoder(name)
+    with pytest.raises(BodyTooLarge):
+        decompressor.decompress(data, 1 << 20)
+
+
+@pytest.mark.parametrize('name', ENCODINGS)
+def test_truncated_body(name):
+    data = compression.get_encoding(name).compress(BODY, 3)
+    with pytest.raises(ContentEncodingError):
+        inflate(name, data[:-8], len(BODY))
+
+
+def rows(count: int):
+    for index in range(count):
+        yield {'index': index, 'padding': 'x' * 100}
+
+
+register(rows)
+
+
+@pytest.mark.parametrize('min_size', [0, 64])
+@pytest.mark.parametrize('batch', [False, True])
+def test_stream_compressed_from_the_first_write(serve, monkeypatch, min_size, batch):
+    # the first write alone reaches compression_min_size
+    monkeypatch.setitem(CONFIG, 'compression', ['gzip'])
+    monkeypatch.setitem(CONFIG, 'compression_min_size', min_size)
+    monkeypatch.setitem(CONFIG, 'stream_responses', True)
+    monkeypatch.setattr(compression, '_negotiated', {})
+    call = {'jsonrpc': '2.0', 'method': 'test.svc.rows', 'params': [50], 'id': 1}
+    body = [call, dict(call, id=2)] if batch else call
+
+    async def test(client):
+        response = await client.post('/', json=body, headers={'Accept-Encoding': 'gzip'})
+        return response.status, response.headers.get('Content-Encoding'), await response.read()
+
+    status, encoding, data = serve(test, auto_decompress=False)
+    assert (status, encoding) == (200, 'gzip')
+    response = json.loads(gzip.decompress(data))
+    results = [entry['result'] for entry in response] if batch else [response['result']]
+    assert all(len(result) == 50 for result in results)
@@ -0,0 +1,98 @@
+"""
+Client deadlines: the X-Request-Timeout header and the timeout member
+of a request object cut the registered timeout, a call already past
+its deadline isn't run.
+"""
+import asyncio
+
+import pytest
+
+from asynciorpc import cancellation
+from asynciorpc.exceptions import FAULT_CODES
+from asynciorpc.interface.register import register
+
+started = []
+
+
+async def deadline_remaining():
+    started.append(True)
+    return cancellation.remaining()
+
+
+async def deadline_sleep(seconds):
+    await asyncio.sleep(seconds)
+    return seconds
+
+
+register(deadline_remaining)
+register(deadline_sleep, timeout=10)
+
+
+def request(method, *params, **members):
+    members.setdefault('id', 1)
+    return dict(members, jsonrpc='2.0', method='test.svc.' + method, params=list(params))
+
+
+def post(serve, body, budget=None):
+    headers = {} if budget is None else {cancellation.DEADLINE_HEADER: budget}
+
+    async def test(client):
+        return await (await client.post('/', json=body, headers=headers)).json()
+
+    return serve(test)
+
+
+def remaining(serve, budget=None, **members):
+    response = post(serve, request('deadline_remaining', **members), budget)
+    return response['result']
+
+
+def timed_out(response):
+    return response['error']['code'] == FAULT_CODES['service_timeout']
+
+
+def test_no_deadline(serve):
+    assert remaining(serve) is None
+
+
+def test_header(serve):
+    assert 1 < remaining(serve, '2') <= 2
+    assert 1 < remaining(serve, '2.5') <= 2.5
+
+
+def test_member(serve):
+    assert 1 < remaining(serve, timeout=2) <= 2
+
+
+def test_smaller_of_header_and_member(serve):
+    assert remaining(serve, '0.5', timeout=5) <= 0.5
+    assert remaining(serve, '5', timeout=0.5) <= 0.5
+
+
+@pytest.mark.parametrize('budget', ['x', '', 'nan'])
+def test_unreadable_header_is_ignored(serve, budget):
+    assert remaining(serve, budget) is None
+
+
+@pytest.mark.parametrize('budget', ['x', True, [1], None])
+def test_unreadable_member_is_ignored(serve, budget):
+    assert remaining(serve, timeout=budget) is None
+
+
+@pytest.mark.parametrize('budget, members', [('0', {}), ('-1', {}), (None, {'timeout': 0})])
+def test_past_deadline_is_not_run(serve, budget, members):
+    del started[:]
+    assert timed_out(post(serve, request('deadline_remaining', **members), budget))
+    assert not started
+
+
+def test_budget_cuts_the_registered_timeout(serve):
+    assert timed_out(post(serve, request('deadline_sleep', 1, timeout=0.1)))
+    assert post(serve, request('deadline_sleep', 0.1, timeout=1))['result'] == 0.1
+
+
+def test_header_applies_to_every_call_of_a_batch(serve):
+    body = [request('deadline_sleep', 1, id=1), request('deadline_remaining', id=2)]
+    responses = {response['id']: response for response in post(serve, body, '0.2')}
+    assert timed_out(responses[1])
+    assert responses[2]['result'] <= 0.2
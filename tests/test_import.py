@@ -0,0 +1,141 @@
+"""
+The package imports without a config file: CONFIG is read on first
+use and the pools are created on their first call.
+"""
+import os
+import pkgutil
+import subprocess
+import sys
+
+import pytest
+
+import asynciorpc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORTS = '''
+import asynciorpc.rpc, asynciorpc.handler, asynciorpc.application, asynciorpc.runner
+from asynciorpc import pool
+from asynciorpc.config import CONFIG
+assert not CONFIG.loaded, 'CONFIG was read on import'
+assert pool.tpool is None and pool.ppool is None, 'a pool was created on import'
+'''
+
+
+def run(tmp_path, code):
+    """
+    Run `code` in a fresh interpreter, in a directory without config.yaml
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop('ASYNCIORPC_CONFIG', None)
+    return subprocess.run([sys.executable, '-c', code], cwd=str(tmp_path), env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+
+
+def test_import_without_config(tmp_path):
+    result = run(tmp_path, IMPORTS)
+    assert result.returncode == 0, result.stdout
+
+
+@pytest.mark.parametrize('module', sorted(
+    name for _, name, _ in pkgutil.walk_packages(asynciorpc.__path__, 'asynciorpc.')))
+def test_every_module_imports_first(tmp_path, module):
+    # no import cycle depends on the order the modules are imported in
+    result = run(tmp_path, 'import %s' % module)
+    assert result.returncode == 0, result.stdout
+
+
+def test_configure_without_config(tmp_path):
+    result = run(tmp_path, IMPORTS + '''
+from asynciorpc.config import configure
+from asynciorpc.application import get_application
+from asynciorpc.interface.register import register
+configure(None, company='test', service='svc')
+register(len)
+get_application()
+print(CONFIG['company'], CONFIG['rpc_port'])
+''')
+    assert result.returncode == 0, result.stdout
+    assert result.stdout.split() == ['test', '10080']
+
+
+def test_missing_config_is_reported_on_use(tmp_path):
+    result = run(tmp_path, IMPORTS + '''
+from asynciorpc.exceptions import InvalidConfig
+try:
+    CONFIG['company']
+except InvalidConfig as e:
+    print(e)
+''')
+    assert result.returncode == 0, result.stdout
+    assert 'company, service not set' in result.stdout
+
+
+def test_config_from_environment(tmp_path):
+    path = tmp_path / 'rpc.yaml'
+    path.write_text('company: env\nservice: svc\n')
+    env = dict(os.environ, PYTHONPATH=ROOT, ASYNCIORPC_CONFIG=str(path))
+    output = subprocess.check_output(
+        [sys.executable, '-c', 'from asynciorpc.config import CONFIG; print(CONFIG["company"])'],
+        cwd=str(tmp_path), env=env, universal_newlines=True)
+    assert output.split() == ['env']
+
+
+def test_yaml_is_imported_on_first_use(tmp_path):
+    (tmp_path / 'config.yaml').write_text('company: lazy\nservice: svc\n')
+    result = run(tmp_path, IMPORTS + '''
+import sys
+assert 'yaml' not in sys.modules, 'yaml was imported before the config is used'
+print(CONFIG['company'], 'yaml' in sys.modules)
+''')
+    assert result.returncode == 0, result.stdout
+    assert result.stdout.split() == ['lazy', 'True']
+
+
+def test_settings_set_before_the_file_is_read(tmp_path):
+    (tmp_path / 'config.yaml').write_text('company: lazy\nservice: svc\nrpc_port: 9000\n')
+    result = run(tmp_path, IMPORTS + '''
+CONFIG['service'] = 'early'
+print(CONFIG['company'], CONFIG['service'], CONFIG['rpc_port'])
+''')
+    assert result.returncode == 0, result.stdout
+    assert result.stdout.split() == ['lazy', 'early', '9000']
+
+
+def test_module_settings_are_read_on_first_use(tmp_path):
+    (tmp_path / 'config.yaml').write_text('company: lazy\nservice: svc\nmetrics: false\ntracing: true\n')
+    result = run(tmp_path, IMPORTS + '''
+from asynciorpc import metrics, tracing
+assert 'enabled' not in vars(metrics) and 'enabled' not in vars(tracing)
+assert not CONFIG.loaded
+print(metrics.enabled, tracing.enabled, 'enabled' in vars(metrics))
+''')
+    assert result.returncode == 0, result.stdout
+    assert result.stdout.split() == ['False', 'True', 'True']
+
+
+def test_served_with_the_config_of_the_directory(tmp_path):
+    (tmp_path / 'config.yaml').write_text('company: lazy\nservice: svc\nmetrics: false\n')
+    result = run(tmp_path, IMPORTS + '''
+import asyncio
+from aiohttp.test_utils import TestClient, TestServer
+from asynciorpc.application import get_application
+from asynciorpc.interface.register import register
+
+
+async def add(a, b):
+    return a + b
+
+
+register(add)
+
+
+async def main():
+    async with TestClient(TestServer(get_application())) as client:
+        body = {'jsonrpc': '2.0', 'method': 'lazy.svc.add', 'params': [1, 2], 'id': 1}
+        print((await (await client.post('/', json=body)).json())['result'])
+
+asyncio.run(main())
+''')
+    assert result.returncode == 0, result.stdout
+    assert result.stdout.split() == ['3']
@@ -0,0 +1,99 @@
+"""
+Inline handlers: sync handlers called right on the event loop, set
+with executor='inline' or moved there by auto_inline once cheap.
+"""
+import threading
+import time
+
+import pytest
+
+from asynciorpc.config import CONFIG
+from asynciorpc.exceptions import LoopBlockedWarning
+from asynciorpc.interface.register import register
+from asynciorpc.routes import ROUTES
+
+
+def inline_thread():
+    return threading.current_thread() is threading.main_thread()
+
+
+def inline_blocking():
+    time.sleep(0.05)
+    return True
+
+
+register(inline_thread, executor='inline')
+register(inline_blocking, executor='inline')
+
+
+def calls(serve, method, count=1, *params):
+    body = {'jsonrpc': '2.0', 'method': 'test.svc.' + method, 'params': list(params), 'id': 1}
+
+    async def test(client):
+        return [(await (await client.post('/', json=body)).json())['result'] for _ in range(count)]
+
+    return serve(test)
+
+
+def test_runs_on_the_loop(serve):
+    # the test client runs the loop in the main thread
+    assert calls(serve, 'inline_thread') == [True]
+
+
+def test_blocking_the_loop_warns(serve):
+    with pytest.warns(LoopBlockedWarning, match='inline_blocking'):
+        assert calls(serve, 'inline_blocking') == [True]
+
+
+@pytest.fixture
+def auto_inline(monkeypatch):
+    monkeypatch.setitem(CONFIG, 'auto_inline', True)
+    monkeypatch.setitem(CONFIG, 'auto_inline_samples', 10)
+    monkeypatch.setitem(CONFIG, 'auto_inline_threshold', 0.001)
+
+
+def test_cheap_handler_moves_inline(serve, auto_inline):
+    def inline_cheap():
+        return threading.current_thread() is threading.main_thread()
+
+    register(inline_cheap)
+    profile = ROUTES['test.svc.inline_cheap'].profile
+    assert calls(serve, 'inline_cheap', 10) == [False] * 10
+    assert profile.inline
+    assert calls(serve, 'inline_cheap', 2) == [True] * 2
+
+
+def test_slow_handler_stays_in_the_pool(serve, auto_inline):
+    def inline_slow():
+        time.sleep(0.005)
+        return threading.current_thread() is threading.main_thread()
+
+    register(inline_slow)
+    assert calls(serve, 'inline_slow', 12) == [False] * 12
+    assert not ROUTES['test.svc.inline_slow'].profile.inline
+
+
+def test_handler_getting_slow_goes_back(serve, auto_inline):
+    delay = [0]
+
+    def inline_varying():
+        if delay[0]:
+            time.sleep(delay[0])
+        return threading.current_thread() is threading.main_thread()
+
+    register(inline_varying)
+    calls(serve, 'inline_varying', 10)
+    assert ROUTES['test.svc.inline_varying'].profile.inline
+    # slower than auto_inline_threshold, not than inline_warn_threshold
+    delay[0] = 0.005
+    assert calls(serve, 'inline_varying', 2) == [True, False]
+
+
+@pytest.mark.parametrize('options', [{'executor': 'thread'}, {'executor': 'inline'}, {'concurrency': 2}])
+def test_explicit_executor_is_not_profiled(auto_inline, options):
+    def inline_explicit():
+        pass
+
+    register(inline_explicit, **options)
+    profiled = ROUTES['test.svc.inline_explicit'].profile is not None
+    assert profiled is (options.get('executor') is None)
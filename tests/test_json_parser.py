@@ -0,0 +1,177 @@
+"""
+The JSON-RPC parser as clients see it: ids, notifications and the
+1.0 / 2.0 envelopes, with every codec.
+"""
+import asyncio
+import json
+import sys
+
+import pytest
+
+from asynciorpc.interface.register import register
+from asynciorpc.rpc import codec
+from asynciorpc.rpc.base import RequestContext
+from asynciorpc.rpc.json import JSONRPCParser, JSONRPCLibraryWrapper
+
+
+async def add(a, b):
+    return a + b
+
+
+async def echo(value=None):
+    return value
+
+
+def multiply(a, b):
+    return a * b
+
+
+register(add)
+register(echo)
+register(multiply, executor='inline')
+
+
+def _installed(name):
+    try:
+        codec.CODECS[name]()
+    except ImportError:
+        return False
+    return True
+
+
+CODECS = [pytest.param(name, marks=pytest.mark.skipif(not _installed(name), reason='%s not installed' % name))
+          for name in ('stdlib', 'orjson', 'ujson')]
+
+
+@pytest.fixture(params=CODECS)
+def parser(request):
+    return JSONRPCParser(JSONRPCLibraryWrapper, codec.CODECS[request.param]())
+
+
+def call(parser, body):
+    """
+    The response of a request body, decoded, None for no response
+    """
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+    context = RequestContext()
+    responses = asyncio.run(parser.run(context, body))
+    response = parser.parse_responses(context, responses)
+    assert isinstance(response, bytes)
+    return json.loads(response) if response else None
+
+
+def request(method, params=None, **members):
+    members.setdefault('jsonrpc', '2.0')
+    members['method'] = 'test.svc.' + method
+    if params is not None:
+        members['params'] = params
+    return members
+
+
+def test_result(parser):
+    assert call(parser, request('add', [1, 2], id=1)) == {'jsonrpc': '2.0', 'id': 1, 'result': 3}
+
+
+def test_named_params(parser):
+    assert call(parser, request('add', {'a': 'x', 'b': 'y'}, id=1))['result'] == 'xy'
+
+
+def test_default_params(parser):
+    assert call(parser, request('echo', id=1))['result'] is None
+
+
+def test_inline_handler(parser):
+    assert call(parser, request('multiply', [6, 7], id=1))['result'] == 42
+
+
+@pytest.mark.parametrize('rpcid', [0, 7, 'a-string', 1.5])
+def test_id_is_echoed(parser, rpcid):
+    assert call(parser, request('echo', ['x'], id=rpcid))['id'] == rpcid
+
+
+def test_notification_has_no_response(parser):
+    assert call(parser, request('echo', ['x'])) is None
+
+
+def test_null_id_is_a_notification(parser):
+    assert call(parser, request('echo', ['x'], id=None)) is None
+
+
+def test_batch(parser):
+    response = call(parser, [request('add', [1, 2], id='a'),
+                             request('echo', ['note']),
+                             request('echo', ['b'], id='b')])
+    assert response == [{'jsonrpc': '2.0', 'id': 'a', 'result': 3},
+                        {'jsonrpc': '2.0', 'id': 'b', 'result': 'b'}]
+
+
+def test_batch_of_notifications(parser):
+    assert call(parser, [request('echo', ['x']), request('echo', ['y'])]) == []
+
+
+def test_version_1(parser):
+    body = {'method': 'test.svc.add', 'params': [1, 2], 'id': 3}
+    assert call(parser, body) == {'result': 3, 'error': None, 'id': 3}
+
+
+def test_version_1_fault(parser):
+    body = {'method': 'test.svc.missing', 'params': [], 'id': 3}
+    response = call(parser, body)
+    assert response['result'] is None
+    assert response['error']['code'] == -32601
+    assert response['id'] == 3
+
+
+def test_mixed_versions_in_a_batch(parser):
+    # a batch is told by its first entry, which must be 2.0
+    response = call(parser, [request('echo', [1], id=1),
+                             {'method': 'test.svc.echo', 'params': [2], 'id': 2}])
+    assert response == [{'jsonrpc': '2.0', 'id': 1, 'result': 1},
+                        {'result': 2, 'error': None, 'id': 2}]
+
+
+def test_method_not_found(parser):
+    response = call(parser, request('missing', [], id=1))
+    assert response['error']['code'] == -32601
+    assert response['id'] == 1
+    assert 'result' not in response
+
+
+def test_invalid_params(parser):
+    assert call(parser, request('add', [1], id=1))['error']['code'] == -32602
+
+
+def test_parse_error(parser):
+    response = call(parser, b'{"jsonrpc": "2.0", "method"')
+    assert response['error']['code'] == -32700
+    assert response['id'] is None
+
+
+def test_unencodable_result_answers_its_id(parser):
+    register(lambda: object(), 'unencodable', executor='inline')
+    response = call(parser, [request('unencodable', [], id=1), request('echo', [2], id=2)])
+    # for the whole batch
+    assert response == {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32700, 'message': 'Parse Error'}}
+
+
+@pytest.fixture
+def no_fast_codecs(monkeypatch):
+    # None in sys.modules makes the import raise ImportError
+    monkeypatch.setitem(sys.modules, 'orjson', None)
+    monkeypatch.setitem(sys.modules, 'ujson', None)
+    monkeypatch.setattr(codec, '_codecs', {})
+
+
+def test_auto_falls_back_to_stdlib(no_fast_codecs):
+    assert codec.get_codec('auto').name == 'stdlib'
+
+
+def test_missing_codec_falls_back_to_stdlib(no_fast_codecs):
+    with pytest.warns(UserWarning, match='orjson'):
+        assert codec.get_codec('orjson').name == 'stdlib'
+
+
+def test_stdlib_fallback_parses(no_fast_codecs):
+    parser = JSONRPCParser(JSONRPCLibraryWrapper, codec.get_codec('auto'))
+    assert call(parser, request('add', [1, 2], id=1)) == {'jsonrpc': '2.0', 'id': 1, 'result': 3}
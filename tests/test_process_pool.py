@@ -0,0 +1,74 @@
+"""
+Process pool timeouts: the pool is recycled for a call timing out while
+its worker runs it, not for one timing out still queued to a worker.
+"""
+import asyncio
+import time
+
+import pytest
+
+from asynciorpc import pool
+from asynciorpc.exceptions import FAULT_CODES
+from asynciorpc.interface.register import register
+
+
+def pool_sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def pool_sleep_briefly(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+register(pool_sleep, executor='process', timeout=5)
+register(pool_sleep_briefly, executor='process', timeout=0.3)
+
+
+@pytest.fixture
+def one_worker():
+    pool.configure(None, 1)
+    yield
+    pool.configure(None, None)
+
+
+def call(client, method, seconds):
+    body = {'jsonrpc': '2.0', 'method': 'test.svc.' + method, 'params': [seconds], 'id': 1}
+    return client.post('/', json=body)
+
+
+async def answer(response):
+    return await (await response).json()
+
+
+def test_running_call_timing_out_recycles_the_pool(serve, one_worker):
+    async def test(client):
+        # a first call starts the worker
+        await answer(call(client, 'pool_sleep', 0))
+        ppool = pool.ppool
+        started = time.monotonic()
+        response = await answer(call(client, 'pool_sleep_briefly', 5))
+        return response, time.monotonic() - started, pool.ppool is not ppool
+
+    response, elapsed, recycled = serve(test)
+    assert response['error']['code'] == FAULT_CODES['service_timeout']
+    assert elapsed < 2
+    assert recycled
+
+
+def test_queued_call_timing_out_leaves_the_running_one(serve, one_worker):
+    async def test(client):
+        await answer(call(client, 'pool_sleep', 0))
+        ppool = pool.ppool
+        running = asyncio.ensure_future(answer(call(client, 'pool_sleep', 1)))
+        await asyncio.sleep(0.1)
+        # handed to the only worker, busy with the first call, which
+        # shows as running() on its future
+        queued = await answer(call(client, 'pool_sleep_briefly', 0.01))
+        return await running, queued, pool.ppool is ppool
+
+    running, queued, kept = serve(test)
+    assert queued['error']['code'] == FAULT_CODES['service_timeout']
+    assert running['result'] == 1
+    assert kept
@@ -0,0 +1,111 @@
+"""
+The routing index: calls found by their full name, __dir__
+introspection, private and authenticated interfaces.
+"""
+import base64
+
+import pytest
+
+from asynciorpc.exceptions import FAULT_CODES
+from asynciorpc.interface.register import register
+from asynciorpc.routes import ROUTES
+
+
+async def routing_nested():
+    return 'nested'
+
+
+async def _routing_hidden():
+    return 'hidden'
+
+
+async def routing_flagged():
+    return 'flagged'
+
+
+routing_flagged.private = True
+
+
+async def routing_secret():
+    return 'secret'
+
+
+routing_secret._need_authenticated = lambda username, password: (username, password) == ('user', 'pass')
+
+
+async def routing_version():
+    return 1
+
+
+register(routing_nested, 'routing.deep.nested')
+register(_routing_hidden)
+register(routing_flagged)
+register(routing_secret)
+register(routing_version)
+
+
+def call(serve, method, headers=None):
+    body = {'jsonrpc': '2.0', 'method': method, 'params': [], 'id': 1}
+
+    async def test(client):
+        response = await client.post('/', json=body, headers=headers or {})
+        return response.status, await response.json()
+
+    return serve(test)
+
+
+def result(serve, method):
+    return call(serve, method)[1]['result']
+
+
+def not_found(serve, method):
+    return call(serve, method)[1]['error']['code'] == FAULT_CODES['method_not_found']
+
+
+def test_nested_name(serve):
+    assert result(serve, 'test.svc.routing.deep.nested') == 'nested'
+    assert not_found(serve, 'test.svc.routing.deep')
+    assert not_found(serve, 'test.svc.routing.deep.nested.more')
+
+
+def test_dir(serve):
+    assert result(serve, 'test.svc.routing.__dir__') == ['deep']
+    assert result(serve, 'test.svc.routing.deep.__dir__') == ['nested']
+    assert {'routing', 'routing_secret', 'routing_version'} <= set(result(serve, 'test.svc.__dir__'))
+    assert result(serve, '__dir__') == ['test']
+    assert not_found(serve, 'test.nope.__dir__')
+
+
+def test_private(serve):
+    assert not_found(serve, 'test.svc._routing_hidden')
+    assert not_found(serve, 'test.svc.routing_flagged')
+    listed = result(serve, 'test.svc.__dir__')
+    assert '_routing_hidden' not in listed and 'routing_flagged' not in listed
+
+
+def test_authenticated(serve):
+    status, response = call(serve, 'test.svc.routing_secret')
+    assert status == 401
+    assert response['error']['code'] == FAULT_CODES['not_authorized']
+    wrong = {'Authorization': 'Basic ' + base64.b64encode(b'user:wrong').decode()}
+    assert call(serve, 'test.svc.routing_secret', wrong)[0] == 401
+    right = {'Authorization': 'Basic ' + base64.b64encode(b'user:pass').decode()}
+    assert call(serve, 'test.svc.routing_secret', right) == (
+        200, {'jsonrpc': '2.0', 'id': 1, 'result': 'secret'})
+
+
+def test_register_again_replaces_the_route(serve):
+    async def routing_version():
+        return 2
+
+    register(routing_version)
+    assert result(serve, 'test.svc.routing_version') == 2
+
+
+def test_refused_handler_is_not_registered():
+    async def routing_refused():
+        pass
+
+    with pytest.raises(ValueError):
+        register(routing_refused, executor='thread')
+    assert 'test.svc.routing_refused' not in ROUTES
@@ -0,0 +1,98 @@
+"""
+ArraySplitter: the elements of a JSON array are the same however the
+body is cut into chunks, and a malformed array is refused.
+"""
+import json
+
+import pytest
+
+from asynciorpc.rpc.splitter import ArraySplitter, starts_array
+
+
+def split(body, size=None):
+    """
+    The elements of `body` fed in chunks of `size` bytes, all at once
+    when None, decoded
+    """
+    splitter = ArraySplitter()
+    size = size or len(body) or 1
+    elements = []
+    for start in range(0, len(body), size):
+        elements.extend(splitter.feed(body[start:start + size]))
+    assert splitter.done
+    return [json.loads(element) for element in elements]
+
+
+BODIES = [
+    b'[]',
+    b' [ 1 , 2.5 ,true,null ] ',
+    b'[{"a": 1}, {"b": [1, [2, {"c": 3}]]}, [4, 5]]',
+    b'[{"brackets": "[{,}]"}, "a \\"quoted\\" ] string", {"e": "\\\\"}]',
+    b'[{"unicode": "\\u00e9\\u4e2d"}, "back\\\\slash\\\\", {"x":"\\"}"}]',
+    b'[[], {}, [[]], {"k": {}}]',
+]
+
+
+@pytest.mark.parametrize('body', BODIES)
+def test_every_chunk_size(body):
+    # every chunk boundary, inside strings and escapes too
+    expected = json.loads(body)
+    for size in range(1, len(body) + 1):
+        assert split(body, size) == expected
+
+
+def test_elements_as_they_complete():
+    splitter = ArraySplitter()
+    assert splitter.feed(b'[{"a": 1}, {"b"') == [b'{"a": 1}']
+    assert splitter.feed(b': 2}, 3') == [b'{"b": 2}']
+    # a scalar is complete at the comma or the end of the array
+    assert splitter.feed(b']') == [b'3']
+    assert splitter.count == 3
+
+
+def test_escape_at_the_end_of_a_chunk():
+    splitter = ArraySplitter()
+    assert splitter.feed(b'["a\\') == []
+    assert splitter.feed(b'"]", "b"]') == [b'"a\\"]"', b'"b"']
+
+
+@pytest.mark.parametrize('body', [
+    b'[1,]',
+    b'[{"a": 1},]',
+    b'[,1]',
+    b'[1,,2]',
+])
+def test_missing_element(body):
+    for size in (1, len(body)):
+        with pytest.raises(ValueError, match='Missing array element'):
+            split(body, size)
+
+
+@pytest.mark.parametrize('body', [
+    b'[{"a": 1} 123, {"b": 2}]',
+    b'[{"a": 1} "x", {"b": 2}]',
+    b'[{"a": 1} {"b": 2}]',
+    b'[[1] [2]]',
+    b'[{"a": 1} 123]',
+])
+def test_missing_comma(body):
+    for size in (1, 3, len(body)):
+        with pytest.raises(ValueError, match='Missing comma'):
+            split(body, size)
+
+
+@pytest.mark.parametrize('body', [b'{"a": [1, 2]}', b'1', b'"[1]"'])
+def test_not_an_array(body):
+    assert not starts_array(body)
+    with pytest.raises(ValueError, match='Not a JSON array'):
+        ArraySplitter().feed(body)
+
+
+def test_data_after_the_array():
+    with pytest.raises(ValueError, match='Data after the end of the array'):
+        ArraySplitter().feed(b'[1] 2')
+    splitter = ArraySplitter()
+    splitter.feed(b'[1]')
+    assert splitter.feed(b' \n') == []
+    with pytest.raises(ValueError, match='Data after the end of the array'):
+        splitter.feed(b'x')
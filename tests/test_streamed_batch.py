@@ -0,0 +1,83 @@
+"""
+Streamed batch responses: with stream_responses, a batch is answered
+with a chunked response, each entry written as its call completes.
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from asynciorpc.config import CONFIG
+from asynciorpc.interface.register import register
+
+
+async def streamed_sleep(seconds):
+    await asyncio.sleep(seconds)
+    return seconds
+
+
+register(streamed_sleep)
+
+
+@pytest.fixture(autouse=True)
+def stream_responses(monkeypatch):
+    monkeypatch.setitem(CONFIG, 'stream_responses', True)
+
+
+def request(seconds, **members):
+    return dict(members, jsonrpc='2.0', method='test.svc.streamed_sleep', params=[seconds])
+
+
+def test_entries_in_completion_order(serve):
+    async def test(client):
+        response = await client.post('/', json=[request(0.3, id=1), request(0, id=2)])
+        return response.headers, json.loads(await response.read())
+
+    headers, entries = serve(test)
+    assert headers['Transfer-Encoding'] == 'chunked'
+    assert entries == [{'jsonrpc': '2.0', 'id': 2, 'result': 0},
+                       {'jsonrpc': '2.0', 'id': 1, 'result': 0.3}]
+
+
+def test_first_entry_before_the_slowest_call(serve):
+    async def test(client):
+        started = time.monotonic()
+        response = await client.post('/', json=[request(0.5, id=1), request(0, id=2)])
+        first = await response.content.readany()
+        first_after = time.monotonic() - started
+        rest = await response.read()
+        return first, first_after, first + rest
+
+    first, first_after, body = serve(test)
+    assert b'"id":2' in first.replace(b' ', b'') and b'"id":1' not in first.replace(b' ', b'')
+    assert first_after < 0.4
+    assert len(json.loads(body)) == 2
+
+
+def test_sequential_keeps_the_request_order(serve, monkeypatch):
+    monkeypatch.setitem(CONFIG, 'batch_mode', 'sequential')
+
+    async def test(client):
+        return await (await client.post('/', json=[request(0.1, id=1), request(0, id=2)])).json()
+
+    assert [entry['id'] for entry in serve(test)] == [1, 2]
+
+
+def test_notifications_only(serve):
+    async def test(client):
+        response = await client.post('/', json=[request(0), request(0)])
+        return response.status, await response.read()
+
+    assert serve(test) == (200, b'')
+
+
+def test_single_call_is_not_chunked(serve):
+    async def test(client):
+        response = await client.post('/', json=request(0, id=1))
+        return response.headers, await response.json()
+
+    headers, response = serve(test)
+    assert 'Transfer-Encoding' not in headers
+    assert int(headers['Content-Length']) > 0
+    assert response == {'jsonrpc': '2.0', 'id': 1, 'result': 0}
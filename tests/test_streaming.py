@@ -0,0 +1,175 @@
+"""
+Generator handlers: their items streamed as a chunked array result or
+NDJSON lines, the sync ones held back by the credits of the writer.
+"""
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from asynciorpc import cancellation
+from asynciorpc.client import Client
+from asynciorpc.config import CONFIG
+from asynciorpc.exceptions import FAULT_CODES
+from asynciorpc.interface.register import register
+from asynciorpc.streaming import ThreadStream
+
+closed = threading.Event()
+
+
+def stream_sync(count):
+    for i in range(count):
+        yield i
+
+
+async def stream_async(count):
+    for i in range(count):
+        await asyncio.sleep(0)
+        yield {'n': i}
+
+
+def stream_failing(count):
+    for i in range(count):
+        yield i
+    raise RuntimeError('failed')
+
+
+def stream_forever():
+    try:
+        while True:
+            cancellation.check()
+            time.sleep(0.01)
+            yield 'x'
+    finally:
+        closed.set()
+
+
+register(stream_sync)
+register(stream_async)
+register(stream_failing)
+register(stream_forever)
+
+
+def request(method, *params, **members):
+    members.setdefault('id', 1)
+    return dict(members, jsonrpc='2.0', method='test.svc.' + method, params=list(params))
+
+
+def post(serve, body, ndjson=False):
+    headers = {'Accept': 'application/x-ndjson'} if ndjson else {}
+
+    async def test(client):
+        response = await client.post('/', json=body, headers=headers)
+        return response.headers, await response.read()
+
+    return serve(test)
+
+
+@pytest.mark.parametrize('method, items', [
+    ('stream_sync', [0, 1, 2]),
+    ('stream_async', [{'n': 0}, {'n': 1}, {'n': 2}]),
+])
+def test_array_result(serve, method, items):
+    headers, body = post(serve, request(method, 3))
+    assert headers['Transfer-Encoding'] == 'chunked'
+    assert json.loads(body) == {'jsonrpc': '2.0', 'id': 1, 'result': items}
+
+
+def test_empty(serve):
+    assert json.loads(post(serve, request('stream_sync', 0))[1])['result'] == []
+
+
+def test_ndjson(serve):
+    headers, body = post(serve, request('stream_sync', 3, id=7), ndjson=True)
+    assert headers['Content-Type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert lines == [{'jsonrpc': '2.0', 'id': 7, 'result': i} for i in range(3)]
+
+
+def test_batch_gets_the_list(serve):
+    _, body = post(serve, [request('stream_sync', 2, id=1), request('stream_async', 1, id=2)])
+    assert json.loads(body) == [{'jsonrpc': '2.0', 'id': 1, 'result': [0, 1]},
+                                {'jsonrpc': '2.0', 'id': 2, 'result': [{'n': 0}]}]
+
+
+def test_failure_before_the_first_item(serve):
+    response = json.loads(post(serve, request('stream_failing', 0))[1])
+    assert response['error']['code'] == FAULT_CODES['internal_error']
+
+
+def test_failure_ends_ndjson_with_an_error_line(serve):
+    _, body = post(serve, request('stream_failing', 2), ndjson=True)
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert [line['result'] for line in lines[:2]] == [0, 1]
+    assert lines[2]['error']['code'] == FAULT_CODES['internal_error']
+
+
+def test_client_stream(serve):
+    async def test(client):
+        async with Client(str(client.make_url('/'))) as rpc:
+            return [item async for item in rpc.stream('test.svc.stream_sync', [4])]
+
+    assert serve(test) == [0, 1, 2, 3]
+
+
+def test_client_going_away_closes_the_generator(serve):
+    closed.clear()
+
+    async def test(client):
+        response = await client.post('/', json=request('stream_forever'),
+                                     headers={'Accept': 'application/x-ndjson'})
+        line = await response.content.readline()
+        response.close()
+        return json.loads(line)['result']
+
+    assert serve(test) == 'x'
+    assert closed.wait(2)
+
+
+def test_credits_hold_the_generator_back():
+    window = 3
+    produced = []
+
+    def generator():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    def settle(count):
+        # until `count` items are there, then a bit more to see it stops
+        limit = time.monotonic() + 2
+        while len(produced) < count and time.monotonic() < limit:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        return len(produced)
+
+    async def test():
+        stream = ThreadStream(None, None, cancellation.CancelToken(), window)
+        thread = threading.Thread(target=stream.produce, args=(generator, (), {}))
+        thread.start()
+        try:
+            ahead = await asyncio.get_running_loop().run_in_executor(None, settle, window)
+            first = await stream.next_items()
+            # the credits of the items taken come back with the next call
+            still = await asyncio.get_running_loop().run_in_executor(None, settle, window)
+            second = await stream.next_items()
+            after = await asyncio.get_running_loop().run_in_executor(None, settle, 2 * window)
+        finally:
+            await stream.close()
+            thread.join(2)
+        return ahead, first, still, second, after, thread.is_alive()
+
+    ahead, first, still, second, after, alive = asyncio.run(test())
+    assert ahead == window
+    assert first == [0, 1, 2]
+    assert still == window
+    assert 1 <= len(second) <= window
+    assert after == 2 * window
+    assert not alive
+
+
+def test_window_is_configured(serve, monkeypatch):
+    monkeypatch.setitem(CONFIG, 'stream_window', 1)
+    assert json.loads(post(serve, request('stream_sync', 5))[1])['result'] == list(range(5))
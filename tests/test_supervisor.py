@@ -0,0 +1,167 @@
+"""
+Multi-process server: the workers of `--workers` serve one port, with
+SO_REUSEPORT or on the socket of the supervisor, which restarts the
+ones dying, replaces them on SIGHUP and stops them on SIGTERM.
+"""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from asynciorpc.runner import make_socket
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER = '''
+import os
+from asynciorpc.config import configure
+from asynciorpc.interface.register import register
+from asynciorpc.runner import run
+
+configure(None, company='test', service='svc', metrics=False, shutdown_timeout=2,
+          reuse_port=%r)
+
+
+async def pid():
+    return os.getpid()
+
+
+register(pid)
+run()
+'''
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='the supervisor forks its workers')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def call(port):
+    """
+    The pid of the worker answering, on a new connection
+    """
+    body = json.dumps({'jsonrpc': '2.0', 'method': 'test.svc.pid', 'params': [], 'id': 1}).encode()
+    request = urllib.request.Request('http://127.0.0.1:%d/' % port, data=body,
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.load(response)['result']
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            value = condition()
+        except (OSError, urllib.error.URLError):
+            value = None
+        if value:
+            return value
+        time.sleep(0.1)
+    raise AssertionError('Timed out')
+
+
+def pids(port, calls=40):
+    return {call(port) for _ in range(calls)}
+
+
+def both_workers(port, besides=()):
+    """
+    The pids of the two workers once both answer, SO_REUSEPORT
+    balances the connections among them
+    """
+    def seen():
+        found = pids(port) - set(besides)
+        return found if len(found) == 2 else None
+
+    return wait_for(seen)
+
+
+@pytest.fixture
+def fleet(tmp_path):
+    processes = []
+
+    def start(reuse_port):
+        script = tmp_path / 'server.py'
+        script.write_text(SERVER % reuse_port)
+        port = free_port()
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        env.pop('ASYNCIORPC_CONFIG', None)
+        process = subprocess.Popen([sys.executable, str(script), '--port', str(port), '--workers', '2'],
+                                   cwd=str(tmp_path), env=env, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        processes.append(process)
+        wait_for(lambda: call(port))
+        return process, port
+
+    yield start
+    for process in processes:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_REUSEPORT'), reason='SO_REUSEPORT unsupported')
+def test_workers_share_the_port(fleet):
+    supervisor, port = fleet(True)
+    assert supervisor.pid not in both_workers(port)
+
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_REUSEPORT'), reason='SO_REUSEPORT unsupported')
+def test_dead_worker_is_restarted(fleet):
+    supervisor, port = fleet(True)
+    worker = call(port)
+    os.kill(worker, signal.SIGKILL)
+    both_workers(port, besides=[worker])
+    assert supervisor.poll() is None
+
+
+def test_workers_on_the_socket_of_the_supervisor(fleet):
+    supervisor, port = fleet(False)
+    worker = call(port)
+    os.kill(worker, signal.SIGKILL)
+    # the other worker answers meanwhile, then the new one too
+    assert wait_for(lambda: call(port) != worker)
+    assert supervisor.poll() is None
+
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_REUSEPORT'), reason='SO_REUSEPORT unsupported')
+def test_sighup_replaces_the_workers(fleet):
+    supervisor, port = fleet(True)
+    before = both_workers(port)
+    supervisor.send_signal(signal.SIGHUP)
+    both_workers(port, besides=before)
+    assert supervisor.poll() is None
+
+
+@pytest.mark.parametrize('reuse_port', [True, False])
+def test_sigterm_stops_the_fleet(fleet, reuse_port):
+    supervisor, port = fleet(reuse_port)
+    supervisor.send_signal(signal.SIGTERM)
+    assert supervisor.wait(10) == 0
+    with pytest.raises((OSError, urllib.error.URLError)):
+        call(port)
+
+
+@pytest.mark.skipif(not hasattr(socket, 'SO_REUSEPORT'), reason='SO_REUSEPORT unsupported')
+def test_make_socket_reuse_port():
+    port = free_port()
+    first = make_socket('tcp', port, None, reuse_port=True)
+    second = make_socket('tcp', port, None, reuse_port=True)
+    try:
+        assert first.getsockname()[1] == second.getsockname()[1] == port
+    finally:
+        first.close()
+        second.close()
+    with make_socket('tcp', port, None):
+        with pytest.raises(OSError):
+            make_socket('tcp', port, None)
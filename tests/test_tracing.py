@@ -0,0 +1,131 @@
+"""
+Tracing: a request continues the trace of its traceparent header, the
+Client calls of a handler carry it on, and the slowest requests are
+listed on the admin route.
+"""
+import pytest
+
+from asynciorpc import tracing
+from asynciorpc.client import Client
+from asynciorpc.config import CONFIG
+from asynciorpc.interface.register import register
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+# URL of the test server, for the handler calling it back
+server = {}
+
+
+async def traced_add(a, b):
+    return a + b
+
+
+async def traced_outer(a):
+    async with Client(server['url']) as rpc:
+        return await rpc.call('test.svc.traced_add', [a, 1])
+
+
+register(traced_add)
+register(traced_outer)
+
+
+class Collector(tracing.SpanProcessor):
+
+    def __init__(self):
+        self.traces = []
+
+    def on_end(self, span):
+        if span is span.trace.root:
+            self.traces.append(span.trace)
+
+
+@pytest.fixture
+def collector(monkeypatch):
+    monkeypatch.setitem(CONFIG, 'tracing', True)
+    monkeypatch.setattr(tracing, 'enabled', True, raising=False)
+    monkeypatch.setattr(tracing, 'buffer', None)
+    monkeypatch.setattr(tracing, 'processors', [])
+    collector = Collector()
+    tracing.add_processor(collector)
+    return collector
+
+
+def call(serve, method, params, headers=None):
+    body = {'jsonrpc': '2.0', 'method': 'test.svc.' + method, 'params': params, 'id': 1}
+
+    async def test(client):
+        server['url'] = str(client.make_url('/'))
+        return await (await client.post('/', json=body, headers=headers or {})).json()
+
+    return serve(test)
+
+
+def spans(trace):
+    return {span.name: span for span in trace.spans}
+
+
+def test_request_spans(serve, collector):
+    assert call(serve, 'traced_add', [1, 2])['result'] == 3
+    trace, = collector.traces
+    named = spans(trace)
+    assert {'rpc.request', 'rpc.call', 'rpc.execute', 'rpc.serialize'} <= set(named)
+    assert trace.root.name == 'rpc.request' and trace.root.parent_id is None
+    assert named['rpc.call'].attributes['method'] == 'test.svc.traced_add'
+    assert named['rpc.call'].parent_id == trace.root.span_id
+    assert named['rpc.request'].attributes['status'] == 200
+
+
+def test_traceparent_is_continued(serve, collector):
+    headers = {'traceparent': '00-%s-%s-01' % (TRACE_ID, PARENT_ID), 'tracestate': 'vendor=1'}
+    call(serve, 'traced_add', [1, 2], headers)
+    trace, = collector.traces
+    assert trace.trace_id == TRACE_ID
+    assert trace.root.parent_id == PARENT_ID
+    assert trace.state == 'vendor=1'
+
+
+@pytest.mark.parametrize('header', [
+    'garbage',
+    '00-%s-%s' % (TRACE_ID, PARENT_ID),
+    'ff-%s-%s-01' % (TRACE_ID, PARENT_ID),
+    '00-%s-%s-01' % ('0' * 32, PARENT_ID),
+    '00-%s-%s-01' % (TRACE_ID, '0' * 16),
+    '00-%s-%s-01' % (TRACE_ID.upper(), PARENT_ID),
+])
+def test_malformed_traceparent_starts_a_trace(serve, collector, header):
+    call(serve, 'traced_add', [1, 2], {'traceparent': header})
+    trace, = collector.traces
+    assert trace.trace_id != TRACE_ID
+    assert trace.root.parent_id is None
+
+
+def test_client_calls_carry_the_trace_on(serve, collector):
+    headers = {'traceparent': '00-%s-%s-01' % (TRACE_ID, PARENT_ID)}
+    assert call(serve, 'traced_outer', [1], headers)['result'] == 2
+    # the inner request ends first
+    inner, outer = collector.traces
+    assert inner.trace_id == outer.trace_id == TRACE_ID
+    assert inner.root.parent_id in {span.span_id for span in outer.spans}
+    assert spans(inner)['rpc.call'].attributes['method'] == 'test.svc.traced_add'
+
+
+def test_slowest_on_the_admin_route(serve, collector):
+    async def test(client):
+        body = {'jsonrpc': '2.0', 'method': 'test.svc.traced_add', 'params': [1, 2], 'id': 1}
+        for _ in range(3):
+            await client.post('/', json=body)
+        listed = await (await client.get(CONFIG['tracing_path'], params={'n': '2'})).json()
+        refused = await client.get(CONFIG['tracing_path'], params={'n': 'x'})
+        return listed, refused.status
+
+    listed, refused = serve(test)
+    assert len(listed) == 2
+    assert listed[0]['duration_ms'] >= listed[1]['duration_ms']
+    assert listed[0]['name'] == 'rpc.request'
+    assert {span['name'] for span in listed[0]['spans']} >= {'rpc.call', 'rpc.execute'}
+    assert refused == 400
+
+
+def test_inject_outside_of_a_request():
+    assert tracing.inject({}) == {}
@@ -0,0 +1,117 @@
+"""
+The gunicorn worker: runs the loop of event_loop and gives every
+worker its share of the pools, served by gunicorn in a subprocess.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+pytest.importorskip('gunicorn')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIG_YAML = '''
+company: test
+service: svc
+metrics: false
+threadpool_size: 10
+processpool_size: 4
+event_loop: %s
+'''
+
+SERVER = '''
+import asyncio
+import os
+from asynciorpc import pool
+from asynciorpc.interface.register import register
+from asynciorpc.runner import run
+
+
+async def info():
+    return {'pid': os.getpid(), 'loop': type(asyncio.get_running_loop()).__module__,
+            'threads': pool._threadpool_size, 'processes': pool._processpool_size}
+
+
+register(info)
+app = run(wsgi=True)
+'''
+
+
+def _installed(name):
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def call(port):
+    body = json.dumps({'jsonrpc': '2.0', 'method': 'test.svc.info', 'params': [], 'id': 1}).encode()
+    request = urllib.request.Request('http://127.0.0.1:%d/' % port, data=body,
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.load(response)['result']
+
+
+@pytest.fixture
+def gunicorn(tmp_path):
+    processes = []
+
+    def start(event_loop, workers=2):
+        (tmp_path / 'config.yaml').write_text(CONFIG_YAML % event_loop)
+        (tmp_path / 'server.py').write_text(SERVER)
+        port = free_port()
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, str(tmp_path)]))
+        env.pop('ASYNCIORPC_CONFIG', None)
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'server:app', '--bind', '127.0.0.1:%d' % port,
+             '--workers', str(workers), '--worker-class', 'asynciorpc.worker.GunicornWorker',
+             '--graceful-timeout', '1'],
+            cwd=str(tmp_path), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        processes.append(process)
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                return port, call(port)
+            except (OSError, urllib.error.URLError):
+                # gunicorn exits once its workers fail to boot
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise
+                time.sleep(0.1)
+
+    yield start
+    for process in processes:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+@pytest.mark.parametrize('event_loop, module', [
+    ('asyncio', 'asyncio.unix_events'),
+    pytest.param('uvloop', 'uvloop', marks=pytest.mark.skipif(not _installed('uvloop'),
+                                                              reason='uvloop not installed')),
+])
+def test_event_loop(gunicorn, event_loop, module):
+    _, info = gunicorn(event_loop)
+    assert info['loop'] == module
+
+
+def test_pools_are_shared_among_the_workers(gunicorn):
+    _, info = gunicorn('asyncio', workers=2)
+    assert (info['threads'], info['processes']) == (5, 2)